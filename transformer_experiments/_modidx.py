@@ -5,7 +5,93 @@ d = { 'settings': { 'branch': 'master',
                 'doc_host': 'https://spather.github.io',
                 'git_url': 'https://github.com/spather/transformer-experiments',
                 'lib_path': 'transformer_experiments'},
-  'syms': { 'transformer_experiments.common.databatcher': { 'transformer_experiments.common.databatcher.DataBatcher': ( 'common/databatcher.html#databatcher',
+  'syms': { 'transformer_experiments.common.activation_store': { 'transformer_experiments.common.activation_store.ActivationStore': ( 'common/activation-store.html#activationstore',
+                                                                                                                                      'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.__getstate__': ( 'common/activation-store.html#activationstore.__getstate__',
+                                                                                                                                                   'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.__init__': ( 'common/activation-store.html#activationstore.__init__',
+                                                                                                                                               'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.__len__': ( 'common/activation-store.html#activationstore.__len__',
+                                                                                                                                              'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore._array': ( 'common/activation-store.html#activationstore._array',
+                                                                                                                                             'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore._array_key': ( 'common/activation-store.html#activationstore._array_key',
+                                                                                                                                                 'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.create': ( 'common/activation-store.html#activationstore.create',
+                                                                                                                                             'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.exists': ( 'common/activation-store.html#activationstore.exists',
+                                                                                                                                             'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.get': ( 'common/activation-store.html#activationstore.get',
+                                                                                                                                          'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.get_position': ( 'common/activation-store.html#activationstore.get_position',
+                                                                                                                                                   'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.has': ( 'common/activation-store.html#activationstore.has',
+                                                                                                                                          'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.is_position_major': ( 'common/activation-store.html#activationstore.is_position_major',
+                                                                                                                                                        'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.string_idx': ( 'common/activation-store.html#activationstore.string_idx',
+                                                                                                                                                 'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.ActivationStore.write': ( 'common/activation-store.html#activationstore.write',
+                                                                                                                                            'transformer_experiments/common/activation_store.py'),
+                                                                 'transformer_experiments.common.activation_store.model_hash': ( 'common/activation-store.html#model_hash',
+                                                                                                                                 'transformer_experiments/common/activation_store.py')},
+            'transformer_experiments.common.ann_index': { 'transformer_experiments.common.ann_index.IVFFlatIndex': ( 'common/ann-index.html#ivfflatindex',
+                                                                                                                     'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.__init__': ( 'common/ann-index.html#ivfflatindex.__init__',
+                                                                                                                              'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.__len__': ( 'common/ann-index.html#ivfflatindex.__len__',
+                                                                                                                             'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.build': ( 'common/ann-index.html#ivfflatindex.build',
+                                                                                                                           'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.build_from_batches': ( 'common/ann-index.html#ivfflatindex.build_from_batches',
+                                                                                                                                        'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.load': ( 'common/ann-index.html#ivfflatindex.load',
+                                                                                                                          'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.n_lists': ( 'common/ann-index.html#ivfflatindex.n_lists',
+                                                                                                                             'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.save': ( 'common/ann-index.html#ivfflatindex.save',
+                                                                                                                          'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.IVFFlatIndex.search': ( 'common/ann-index.html#ivfflatindex.search',
+                                                                                                                            'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index._nearest_centroids': ( 'common/ann-index.html#_nearest_centroids',
+                                                                                                                           'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.kmeans': ( 'common/ann-index.html#kmeans',
+                                                                                                               'transformer_experiments/common/ann_index.py'),
+                                                          'transformer_experiments.common.ann_index.recall_at_k': ( 'common/ann-index.html#recall_at_k',
+                                                                                                                    'transformer_experiments/common/ann_index.py')},
+            'transformer_experiments.common.compressed_tensors': { 'transformer_experiments.common.compressed_tensors.CompressedTensorFile': ( 'common/compressed-tensors.html#compressedtensorfile',
+                                                                                                                                               'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile.__init__': ( 'common/compressed-tensors.html#compressedtensorfile.__init__',
+                                                                                                                                                        'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile.__len__': ( 'common/compressed-tensors.html#compressedtensorfile.__len__',
+                                                                                                                                                       'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile._empty': ( 'common/compressed-tensors.html#compressedtensorfile._empty',
+                                                                                                                                                      'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile._map_chunks': ( 'common/compressed-tensors.html#compressedtensorfile._map_chunks',
+                                                                                                                                                           'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile._read_chunk': ( 'common/compressed-tensors.html#compressedtensorfile._read_chunk',
+                                                                                                                                                           'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile.n_chunks': ( 'common/compressed-tensors.html#compressedtensorfile.n_chunks',
+                                                                                                                                                        'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile.read': ( 'common/compressed-tensors.html#compressedtensorfile.read',
+                                                                                                                                                    'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile.read_indices': ( 'common/compressed-tensors.html#compressedtensorfile.read_indices',
+                                                                                                                                                            'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.CompressedTensorFile.read_rows': ( 'common/compressed-tensors.html#compressedtensorfile.read_rows',
+                                                                                                                                                         'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors._get_codec': ( 'common/compressed-tensors.html#_get_codec',
+                                                                                                                                     'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.available_codecs': ( 'common/compressed-tensors.html#available_codecs',
+                                                                                                                                           'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.byte_shuffle': ( 'common/compressed-tensors.html#byte_shuffle',
+                                                                                                                                       'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.byte_unshuffle': ( 'common/compressed-tensors.html#byte_unshuffle',
+                                                                                                                                         'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.load_compressed': ( 'common/compressed-tensors.html#load_compressed',
+                                                                                                                                          'transformer_experiments/common/compressed_tensors.py'),
+                                                                   'transformer_experiments.common.compressed_tensors.save_compressed': ( 'common/compressed-tensors.html#save_compressed',
+                                                                                                                                          'transformer_experiments/common/compressed_tensors.py')},
+            'transformer_experiments.common.databatcher': { 'transformer_experiments.common.databatcher.DataBatcher': ( 'common/databatcher.html#databatcher',
                                                                                                                         'transformer_experiments/common/databatcher.py'),
                                                             'transformer_experiments.common.databatcher.DataBatcher.__init__': ( 'common/databatcher.html#databatcher.__init__',
                                                                                                                                  'transformer_experiments/common/databatcher.py'),
@@ -13,6 +99,20 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                  'transformer_experiments/common/databatcher.py'),
                                                             'transformer_experiments.common.databatcher.DataBatcher.__len__': ( 'common/databatcher.html#databatcher.__len__',
                                                                                                                                 'transformer_experiments/common/databatcher.py')},
+            'transformer_experiments.common.sharded_executor': { 'transformer_experiments.common.sharded_executor.ShardedExecutor': ( 'common/sharded-executor.html#shardedexecutor',
+                                                                                                                                      'transformer_experiments/common/sharded_executor.py'),
+                                                                 'transformer_experiments.common.sharded_executor.ShardedExecutor.__init__': ( 'common/sharded-executor.html#shardedexecutor.__init__',
+                                                                                                                                               'transformer_experiments/common/sharded_executor.py'),
+                                                                 'transformer_experiments.common.sharded_executor.ShardedExecutor.run': ( 'common/sharded-executor.html#shardedexecutor.run',
+                                                                                                                                          'transformer_experiments/common/sharded_executor.py'),
+                                                                 'transformer_experiments.common.sharded_executor._init_worker': ( 'common/sharded-executor.html#_init_worker',
+                                                                                                                                   'transformer_experiments/common/sharded_executor.py'),
+                                                                 'transformer_experiments.common.sharded_executor._run_shard': ( 'common/sharded-executor.html#_run_shard',
+                                                                                                                                 'transformer_experiments/common/sharded_executor.py'),
+                                                                 'transformer_experiments.common.sharded_executor.run_each_batch': ( 'common/sharded-executor.html#run_each_batch',
+                                                                                                                                     'transformer_experiments/common/sharded_executor.py'),
+                                                                 'transformer_experiments.common.sharded_executor.shard_batches': ( 'common/sharded-executor.html#shard_batches',
+                                                                                                                                    'transformer_experiments/common/sharded_executor.py')},
             'transformer_experiments.common.substring_generator': { 'transformer_experiments.common.substring_generator.SubstringGenerator': ( 'common/substring-generator.html#substringgenerator',
                                                                                                                                                'transformer_experiments/common/substring_generator.py'),
                                                                     'transformer_experiments.common.substring_generator.SubstringGenerator.__init__': ( 'common/substring-generator.html#substringgenerator.__init__',
@@ -27,17 +127,51 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                         'transformer_experiments/common/svd_helpers.py'),
                                                             'transformer_experiments.common.svd_helpers.projection_matrix_for_rank_k_approximation': ( 'common/svd-helpers.html#projection_matrix_for_rank_k_approximation',
                                                                                                                                                        'transformer_experiments/common/svd_helpers.py')},
-            'transformer_experiments.common.text_analysis': { 'transformer_experiments.common.text_analysis.SubstringFrequencyAnalysis': ( 'common/text-analysis.html#substringfrequencyanalysis',
+            'transformer_experiments.common.text_analysis': { 'transformer_experiments.common.text_analysis.BatchedSubstringFrequencyAnalysis': ( 'common/text-analysis.html#batchedsubstringfrequencyanalysis',
+                                                                                                                                                  'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.BatchedSubstringFrequencyAnalysis.__init__': ( 'common/text-analysis.html#batchedsubstringfrequencyanalysis.__init__',
+                                                                                                                                                           'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.BatchedSubstringFrequencyAnalysis.__len__': ( 'common/text-analysis.html#batchedsubstringfrequencyanalysis.__len__',
+                                                                                                                                                          'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.BatchedSubstringFrequencyAnalysis._decode': ( 'common/text-analysis.html#batchedsubstringfrequencyanalysis._decode',
+                                                                                                                                                          'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.BatchedSubstringFrequencyAnalysis.print_summary': ( 'common/text-analysis.html#batchedsubstringfrequencyanalysis.print_summary',
+                                                                                                                                                                'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.BatchedSubstringFrequencyAnalysis.top_tokens': ( 'common/text-analysis.html#batchedsubstringfrequencyanalysis.top_tokens',
+                                                                                                                                                             'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.BatchedSubstringFrequencyAnalysis.top_tokens_cumulative': ( 'common/text-analysis.html#batchedsubstringfrequencyanalysis.top_tokens_cumulative',
+                                                                                                                                                                        'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.SubstringFrequencyAnalysis': ( 'common/text-analysis.html#substringfrequencyanalysis',
                                                                                                                                            'transformer_experiments/common/text_analysis.py'),
                                                               'transformer_experiments.common.text_analysis.SubstringFrequencyAnalysis.__init__': ( 'common/text-analysis.html#substringfrequencyanalysis.__init__',
                                                                                                                                                     'transformer_experiments/common/text_analysis.py'),
                                                               'transformer_experiments.common.text_analysis.SubstringFrequencyAnalysis.print_summary': ( 'common/text-analysis.html#substringfrequencyanalysis.print_summary',
                                                                                                                                                          'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis._print_frequency_summary': ( 'common/text-analysis.html#_print_frequency_summary',
+                                                                                                                                         'transformer_experiments/common/text_analysis.py'),
                                                               'transformer_experiments.common.text_analysis.build_next_token_map': ( 'common/text-analysis.html#build_next_token_map',
                                                                                                                                      'transformer_experiments/common/text_analysis.py'),
+                                                              'transformer_experiments.common.text_analysis.stack_next_token_map': ( 'common/text-analysis.html#stack_next_token_map',
+                                                                                                                                     'transformer_experiments/common/text_analysis.py'),
                                                               'transformer_experiments.common.text_analysis.top_nonzero_tokens': ( 'common/text-analysis.html#top_nonzero_tokens',
                                                                                                                                    'transformer_experiments/common/text_analysis.py')},
-            'transformer_experiments.common.utils': { 'transformer_experiments.common.utils.DataWrapper': ( 'common/utils.html#datawrapper',
+            'transformer_experiments.common.utils': { 'transformer_experiments.common.utils.BufferPool': ( 'common/utils.html#bufferpool',
+                                                                                                           'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.BufferPool.__getstate__': ( 'common/utils.html#bufferpool.__getstate__',
+                                                                                                                        'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.BufferPool.__init__': ( 'common/utils.html#bufferpool.__init__',
+                                                                                                                    'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.BufferPool.__setstate__': ( 'common/utils.html#bufferpool.__setstate__',
+                                                                                                                        'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.BufferPool._key': ( 'common/utils.html#bufferpool._key',
+                                                                                                                'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.BufferPool.acquire': ( 'common/utils.html#bufferpool.acquire',
+                                                                                                                   'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.BufferPool.clear': ( 'common/utils.html#bufferpool.clear',
+                                                                                                                 'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.BufferPool.release': ( 'common/utils.html#bufferpool.release',
+                                                                                                                   'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.DataWrapper': ( 'common/utils.html#datawrapper',
                                                                                                             'transformer_experiments/common/utils.py'),
                                                       'transformer_experiments.common.utils.DataWrapper.__getitem__': ( 'common/utils.html#datawrapper.__getitem__',
                                                                                                                         'transformer_experiments/common/utils.py'),
@@ -49,8 +183,80 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                     'transformer_experiments/common/utils.py'),
                                                       'transformer_experiments.common.utils.DataWrapper.print': ( 'common/utils.html#datawrapper.print',
                                                                                                                   'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader': ( 'common/utils.html#prefetchingbatchloader',
+                                                                                                                       'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader.__call__': ( 'common/utils.html#prefetchingbatchloader.__call__',
+                                                                                                                                'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader.__enter__': ( 'common/utils.html#prefetchingbatchloader.__enter__',
+                                                                                                                                 'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader.__exit__': ( 'common/utils.html#prefetchingbatchloader.__exit__',
+                                                                                                                                'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader.__init__': ( 'common/utils.html#prefetchingbatchloader.__init__',
+                                                                                                                                'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader.__iter__': ( 'common/utils.html#prefetchingbatchloader.__iter__',
+                                                                                                                                'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader._load': ( 'common/utils.html#prefetchingbatchloader._load',
+                                                                                                                             'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader._prefetch_after': ( 'common/utils.html#prefetchingbatchloader._prefetch_after',
+                                                                                                                                       'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.PrefetchingBatchLoader.close': ( 'common/utils.html#prefetchingbatchloader.close',
+                                                                                                                             'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest': ( 'common/utils.html#runmanifest',
+                                                                                                            'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest.__getstate__': ( 'common/utils.html#runmanifest.__getstate__',
+                                                                                                                         'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest.__init__': ( 'common/utils.html#runmanifest.__init__',
+                                                                                                                     'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest.__setstate__': ( 'common/utils.html#runmanifest.__setstate__',
+                                                                                                                         'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest._file_record': ( 'common/utils.html#runmanifest._file_record',
+                                                                                                                         'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest._load': ( 'common/utils.html#runmanifest._load',
+                                                                                                                  'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest.is_complete': ( 'common/utils.html#runmanifest.is_complete',
+                                                                                                                        'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunManifest.mark_complete': ( 'common/utils.html#runmanifest.mark_complete',
+                                                                                                                          'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunningTopK': ( 'common/utils.html#runningtopk',
+                                                                                                            'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunningTopK.__init__': ( 'common/utils.html#runningtopk.__init__',
+                                                                                                                     'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunningTopK.add': ( 'common/utils.html#runningtopk.add',
+                                                                                                                'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.RunningTopK.result': ( 'common/utils.html#runningtopk.result',
+                                                                                                                   'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter': ( 'common/utils.html#writebehindwriter',
+                                                                                                                  'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter.__enter__': ( 'common/utils.html#writebehindwriter.__enter__',
+                                                                                                                            'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter.__exit__': ( 'common/utils.html#writebehindwriter.__exit__',
+                                                                                                                           'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter.__init__': ( 'common/utils.html#writebehindwriter.__init__',
+                                                                                                                           'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter._raise_errors': ( 'common/utils.html#writebehindwriter._raise_errors',
+                                                                                                                                'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter.close': ( 'common/utils.html#writebehindwriter.close',
+                                                                                                                        'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter.flush': ( 'common/utils.html#writebehindwriter.flush',
+                                                                                                                        'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter.save': ( 'common/utils.html#writebehindwriter.save',
+                                                                                                                       'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.WriteBehindWriter.submit': ( 'common/utils.html#writebehindwriter.submit',
+                                                                                                                         'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils._is_memory_mapped': ( 'common/utils.html#_is_memory_mapped',
+                                                                                                                  'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils._temp_filename': ( 'common/utils.html#_temp_filename',
+                                                                                                               'transformer_experiments/common/utils.py'),
                                                       'transformer_experiments.common.utils.aggregate_by_string_key': ( 'common/utils.html#aggregate_by_string_key',
                                                                                                                         'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.atomic_save': ( 'common/utils.html#atomic_save',
+                                                                                                            'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.atomic_write_text': ( 'common/utils.html#atomic_write_text',
+                                                                                                                  'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.file_checksum': ( 'common/utils.html#file_checksum',
+                                                                                                              'transformer_experiments/common/utils.py'),
+                                                      'transformer_experiments.common.utils.strings_checksum': ( 'common/utils.html#strings_checksum',
+                                                                                                                 'transformer_experiments/common/utils.py'),
                                                       'transformer_experiments.common.utils.topk_across_batches': ( 'common/utils.html#topk_across_batches',
                                                                                                                     'transformer_experiments/common/utils.py')},
             'transformer_experiments.dataset_split': { 'transformer_experiments.dataset_split.split_text_dataset': ( 'training/dataset-split.html#split_text_dataset',
@@ -73,32 +279,72 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                         'transformer_experiments/environments.py')},
             'transformer_experiments.experiments.block_internals': { 'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment': ( 'experiments/block-internals.html#batchedblockinternalsexperiment',
                                                                                                                                                               'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.__getstate__': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.__getstate__',
+                                                                                                                                                                           'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.__init__': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.__init__',
                                                                                                                                                                        'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._activation_kinds': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._activation_kinds',
+                                                                                                                                                                                'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._activations_filename': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._activations_filename',
+                                                                                                                                                                                    'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._batches_with_outputs': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._batches_with_outputs',
+                                                                                                                                                                                    'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._block_input_filename': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._block_input_filename',
                                                                                                                                                                                     'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._block_output_filename': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._block_output_filename',
                                                                                                                                                                                      'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._convert_t_i': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._convert_t_i',
                                                                                                                                                                            'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._create_store': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._create_store',
+                                                                                                                                                                            'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._embeddings_filename': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._embeddings_filename',
                                                                                                                                                                                    'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._ffwd_output_filename': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._ffwd_output_filename',
                                                                                                                                                                                     'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._heads_output_filename': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._heads_output_filename',
                                                                                                                                                                                      'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._load_activations': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._load_activations',
+                                                                                                                                                                                'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._load_activations_at_position': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._load_activations_at_position',
+                                                                                                                                                                                            'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._load_activations_for_indices': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._load_activations_for_indices',
+                                                                                                                                                                                            'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._output_batch_loader': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._output_batch_loader',
+                                                                                                                                                                                   'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._output_batch_rows': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._output_batch_rows',
+                                                                                                                                                                                 'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._proj_output_filename': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._proj_output_filename',
                                                                                                                                                                                     'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._run_batch': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._run_batch',
                                                                                                                                                                          'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._run_batches': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._run_batches',
+                                                                                                                                                                           'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._run_manifest': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._run_manifest',
+                                                                                                                                                                            'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._save_activations': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._save_activations',
+                                                                                                                                                                                'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._save_batch_activations': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._save_batch_activations',
+                                                                                                                                                                                      'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._scan_kind': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._scan_kind',
+                                                                                                                                                                         'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._strings_with_topk_closest_outputs': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._strings_with_topk_closest_outputs',
                                                                                                                                                                                                  'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._unique_substring_map': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._unique_substring_map',
                                                                                                                                                                                     'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment._use_normalized': ( 'experiments/block-internals.html#batchedblockinternalsexperiment._use_normalized',
+                                                                                                                                                                              'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.ann_index': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.ann_index',
+                                                                                                                                                                        'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.preload': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.preload',
+                                                                                                                                                                      'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.run': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.run',
                                                                                                                                                                   'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.sample_length': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.sample_length',
                                                                                                                                                                             'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.stored_batches': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.stored_batches',
+                                                                                                                                                                             'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.stored_settings': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.stored_settings',
+                                                                                                                                                                              'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.string_idx': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.string_idx',
                                                                                                                                                                          'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.strings_from_indices': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.strings_from_indices',
@@ -107,6 +353,8 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                                                                                    'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.strings_with_topk_closest_ffwd_outputs': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.strings_with_topk_closest_ffwd_outputs',
                                                                                                                                                                                                      'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.strings_with_topk_closest_outputs_multi': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.strings_with_topk_closest_outputs_multi',
+                                                                                                                                                                                                      'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BatchedBlockInternalsExperiment.strings_with_topk_closest_proj_outputs': ( 'experiments/block-internals.html#batchedblockinternalsexperiment.strings_with_topk_closest_proj_outputs',
                                                                                                                                                                                                      'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.BlockInternalsAccessors': ( 'experiments/block-internals.html#blockinternalsaccessors',
@@ -165,20 +413,66 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                                           'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.GetFilenameForBatchAndBlock.__call__': ( 'experiments/block-internals.html#getfilenameforbatchandblock.__call__',
                                                                                                                                                                    'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.OutputSearch': ( 'experiments/block-internals.html#outputsearch',
+                                                                                                                                           'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals': ( 'experiments/block-internals.html#storedblockinternals',
+                                                                                                                                                   'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.__init__': ( 'experiments/block-internals.html#storedblockinternals.__init__',
+                                                                                                                                                            'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals._get': ( 'experiments/block-internals.html#storedblockinternals._get',
+                                                                                                                                                        'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.block_input': ( 'experiments/block-internals.html#storedblockinternals.block_input',
+                                                                                                                                                               'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.block_output': ( 'experiments/block-internals.html#storedblockinternals.block_output',
+                                                                                                                                                                'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.embeddings': ( 'experiments/block-internals.html#storedblockinternals.embeddings',
+                                                                                                                                                              'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.ffwd_output': ( 'experiments/block-internals.html#storedblockinternals.ffwd_output',
+                                                                                                                                                               'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.heads_output': ( 'experiments/block-internals.html#storedblockinternals.heads_output',
+                                                                                                                                                                'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.proj_output': ( 'experiments/block-internals.html#storedblockinternals.proj_output',
+                                                                                                                                                               'transformer_experiments/experiments/block_internals.py'),
+                                                                     'transformer_experiments.experiments.block_internals.StoredBlockInternals.string_idx': ( 'experiments/block-internals.html#storedblockinternals.string_idx',
+                                                                                                                                                              'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.batch_cosine_sim': ( 'experiments/block-internals.html#batch_cosine_sim',
                                                                                                                                                'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.batch_distances': ( 'experiments/block-internals.html#batch_distances',
                                                                                                                                               'transformer_experiments/experiments/block_internals.py'),
                                                                      'transformer_experiments.experiments.block_internals.run': ( 'experiments/block-internals.html#run',
                                                                                                                                   'transformer_experiments/experiments/block_internals.py')},
-            'transformer_experiments.experiments.cosine_sims': { 'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment',
+            'transformer_experiments.experiments.cosine_sims': { 'transformer_experiments.experiments.cosine_sims.CosineSimInvertedIndex': ( 'experiments/cosine-sims.html#cosinesiminvertedindex',
+                                                                                                                                             'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimInvertedIndex.__init__': ( 'experiments/cosine-sims.html#cosinesiminvertedindex.__init__',
+                                                                                                                                                      'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimInvertedIndex._rows': ( 'experiments/cosine-sims.html#cosinesiminvertedindex._rows',
+                                                                                                                                                   'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimInvertedIndex._write': ( 'experiments/cosine-sims.html#cosinesiminvertedindex._write',
+                                                                                                                                                    'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimInvertedIndex.create': ( 'experiments/cosine-sims.html#cosinesiminvertedindex.create',
+                                                                                                                                                    'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimInvertedIndex.filter': ( 'experiments/cosine-sims.html#cosinesiminvertedindex.filter',
+                                                                                                                                                    'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimInvertedIndex.get': ( 'experiments/cosine-sims.html#cosinesiminvertedindex.get',
+                                                                                                                                                 'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment',
                                                                                                                                                    'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment.__init__': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment.__init__',
                                                                                                                                                             'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment._get_ffwd_outs': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment._get_ffwd_outs',
                                                                                                                                                                   'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment._run_batches': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment._run_batches',
+                                                                                                                                                                'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment._save_batch': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment._save_batch',
+                                                                                                                                                               'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment._save_sparse_batch': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment._save_sparse_batch',
+                                                                                                                                                                      'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment._sparsify': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment._sparsify',
+                                                                                                                                                             'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment.cosine_sim_ffwd_out_filename': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment.cosine_sim_ffwd_out_filename',
                                                                                                                                                                                 'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment.cosine_sim_ffwd_out_sparse_filename': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment.cosine_sim_ffwd_out_sparse_filename',
+                                                                                                                                                                                       'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.CosineSimilaritiesExperiment.run': ( 'experiments/cosine-sims.html#cosinesimilaritiesexperiment.run',
                                                                                                                                                        'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.LoadBatchFunction': ( 'experiments/cosine-sims.html#loadbatchfunction',
@@ -189,10 +483,24 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                               'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.LoadPrefilteredFunction.__call__': ( 'experiments/cosine-sims.html#loadprefilteredfunction.__call__',
                                                                                                                                                        'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.LoadPrefilteredQueryFunction': ( 'experiments/cosine-sims.html#loadprefilteredqueryfunction',
+                                                                                                                                                   'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.LoadPrefilteredQueryFunction.__call__': ( 'experiments/cosine-sims.html#loadprefilteredqueryfunction.__call__',
+                                                                                                                                                            'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.LoadSparseBatchFunction': ( 'experiments/cosine-sims.html#loadsparsebatchfunction',
+                                                                                                                                              'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.LoadSparseBatchFunction.__call__': ( 'experiments/cosine-sims.html#loadsparsebatchfunction.__call__',
+                                                                                                                                                       'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims._filter_batch': ( 'experiments/cosine-sims.html#_filter_batch',
+                                                                                                                                    'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims._group_by_query_and_block': ( 'experiments/cosine-sims.html#_group_by_query_and_block',
+                                                                                                                                                'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.filter_on_prefiltered_results': ( 'experiments/cosine-sims.html#filter_on_prefiltered_results',
                                                                                                                                                     'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.get_ffwd_queries': ( 'experiments/cosine-sims.html#get_ffwd_queries',
                                                                                                                                        'transformer_experiments/experiments/cosine_sims.py'),
+                                                                 'transformer_experiments.experiments.cosine_sims.load_sparse_cosine_sim_results': ( 'experiments/cosine-sims.html#load_sparse_cosine_sim_results',
+                                                                                                                                                     'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.pre_filter_cosine_sim_results': ( 'experiments/cosine-sims.html#pre_filter_cosine_sim_results',
                                                                                                                                                     'transformer_experiments/experiments/cosine_sims.py'),
                                                                  'transformer_experiments.experiments.cosine_sims.run': ( 'experiments/cosine-sims.html#run',
@@ -203,8 +511,12 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                                  'transformer_experiments/experiments/final_ffwd.py'),
                                                                 'transformer_experiments.experiments.final_ffwd.FinalFFWDExperiment._ffwd_output_filename': ( 'experiments/final_ffwd.html#finalffwdexperiment._ffwd_output_filename',
                                                                                                                                                               'transformer_experiments/experiments/final_ffwd.py'),
+                                                                'transformer_experiments.experiments.final_ffwd.FinalFFWDExperiment._load_ffwd_output': ( 'experiments/final_ffwd.html#finalffwdexperiment._load_ffwd_output',
+                                                                                                                                                          'transformer_experiments/experiments/final_ffwd.py'),
                                                                 'transformer_experiments.experiments.final_ffwd.FinalFFWDExperiment._run_batch': ( 'experiments/final_ffwd.html#finalffwdexperiment._run_batch',
                                                                                                                                                    'transformer_experiments/experiments/final_ffwd.py'),
+                                                                'transformer_experiments.experiments.final_ffwd.FinalFFWDExperiment._run_batches': ( 'experiments/final_ffwd.html#finalffwdexperiment._run_batches',
+                                                                                                                                                     'transformer_experiments/experiments/final_ffwd.py'),
                                                                 'transformer_experiments.experiments.final_ffwd.FinalFFWDExperiment.run': ( 'experiments/final_ffwd.html#finalffwdexperiment.run',
                                                                                                                                             'transformer_experiments/experiments/final_ffwd.py'),
                                                                 'transformer_experiments.experiments.final_ffwd.FinalFFWDExperiment.sample_length': ( 'experiments/final_ffwd.html#finalffwdexperiment.sample_length',
@@ -223,20 +535,56 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                                        'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.__init__': ( 'experiments/similar-strings.html#similarstringsexperiment.__init__',
                                                                                                                                                                 'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._embs_results_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._embs_results_filename',
+                                                                                                                                                                              'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._embs_sim_strings_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._embs_sim_strings_filename',
                                                                                                                                                                                   'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._ffwd_out_results_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._ffwd_out_results_filename',
+                                                                                                                                                                                  'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._ffwd_out_sim_strings_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._ffwd_out_sim_strings_filename',
                                                                                                                                                                                       'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._generate_embeddings_batch': ( 'experiments/similar-strings.html#similarstringsexperiment._generate_embeddings_batch',
+                                                                                                                                                                                  'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._generate_ffwd_out_batch': ( 'experiments/similar-strings.html#similarstringsexperiment._generate_ffwd_out_batch',
+                                                                                                                                                                                'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._generate_proj_out_batch': ( 'experiments/similar-strings.html#similarstringsexperiment._generate_proj_out_batch',
+                                                                                                                                                                                'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._load_binary_results': ( 'experiments/similar-strings.html#similarstringsexperiment._load_binary_results',
+                                                                                                                                                                            'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._load_json': ( 'experiments/similar-strings.html#similarstringsexperiment._load_json',
                                                                                                                                                                   'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._neighbour_ids': ( 'experiments/similar-strings.html#similarstringsexperiment._neighbour_ids',
+                                                                                                                                                                      'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._pending_batches': ( 'experiments/similar-strings.html#similarstringsexperiment._pending_batches',
+                                                                                                                                                                        'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._prepare_binary_results': ( 'experiments/similar-strings.html#similarstringsexperiment._prepare_binary_results',
+                                                                                                                                                                               'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._proj_out_results_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._proj_out_results_filename',
+                                                                                                                                                                                  'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._proj_out_sim_strings_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._proj_out_sim_strings_filename',
                                                                                                                                                                                       'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._results_neighbour_strings_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._results_neighbour_strings_filename',
+                                                                                                                                                                                           'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._results_queries_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._results_queries_filename',
+                                                                                                                                                                                 'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._results_rows': ( 'experiments/similar-strings.html#similarstringsexperiment._results_rows',
+                                                                                                                                                                     'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._run_manifest': ( 'experiments/similar-strings.html#similarstringsexperiment._run_manifest',
+                                                                                                                                                                     'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._string_to_batch_map_filename': ( 'experiments/similar-strings.html#similarstringsexperiment._string_to_batch_map_filename',
                                                                                                                                                                                      'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._write_batch_results': ( 'experiments/similar-strings.html#similarstringsexperiment._write_batch_results',
+                                                                                                                                                                            'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment._write_sim_strings_file': ( 'experiments/similar-strings.html#similarstringsexperiment._write_sim_strings_file',
+                                                                                                                                                                               'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.ann_recall': ( 'experiments/similar-strings.html#similarstringsexperiment.ann_recall',
+                                                                                                                                                                  'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.generate_embeddings_files': ( 'experiments/similar-strings.html#similarstringsexperiment.generate_embeddings_files',
                                                                                                                                                                                  'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.generate_ffwd_out_files': ( 'experiments/similar-strings.html#similarstringsexperiment.generate_ffwd_out_files',
                                                                                                                                                                                'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.generate_output_files': ( 'experiments/similar-strings.html#similarstringsexperiment.generate_output_files',
+                                                                                                                                                                             'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.generate_proj_out_files': ( 'experiments/similar-strings.html#similarstringsexperiment.generate_proj_out_files',
                                                                                                                                                                                'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.generate_string_to_batch_map': ( 'experiments/similar-strings.html#similarstringsexperiment.generate_string_to_batch_map',
@@ -245,10 +593,18 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                                                                 'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.load_string_to_batch_map': ( 'experiments/similar-strings.html#similarstringsexperiment.load_string_to_batch_map',
                                                                                                                                                                                 'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.SimilarStringsExperiment.write_binary_results': ( 'experiments/similar-strings.html#similarstringsexperiment.write_binary_results',
+                                                                                                                                                                            'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsResult': ( 'experiments/similar-strings.html#similarstringsresult',
                                                                                                                                                    'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.SimilarStringsResult.aggregate_over_t_is': ( 'experiments/similar-strings.html#similarstringsresult.aggregate_over_t_is',
                                                                                                                                                                        'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings._echo_ann_recall': ( 'experiments/similar-strings.html#_echo_ann_recall',
+                                                                                                                                               'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings._save_npy': ( 'experiments/similar-strings.html#_save_npy',
+                                                                                                                                        'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.binary_results': ( 'experiments/similar-strings.html#binary_results',
+                                                                                                                                             'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.embeddings': ( 'experiments/similar-strings.html#embeddings',
                                                                                                                                          'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.ffwd_out': ( 'experiments/similar-strings.html#ffwd_out',
@@ -257,10 +613,58 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                                 'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.generate_string_to_batch_map': ( 'experiments/similar-strings.html#generate_string_to_batch_map',
                                                                                                                                                            'transformer_experiments/experiments/similar_strings.py'),
+                                                                     'transformer_experiments.experiments.similar_strings.outputs': ( 'experiments/similar-strings.html#outputs',
+                                                                                                                                      'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.proj_out': ( 'experiments/similar-strings.html#proj_out',
                                                                                                                                        'transformer_experiments/experiments/similar_strings.py'),
                                                                      'transformer_experiments.experiments.similar_strings.run': ( 'experiments/similar-strings.html#run',
                                                                                                                                   'transformer_experiments/experiments/similar_strings.py')},
+            'transformer_experiments.experiments.similar_strings_server': { 'transformer_experiments.experiments.similar_strings_server.SimilarStringsAnswer': ( 'experiments/similar-strings-server.html#similarstringsanswer',
+                                                                                                                                                                 'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsQuery': ( 'experiments/similar-strings-server.html#similarstringsquery',
+                                                                                                                                                                'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService': ( 'experiments/similar-strings-server.html#similarstringsservice',
+                                                                                                                                                                  'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService.__enter__': ( 'experiments/similar-strings-server.html#similarstringsservice.__enter__',
+                                                                                                                                                                            'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService.__exit__': ( 'experiments/similar-strings-server.html#similarstringsservice.__exit__',
+                                                                                                                                                                           'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService.__init__': ( 'experiments/similar-strings-server.html#similarstringsservice.__init__',
+                                                                                                                                                                           'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService._answer': ( 'experiments/similar-strings-server.html#similarstringsservice._answer',
+                                                                                                                                                                          'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService._answer_batches': ( 'experiments/similar-strings-server.html#similarstringsservice._answer_batches',
+                                                                                                                                                                                  'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService._normalize': ( 'experiments/similar-strings-server.html#similarstringsservice._normalize',
+                                                                                                                                                                             'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService.build_ann_indices': ( 'experiments/similar-strings-server.html#similarstringsservice.build_ann_indices',
+                                                                                                                                                                                    'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService.check_query': ( 'experiments/similar-strings-server.html#similarstringsservice.check_query',
+                                                                                                                                                                              'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService.close': ( 'experiments/similar-strings-server.html#similarstringsservice.close',
+                                                                                                                                                                        'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.SimilarStringsService.query': ( 'experiments/similar-strings-server.html#similarstringsservice.query',
+                                                                                                                                                                        'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server._SimilarStringsRequestHandler': ( 'experiments/similar-strings-server.html#_similarstringsrequesthandler',
+                                                                                                                                                                          'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server._SimilarStringsRequestHandler._answer': ( 'experiments/similar-strings-server.html#_similarstringsrequesthandler._answer',
+                                                                                                                                                                                  'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server._SimilarStringsRequestHandler._reply': ( 'experiments/similar-strings-server.html#_similarstringsrequesthandler._reply',
+                                                                                                                                                                                 'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server._SimilarStringsRequestHandler.do_GET': ( 'experiments/similar-strings-server.html#_similarstringsrequesthandler.do_get',
+                                                                                                                                                                                 'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server._SimilarStringsRequestHandler.do_POST': ( 'experiments/similar-strings-server.html#_similarstringsrequesthandler.do_post',
+                                                                                                                                                                                  'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server._SimilarStringsRequestHandler.log_message': ( 'experiments/similar-strings-server.html#_similarstringsrequesthandler.log_message',
+                                                                                                                                                                                      'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server._query_from_params': ( 'experiments/similar-strings-server.html#_query_from_params',
+                                                                                                                                                               'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.create_server': ( 'experiments/similar-strings-server.html#create_server',
+                                                                                                                                                          'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.query_server': ( 'experiments/similar-strings-server.html#query_server',
+                                                                                                                                                         'transformer_experiments/experiments/similar_strings_server.py'),
+                                                                            'transformer_experiments.experiments.similar_strings_server.serve': ( 'experiments/similar-strings-server.html#serve',
+                                                                                                                                                  'transformer_experiments/experiments/similar_strings_server.py')},
             'transformer_experiments.models.transformer': { 'transformer_experiments.models.transformer.Block': ( 'models/transformer.html#block',
                                                                                                                   'transformer_experiments/models/transformer.py'),
                                                             'transformer_experiments.models.transformer.Block.__init__': ( 'models/transformer.html#block.__init__',
@@ -319,12 +723,40 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                           'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.LogitsWrapper.__init__': ( 'models/transformer-helpers.html#logitswrapper.__init__',
                                                                                                                                                    'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.LogitsWrapper.log_probs': ( 'models/transformer-helpers.html#logitswrapper.log_probs',
+                                                                                                                                                    'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.LogitsWrapper.plot_probs': ( 'models/transformer-helpers.html#logitswrapper.plot_probs',
                                                                                                                                                      'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.LogitsWrapper.probs': ( 'models/transformer-helpers.html#logitswrapper.probs',
                                                                                                                                                 'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.LogitsWrapper.topk_tensors': ( 'models/transformer-helpers.html#logitswrapper.topk_tensors',
+                                                                                                                                                       'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.LogitsWrapper.topk_tokens': ( 'models/transformer-helpers.html#logitswrapper.topk_tokens',
                                                                                                                                                       'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.PrefixTree': ( 'models/transformer-helpers.html#prefixtree',
+                                                                                                                                       'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.PrefixTree.build': ( 'models/transformer-helpers.html#prefixtree.build',
+                                                                                                                                             'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.PrefixTree.level': ( 'models/transformer-helpers.html#prefixtree.level',
+                                                                                                                                             'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.PrefixTree.n_nodes': ( 'models/transformer-helpers.html#prefixtree.n_nodes',
+                                                                                                                                               'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens': ( 'models/transformer-helpers.html#topktokens',
+                                                                                                                                       'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens.__eq__': ( 'models/transformer-helpers.html#topktokens.__eq__',
+                                                                                                                                              'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens.__getitem__': ( 'models/transformer-helpers.html#topktokens.__getitem__',
+                                                                                                                                                   'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens.__init__': ( 'models/transformer-helpers.html#topktokens.__init__',
+                                                                                                                                                'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens.__len__': ( 'models/transformer-helpers.html#topktokens.__len__',
+                                                                                                                                               'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens.__repr__': ( 'models/transformer-helpers.html#topktokens.__repr__',
+                                                                                                                                                'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens._decode': ( 'models/transformer-helpers.html#topktokens._decode',
+                                                                                                                                               'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TopkTokens._lists': ( 'models/transformer-helpers.html#topktokens._lists',
+                                                                                                                                              'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.TransformerAccessors': ( 'models/transformer-helpers.html#transformeraccessors',
                                                                                                                                                  'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.TransformerAccessors.__init__': ( 'models/transformer-helpers.html#transformeraccessors.__init__',
@@ -341,6 +773,8 @@ d = { 'settings': { 'branch': 'master',
                                                                                                                                                            'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.TransformerAccessors.run_model_from_block_n': ( 'models/transformer-helpers.html#transformeraccessors.run_model_from_block_n',
                                                                                                                                                                         'transformer_experiments/models/transformer_helpers.py'),
+                                                                    'transformer_experiments.models.transformer_helpers.TransformerAccessors.run_model_sharing_prefixes': ( 'models/transformer-helpers.html#transformeraccessors.run_model_sharing_prefixes',
+                                                                                                                                                                            'transformer_experiments/models/transformer_helpers.py'),
                                                                     'transformer_experiments.models.transformer_helpers.unsqueeze_emb': ( 'models/transformer-helpers.html#unsqueeze_emb',
                                                                                                                                           'transformer_experiments/models/transformer_helpers.py')},
             'transformer_experiments.models.transformer_training': { 'transformer_experiments.models.transformer_training.estimate_loss': ( 'models/transformer.html#estimate_loss',
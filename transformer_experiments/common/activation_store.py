@@ -0,0 +1,217 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/common/activation-store.ipynb.
+
+# %% auto 0
+__all__ = ['model_hash', 'ActivationStore']
+
+# %% ../../nbs/common/activation-store.ipynb 5
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+# %% ../../nbs/common/activation-store.ipynb 6
+import numpy as np
+import torch
+from torch import nn
+from .utils import strings_checksum
+
+# %% ../../nbs/common/activation-store.ipynb 8
+def model_hash(m: nn.Module) -> str:
+    """Returns a hash of the model's parameters and buffers, for
+    recording which model produced a set of activations."""
+    h = hashlib.sha256()
+    for name, t in m.state_dict().items():
+        h.update(name.encode("utf-8"))
+        h.update(t.detach().cpu().contiguous().numpy().tobytes())
+    return h.hexdigest()
+
+# %% ../../nbs/common/activation-store.ipynb 10
+class ActivationStore:
+    """Stores activations in one memory-mapped array per (kind, block),
+    each of shape (n_strings, *item_shape) and indexed by the strings'
+    global indices. Kinds that aren't per-block (e.g. embeddings) have a
+    single array. Use `create()` to make a new store and the constructor
+    to open an existing one.
+
+    Kinds listed in `position_major_kinds` are laid out on disk as
+    (s_len, n_strings, ...) rather than (n_strings, s_len, ...), so that
+    reading all the strings' activations at a single position (see
+    `get_position()`) is one sequential read instead of a strided one.
+    The layout only affects performance: `get()` returns the same
+    logical shape either way."""
+
+    manifest_filename = "manifest.json"
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.manifest = json.loads((root / self.manifest_filename).read_text())
+        self.strings: Sequence[str] = self.manifest["strings"]
+        self.item_shape: Tuple[int, ...] = tuple(self.manifest["item_shape"])
+        self.dtype = np.dtype(self.manifest["dtype"])
+        self.model_hash: str = self.manifest["model_hash"]
+        self.strings_checksum: str = self.manifest.get(
+            "strings_checksum"
+        ) or strings_checksum(self.strings)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._idx_map: Optional[Dict[str, int]] = None
+        self._position_major_keys = set(self.manifest.get("position_major", []))
+
+    def __getstate__(self):
+        # Don't pickle the memory-mapped arrays (which would copy their data);
+        # they're reopened on demand, e.g. in a worker process.
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+    @classmethod
+    def exists(cls, root: Path) -> bool:
+        """Returns whether there is a store at `root`."""
+        return (root / cls.manifest_filename).exists()
+
+    @classmethod
+    def create(
+        cls,
+        root: Path,
+        strings: Sequence[str],
+        item_shape: Tuple[int, ...],
+        n_blocks: int,
+        kinds: Sequence[str] = (),
+        block_kinds: Sequence[str] = (),
+        position_major_kinds: Sequence[str] = (),
+        dtype: torch.dtype = torch.float32,
+        model_hash: str = "",
+    ) -> "ActivationStore":
+        """Creates a new store at `root` with an array for each of `kinds`,
+        and `n_blocks` arrays for each of `block_kinds`. The arrays are
+        allocated up front (as sparse files, where the filesystem supports
+        them) and filled in with `write()`."""
+        root.mkdir(parents=True, exist_ok=True)
+        np_dtype = torch.empty(0, dtype=dtype).numpy().dtype
+        assert all(
+            kind in kinds or kind in block_kinds for kind in position_major_kinds
+        ), f"position_major_kinds {position_major_kinds} must all be in kinds or block_kinds"
+        assert (
+            len(position_major_kinds) == 0 or len(item_shape) >= 1
+        ), "position major layout requires a position dimension"
+
+        array_keys = list(kinds) + [
+            cls._array_key(kind, block_idx)
+            for kind in block_kinds
+            for block_idx in range(n_blocks)
+        ]
+        position_major_keys = [
+            kind for kind in kinds if kind in position_major_kinds
+        ] + [
+            cls._array_key(kind, block_idx)
+            for kind in block_kinds
+            if kind in position_major_kinds
+            for block_idx in range(n_blocks)
+        ]
+        for key in array_keys:
+            shape = (len(strings), *item_shape)
+            if key in position_major_keys:
+                shape = (item_shape[0], len(strings), *item_shape[1:])
+            # open_memmap writes the .npy header and sizes the file.
+            array = np.lib.format.open_memmap(
+                root / f"{key}.npy", mode="w+", dtype=np_dtype, shape=shape
+            )
+            del array
+
+        # Write the manifest last, so a store without one is known to
+        # be incomplete.
+        (root / cls.manifest_filename).write_text(
+            json.dumps(
+                {
+                    "item_shape": list(item_shape),
+                    "dtype": np_dtype.str,
+                    "model_hash": model_hash,
+                    "strings_checksum": strings_checksum(strings),
+                    "arrays": {key: f"{key}.npy" for key in array_keys},
+                    "position_major": position_major_keys,
+                    "strings": list(strings),
+                }
+            )
+        )
+        return cls(root)
+
+    @staticmethod
+    def _array_key(kind: str, block_idx: Optional[int] = None) -> str:
+        return kind if block_idx is None else f"{kind}-{block_idx:02d}"
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def has(self, kind: str, block_idx: Optional[int] = None) -> bool:
+        """Returns whether the store has an array for the given kind and block."""
+        return self._array_key(kind, block_idx) in self.manifest["arrays"]
+
+    def is_position_major(self, kind: str, block_idx: Optional[int] = None) -> bool:
+        """Returns whether the given kind and block are stored position major."""
+        return self._array_key(kind, block_idx) in self._position_major_keys
+
+    def _array(self, kind: str, block_idx: Optional[int] = None) -> np.ndarray:
+        key = self._array_key(kind, block_idx)
+        if key not in self._arrays:
+            assert self.has(kind, block_idx), f"store has no array for {key}"
+            # Copy-on-write mode gives a writeable view, which torch
+            # needs for a zero-copy tensor, without modifying the file.
+            self._arrays[key] = np.load(
+                self.root / self.manifest["arrays"][key], mmap_mode="c"
+            )
+        return self._arrays[key]
+
+    def get(self, kind: str, block_idx: Optional[int] = None) -> torch.Tensor:
+        """Returns the full (n_strings, *item_shape) tensor for the given kind
+        and block. The tensor is backed by the memory-mapped file, so slicing
+        it only reads the pages needed."""
+        t = torch.from_numpy(self._array(kind, block_idx))
+        if self.is_position_major(kind, block_idx):
+            return t.transpose(0, 1)
+        return t
+
+    def get_position(
+        self, kind: str, t_i: int, block_idx: Optional[int] = None
+    ) -> torch.Tensor:
+        """Returns the (n_strings, *item_shape[1:]) tensor of activations at
+        position `t_i` for the given kind and block. This is equivalent to
+        `get(kind, block_idx)[:, t_i]`, but is contiguous on disk if the kind
+        is stored position major."""
+        t = torch.from_numpy(self._array(kind, block_idx))
+        if self.is_position_major(kind, block_idx):
+            return t[t_i]
+        return t[:, t_i]
+
+    def write(
+        self,
+        kind: str,
+        values: torch.Tensor,
+        start_idx: int,
+        block_idx: Optional[int] = None,
+    ):
+        """Writes `values` to the rows starting at `start_idx` of the array
+        for the given kind and block."""
+        assert (
+            tuple(values.shape[1:]) == self.item_shape
+        ), f"values have item shape {tuple(values.shape[1:])}, store has {self.item_shape}"
+        end_idx = start_idx + values.shape[0]
+        assert end_idx <= len(
+            self
+        ), f"write to [{start_idx}, {end_idx}) is out of range"
+
+        key = self._array_key(kind, block_idx)
+        assert self.has(kind, block_idx), f"store has no array for {key}"
+        array = np.load(self.root / self.manifest["arrays"][key], mmap_mode="r+")
+        if self.is_position_major(kind, block_idx):
+            array[:, start_idx:end_idx] = values.detach().cpu().transpose(0, 1).numpy()
+        else:
+            array[start_idx:end_idx] = values.detach().cpu().numpy()
+        array.flush()
+        del array
+        # Drop any cached read view so the next get() sees the new data.
+        self._arrays.pop(key, None)
+
+    def string_idx(self, s: str) -> int:
+        """Returns the global index of the specified string."""
+        if self._idx_map is None:
+            self._idx_map = {s: idx for idx, s in enumerate(self.strings)}
+        return self._idx_map[s]
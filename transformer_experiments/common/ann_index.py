@@ -0,0 +1,358 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/common/ann-index.ipynb.
+
+# %% auto 0
+__all__ = ['kmeans', 'IVFFlatIndex', 'recall_at_k']
+
+# %% ../../nbs/common/ann-index.ipynb 5
+import math
+from pathlib import Path
+from typing import BinaryIO, Callable, Hashable, Optional, Sequence, Tuple, Union
+
+# %% ../../nbs/common/ann-index.ipynb 6
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# %% ../../nbs/common/ann-index.ipynb 8
+def _nearest_centroids(
+    x: torch.Tensor, centroids: torch.Tensor, n: int, spherical: bool
+) -> torch.Tensor:
+    """Returns the indices of the `n` centroids nearest to each row of `x`,
+    with shape (len(x), n). If `spherical` is True, centroids and rows are
+    assumed to be normalized and nearness is measured by dot product."""
+    scores = x @ centroids.T
+    if spherical:
+        return torch.topk(scores, k=n, dim=-1).indices
+    # ‖x - c‖² = ‖x‖² + ‖c‖² - 2x·c, and ‖x‖² doesn't affect the ranking.
+    sq_dists = centroids.square().sum(dim=-1)[None, :] - 2 * scores
+    return torch.topk(sq_dists, k=n, dim=-1, largest=False).indices
+
+
+def kmeans(
+    x: torch.Tensor,
+    n_clusters: int,
+    n_iter: int = 10,
+    spherical: bool = False,
+    max_samples_per_cluster: int = 256,
+    seed: int = 0,
+    chunk_size: int = 65536,
+) -> torch.Tensor:
+    """Clusters the rows of `x` (shape (N, D)) with k-means and returns the
+    centroids, with shape (n_clusters, D). The centroids are trained on a
+    random sample of at most `max_samples_per_cluster` rows per cluster. If
+    `spherical` is True, `x` should be normalized and the centroids are kept
+    normalized (i.e. clustering by cosine similarity)."""
+    N, _ = x.shape
+    assert 0 < n_clusters <= N, f"n_clusters must be in [1, {N}], was {n_clusters}"
+
+    generator = torch.Generator().manual_seed(seed)
+    n_samples = min(N, n_clusters * max_samples_per_cluster)
+    samples = x[torch.randperm(N, generator=generator)[:n_samples]].float()
+    centroids = samples[:n_clusters].clone()
+
+    for _ in range(n_iter):
+        assignments = torch.cat(
+            [
+                _nearest_centroids(
+                    samples[i : i + chunk_size], centroids, 1, spherical
+                )[:, 0]
+                for i in range(0, n_samples, chunk_size)
+            ]
+        )
+        sums = torch.zeros_like(centroids).index_add_(0, assignments, samples)
+        counts = torch.bincount(assignments, minlength=n_clusters)
+        # Clusters that ended up empty keep their previous centroid.
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        if spherical:
+            centroids = F.normalize(centroids, dim=-1)
+
+    return centroids
+
+# %% ../../nbs/common/ann-index.ipynb 10
+class IVFFlatIndex:
+    """An inverted file index: the vectors are clustered with `kmeans`, and
+    stored (uncompressed) grouped by their nearest centroid. `search` only
+    compares each query against the vectors in the `n_probe` lists whose
+    centroids are nearest to it. Use `build()` to create an index.
+
+    Vectors are identified by their row index in the tensor the index was
+    built from."""
+
+    def __init__(
+        self,
+        centroids: torch.Tensor,
+        vectors: torch.Tensor,
+        ids: torch.Tensor,
+        list_offsets: torch.Tensor,
+        spherical: bool,
+    ):
+        # List i is vectors[list_offsets[i] : list_offsets[i + 1]], and
+        # ids[j] is the original row index of vectors[j].
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.list_offsets = list_offsets
+        self.spherical = spherical
+
+    @classmethod
+    def build(
+        cls,
+        vectors: torch.Tensor,
+        n_lists: Optional[int] = None,
+        spherical: bool = False,
+        n_iter: int = 10,
+        seed: int = 0,
+    ) -> "IVFFlatIndex":
+        """Builds an index over the rows of `vectors` (shape (N, D)), with
+        `n_lists` lists (defaults to 4 * sqrt(N)). Use `spherical=True` for an
+        index that will be searched by cosine similarity: the lists are then
+        made by clustering the normalized vectors."""
+        N, _ = vectors.shape
+        if n_lists is None:
+            n_lists = max(1, int(4 * math.sqrt(N)))
+        n_lists = min(n_lists, N)
+
+        cluster_vectors = (
+            F.normalize(vectors.float(), dim=-1) if spherical else vectors.float()
+        )
+        centroids = kmeans(
+            cluster_vectors, n_lists, n_iter=n_iter, spherical=spherical, seed=seed
+        )
+        assignments = torch.cat(
+            [
+                _nearest_centroids(
+                    cluster_vectors[i : i + 65536], centroids, 1, spherical
+                )[:, 0]
+                for i in range(0, N, 65536)
+            ]
+        )
+        ids = torch.argsort(assignments, stable=True)
+        list_offsets = torch.zeros(n_lists + 1, dtype=torch.long)
+        list_offsets[1:] = torch.cumsum(
+            torch.bincount(assignments, minlength=n_lists), dim=0
+        )
+
+        return cls(centroids, vectors[ids].contiguous(), ids, list_offsets, spherical)
+
+    @classmethod
+    def build_from_batches(
+        cls,
+        load_batch: Callable[[int], torch.Tensor],
+        n_batches: int,
+        n_vectors: int,
+        vectors_filename: Path,
+        n_lists: Optional[int] = None,
+        spherical: bool = False,
+        n_iter: int = 10,
+        seed: int = 0,
+        max_samples_per_cluster: int = 256,
+    ) -> "IVFFlatIndex":
+        """Like `build`, but for the rows of the `n_batches` batches returned
+        by `load_batch` (`n_vectors` rows in all), without ever holding them
+        all in memory. The centroids are trained on a random sample of the
+        rows, and the rows are then assigned to lists and written to a
+        memory-mapped .npy file at `vectors_filename` one batch at a time.
+        Ids are indices into the concatenation of the batches."""
+        if n_lists is None:
+            n_lists = max(1, int(4 * math.sqrt(n_vectors)))
+        n_lists = min(n_lists, n_vectors)
+
+        def _cluster_vectors(batch: torch.Tensor) -> torch.Tensor:
+            batch = batch.float()
+            return F.normalize(batch, dim=-1) if spherical else batch
+
+        # Pass 1: gather the rows that the centroids are trained on.
+        generator = torch.Generator().manual_seed(seed)
+        n_samples = min(n_vectors, n_lists * max_samples_per_cluster)
+        sample_ids = torch.randperm(n_vectors, generator=generator)[:n_samples]
+        sample_ids = sample_ids.sort().values
+        samples, batch_starts = [], [0]
+        for batch_idx in range(n_batches):
+            batch = load_batch(batch_idx)
+            start, end = batch_starts[-1], batch_starts[-1] + batch.shape[0]
+            batch_starts.append(end)
+            lo, hi = torch.searchsorted(sample_ids, torch.tensor([start, end])).tolist()
+            rows = (sample_ids[lo:hi] - start).to(batch.device)
+            samples.append(_cluster_vectors(batch[rows]).cpu())
+        assert (
+            batch_starts[-1] == n_vectors
+        ), f"the batches had {batch_starts[-1]} rows, expected {n_vectors}"
+        centroids = kmeans(
+            torch.cat(samples),
+            n_lists,
+            n_iter=n_iter,
+            spherical=spherical,
+            max_samples_per_cluster=max_samples_per_cluster,
+            seed=seed,
+        )
+        del samples
+
+        # Pass 2: assign every row to its nearest centroid's list.
+        assignments = torch.cat(
+            [
+                _nearest_centroids(
+                    _cluster_vectors(load_batch(batch_idx)).cpu(),
+                    centroids,
+                    1,
+                    spherical,
+                )[:, 0]
+                for batch_idx in range(n_batches)
+            ]
+        )
+        ids = torch.argsort(assignments, stable=True)
+        list_offsets = torch.zeros(n_lists + 1, dtype=torch.long)
+        list_offsets[1:] = torch.cumsum(
+            torch.bincount(assignments, minlength=n_lists), dim=0
+        )
+        # slots[i] is where row i goes in the list-ordered vectors.
+        slots = torch.empty_like(ids)
+        slots[ids] = torch.arange(n_vectors)
+        del assignments
+
+        # Pass 3: write each batch's rows to their slots in the vectors file.
+        vectors: Optional[np.ndarray] = None
+        for batch_idx in range(n_batches):
+            batch = load_batch(batch_idx).cpu()
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    vectors_filename,
+                    mode="w+",
+                    dtype=batch.numpy().dtype,
+                    shape=(n_vectors, *batch.shape[1:]),
+                )
+            start, end = batch_starts[batch_idx], batch_starts[batch_idx + 1]
+            vectors[slots[start:end].numpy()] = batch.numpy()
+        assert vectors is not None, "n_batches was 0"
+        vectors.flush()
+
+        return cls(centroids, torch.from_numpy(vectors), ids, list_offsets, spherical)
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def search(
+        self,
+        queries: torch.Tensor,
+        k: int,
+        n_probe: int,
+        distance_function: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
+        largest: bool = False,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the top k vectors for each of `queries` (shape (n_queries, D)),
+        among the vectors in the `n_probe` lists nearest to the query (or
+        more lists, if those don't hold k vectors).
+        `distance_function` and `largest` are used as in `topk_across_batches`:
+        `distance_function(vectors, queries)` returns values of shape
+        (n_vectors, n_queries), and the k largest or smallest are returned.
+
+        Returns a tuple of (values, ids), both of shape (k, n_queries), like
+        `topk_across_batches`."""
+        n_queries, _ = queries.shape
+        device = queries.device
+        assert k <= len(self), f"k was {k}, but the index only has {len(self)} vectors"
+
+        # Rank all the lists by how near they are to each query, and probe
+        # the nearest n_probe of them, plus any more needed to see k vectors.
+        probe_queries = (
+            F.normalize(queries.float(), dim=-1) if self.spherical else queries.float()
+        )
+        ranked_lists = _nearest_centroids(
+            probe_queries, self.centroids.to(device), self.n_lists, self.spherical
+        )
+        list_offsets = self.list_offsets.to(device)
+        list_sizes = list_offsets[1:] - list_offsets[:-1]
+        n_seen = torch.cumsum(list_sizes[ranked_lists], dim=-1)
+        n_probes = ((n_seen < k).sum(dim=-1) + 1).clamp(min=n_probe)
+        probed = torch.zeros(
+            (n_queries, self.n_lists), dtype=torch.bool, device=device
+        ).scatter_(
+            1,
+            ranked_lists,
+            torch.arange(self.n_lists, device=device)[None, :] < n_probes[:, None],
+        )
+
+        fill_value = -math.inf if largest else math.inf
+        topk_values = torch.full(
+            (n_queries, k), fill_value, dtype=queries.dtype, device=device
+        )
+        topk_ids = torch.full((n_queries, k), -1, dtype=torch.long, device=device)
+
+        # Go list by list, searching each one for all the queries that probe
+        # it, so each list's vectors are only read once.
+        for list_idx in torch.nonzero(probed.any(dim=0)).squeeze(dim=1).tolist():
+            start, end = int(self.list_offsets[list_idx]), int(
+                self.list_offsets[list_idx + 1]
+            )
+            if start == end:
+                continue
+            query_indices = torch.nonzero(probed[:, list_idx]).squeeze(dim=1)
+
+            results = distance_function(
+                self.vectors[start:end].to(device), queries[query_indices]
+            )
+            list_values, list_indices = torch.topk(
+                results, k=min(k, end - start), largest=largest, dim=0
+            )
+
+            # Merge into the running top k for these queries.
+            merged = torch.topk(
+                torch.cat([topk_values[query_indices], list_values.T], dim=-1),
+                k=k,
+                largest=largest,
+                dim=-1,
+            )
+            topk_values[query_indices] = merged.values
+            topk_ids[query_indices] = torch.gather(
+                torch.cat(
+                    [
+                        topk_ids[query_indices],
+                        self.ids[start:end].to(device)[list_indices].T,
+                    ],
+                    dim=-1,
+                ),
+                dim=-1,
+                index=merged.indices,
+            )
+
+        return topk_values.T, topk_ids.T
+
+    def save(self, f: Union[Path, BinaryIO]):
+        """Saves the index to `f`, a filename or a file open for writing."""
+        torch.save(
+            {
+                "centroids": self.centroids,
+                "vectors": self.vectors,
+                "ids": self.ids,
+                "list_offsets": self.list_offsets,
+                "spherical": self.spherical,
+            },
+            f,
+        )
+
+    @classmethod
+    def load(cls, filename: Path) -> "IVFFlatIndex":
+        """Loads an index saved with `save`. The vectors are memory-mapped."""
+        d = torch.load(str(filename), mmap=True)
+        return cls(
+            d["centroids"], d["vectors"], d["ids"], d["list_offsets"], d["spherical"]
+        )
+
+# %% ../../nbs/common/ann-index.ipynb 11
+def recall_at_k(
+    exact: Sequence[Sequence[Hashable]], approx: Sequence[Sequence[Hashable]]
+) -> float:
+    """Returns the fraction of the exact top k results that the approximate
+    search also found, averaged over queries. `exact[i]` and `approx[i]` are
+    the results (e.g. strings or indices) for query i."""
+    assert len(exact) == len(
+        approx
+    ), f"{len(exact)} exact results, but {len(approx)} approximate"
+    recalls = [
+        len(set(e) & set(a)) / len(e) for e, a in zip(exact, approx) if len(e) > 0
+    ]
+    return sum(recalls) / len(recalls) if recalls else 1.0
@@ -0,0 +1,250 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/common/compressed-tensors.ipynb.
+
+# %% auto 0
+__all__ = ['Compress', 'Decompress', 'available_codecs', 'byte_shuffle', 'byte_unshuffle', 'save_compressed',
+           'CompressedTensorFile', 'load_compressed']
+
+# %% ../../nbs/common/compressed-tensors.ipynb 5
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
+from pathlib import Path
+import struct
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple, Union
+import zlib
+
+# %% ../../nbs/common/compressed-tensors.ipynb 6
+import numpy as np
+import torch
+
+# %% ../../nbs/common/compressed-tensors.ipynb 8
+Compress = Callable[[bytes, Optional[int]], bytes]
+Decompress = Callable[[bytes], bytes]
+
+_codecs: Dict[str, Tuple[Compress, Decompress]] = {}
+
+try:
+    import zstandard
+
+    _codecs["zstd"] = (
+        lambda data, level: zstandard.ZstdCompressor(
+            level=3 if level is None else level
+        ).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+except ImportError:
+    pass
+
+try:
+    import lz4.frame
+
+    _codecs["lz4"] = (
+        lambda data, level: lz4.frame.compress(
+            data, compression_level=0 if level is None else level
+        ),
+        lambda data: lz4.frame.decompress(data),
+    )
+except ImportError:
+    pass
+
+_codecs["zlib"] = (
+    lambda data, level: zlib.compress(data, 1 if level is None else level),
+    zlib.decompress,
+)
+
+
+def available_codecs() -> List[str]:
+    """Returns the names of the codecs that can be used in this
+    environment, most preferred first."""
+    return list(_codecs.keys())
+
+
+def _get_codec(codec: str) -> Tuple[Compress, Decompress]:
+    if codec not in _codecs:
+        raise ValueError(
+            f"codec {codec} is not available (available codecs: {available_codecs()})"
+        )
+    return _codecs[codec]
+
+# %% ../../nbs/common/compressed-tensors.ipynb 10
+def byte_shuffle(a: np.ndarray) -> bytes:
+    """Returns the bytes of `a` reordered so that the first bytes of all the
+    values come first, then all the second bytes, and so on."""
+    return a.reshape(-1).view(np.uint8).reshape(-1, a.itemsize).T.tobytes()
+
+
+def byte_unshuffle(data: bytes, dtype: np.dtype) -> np.ndarray:
+    """Inverse of `byte_shuffle`: returns a 1D array of `dtype` values."""
+    return (
+        np.frombuffer(data, dtype=np.uint8)
+        .reshape(dtype.itemsize, -1)
+        .T.copy()
+        .view(dtype)
+        .reshape(-1)
+    )
+
+# %% ../../nbs/common/compressed-tensors.ipynb 12
+_magic = b"TXCT0001"
+
+
+def save_compressed(
+    t: torch.Tensor,
+    f: Union[Path, BinaryIO],
+    codec: Optional[str] = None,
+    level: Optional[int] = None,
+    chunk_bytes: int = 2**20,
+    n_threads: Optional[int] = None,
+):
+    """Saves tensor `t` to `f` (a filename or a file open for writing) in
+    chunks of about `chunk_bytes` (uncompressed), each byte shuffled and
+    compressed with `codec` (defaults to the first of `available_codecs()`).
+    Chunks are compressed on a pool of `n_threads` threads."""
+    codec = codec or available_codecs()[0]
+    compress, _ = _get_codec(codec)
+
+    a = t.detach().cpu().contiguous().numpy()
+    assert a.ndim >= 1, "can only save tensors with at least one dimension"
+    row_bytes = max(1, a[:1].nbytes)
+    chunk_rows = max(1, chunk_bytes // row_bytes)
+    n_chunks = math.ceil(a.shape[0] / chunk_rows)
+
+    def _compress_chunk(chunk_idx: int) -> bytes:
+        chunk = a[chunk_idx * chunk_rows : (chunk_idx + 1) * chunk_rows]
+        return compress(byte_shuffle(chunk), level)
+
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        chunks = list(pool.map(_compress_chunk, range(n_chunks)))
+
+    header = json.dumps(
+        {
+            "shape": list(a.shape),
+            "dtype": a.dtype.str,
+            "codec": codec,
+            "chunk_rows": chunk_rows,
+            "chunk_lengths": [len(c) for c in chunks],
+        }
+    ).encode("utf-8")
+
+    def _write(out: BinaryIO):
+        out.write(_magic)
+        out.write(struct.pack("<Q", len(header)))
+        out.write(header)
+        for c in chunks:
+            out.write(c)
+
+    if isinstance(f, Path):
+        with open(f, "wb") as out:
+            _write(out)
+    else:
+        _write(f)
+
+# %% ../../nbs/common/compressed-tensors.ipynb 13
+class CompressedTensorFile:
+    """Reads a tensor saved by `save_compressed`. Only the file's header is
+    read when it's opened; `read_rows` reads and decompresses just the
+    chunks it needs, on a pool of `n_threads` threads."""
+
+    def __init__(self, filename: Path, n_threads: Optional[int] = None):
+        self.filename = filename
+        self.n_threads = n_threads
+        with open(filename, "rb") as f:
+            magic = f.read(len(_magic))
+            if magic != _magic:
+                raise ValueError(f"{filename} is not a compressed tensor file")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+            data_start = f.tell()
+
+        self.shape: Tuple[int, ...] = tuple(header["shape"])
+        self.dtype = np.dtype(header["dtype"])
+        self.codec: str = header["codec"]
+        self.chunk_rows: int = header["chunk_rows"]
+        _, self._decompress = _get_codec(self.codec)
+
+        self._chunk_lengths: List[int] = header["chunk_lengths"]
+        self._chunk_offsets = (
+            data_start + np.concatenate([[0], np.cumsum(self._chunk_lengths)])
+        ).tolist()
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def n_chunks(self) -> int:
+        return len(self._chunk_lengths)
+
+    def _read_chunk(self, chunk_idx: int) -> np.ndarray:
+        with open(self.filename, "rb") as f:
+            f.seek(self._chunk_offsets[chunk_idx])
+            data = f.read(self._chunk_lengths[chunk_idx])
+        return byte_unshuffle(self._decompress(data), self.dtype).reshape(
+            -1, *self.shape[1:]
+        )
+
+    def _empty(self, shape: Tuple[int, ...]) -> Tuple[torch.Tensor, np.ndarray]:
+        # Allocated by torch (and filled through a numpy view), so that the
+        # result owns its memory like any other in-memory tensor.
+        t = torch.empty(shape, dtype=torch.from_numpy(np.empty(0, self.dtype)).dtype)
+        return t, t.numpy()
+
+    def _map_chunks(self, fn: Callable[[int], None], chunk_indices: Sequence[int]):
+        if len(chunk_indices) == 1:
+            fn(chunk_indices[0])
+        elif len(chunk_indices) > 1:
+            with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+                # list() to re-raise any errors from the threads
+                list(pool.map(fn, chunk_indices))
+
+    def read_rows(
+        self, start: int, stop: int, index: Tuple[Any, ...] = ()
+    ) -> torch.Tensor:
+        """Returns rows [start, stop) of the tensor. If given, `index` is
+        applied to each row, e.g. `(t_i,)` to read just position t_i of each
+        row of a (B, T, C) tensor, without holding more than a chunk per
+        thread in full."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        row_shape = np.broadcast_to(np.uint8(0), self.shape[1:])[index].shape
+        t, out = self._empty((stop - start, *row_shape))
+
+        def _read_into_out(chunk_idx: int):
+            chunk_start = chunk_idx * self.chunk_rows
+            chunk = self._read_chunk(chunk_idx)
+            lo = max(start, chunk_start)
+            hi = min(stop, chunk_start + len(chunk))
+            out[lo - start : hi - start] = chunk[
+                (slice(lo - chunk_start, hi - chunk_start), *index)
+            ]
+
+        self._map_chunks(
+            _read_into_out,
+            range(start // self.chunk_rows, math.ceil(stop / self.chunk_rows)),
+        )
+        return t
+
+    def read_indices(self, indices: Sequence[int]) -> torch.Tensor:
+        """Returns the rows at `indices` (in that order), reading and
+        decompressing only the chunks that hold them."""
+        rows = np.asarray(indices, dtype=np.int64).reshape(-1)
+        rows = np.where(rows < 0, rows + len(self), rows)
+        if ((rows < 0) | (rows >= len(self))).any():
+            raise IndexError(f"indices out of range for {len(self)} rows")
+        t, out = self._empty((len(rows), *self.shape[1:]))
+        row_chunks = rows // self.chunk_rows
+
+        def _read_into_out(chunk_idx: int):
+            (positions,) = np.nonzero(row_chunks == chunk_idx)
+            chunk = self._read_chunk(chunk_idx)
+            out[positions] = chunk[rows[positions] - chunk_idx * self.chunk_rows]
+
+        self._map_chunks(_read_into_out, np.unique(row_chunks).tolist())
+        return t
+
+    def read(self) -> torch.Tensor:
+        """Returns the whole tensor."""
+        return self.read_rows(0, len(self))
+
+
+def load_compressed(filename: Path, n_threads: Optional[int] = None) -> torch.Tensor:
+    """Loads a whole tensor saved by `save_compressed`."""
+    return CompressedTensorFile(filename, n_threads=n_threads).read()
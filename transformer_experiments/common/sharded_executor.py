@@ -0,0 +1,138 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/common/sharded-executor.ipynb.
+
+# %% auto 0
+__all__ = ['RunBatches', 'shard_batches', 'run_each_batch', 'ShardedExecutor']
+
+# %% ../../nbs/common/sharded-executor.ipynb 5
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+from queue import Empty
+from typing import Callable, List, Optional, Sequence
+
+# %% ../../nbs/common/sharded-executor.ipynb 6
+import torch
+from tqdm.auto import tqdm
+
+# %% ../../nbs/common/sharded-executor.ipynb 8
+def shard_batches(batch_indices: Sequence[int], n_shards: int) -> List[Sequence[int]]:
+    """Splits `batch_indices` into at most `n_shards` contiguous shards whose
+    sizes differ by at most one."""
+    assert n_shards >= 1, f"n_shards must be >= 1, was {n_shards}"
+    n_shards = min(n_shards, len(batch_indices))
+    shard_size, remainder = (
+        divmod(len(batch_indices), n_shards) if n_shards > 0 else (0, 0)
+    )
+
+    shards: List[Sequence[int]] = []
+    start = 0
+    for shard_idx in range(n_shards):
+        end = start + shard_size + (1 if shard_idx < remainder else 0)
+        shards.append(batch_indices[start:end])
+        start = end
+    return shards
+
+# %% ../../nbs/common/sharded-executor.ipynb 10
+RunBatches = Callable[[Sequence[int], Callable[[], None]], None]
+
+
+def run_each_batch(
+    run_batch: Callable[[int], None],
+    batch_indices: Sequence[int],
+    on_batch_done: Callable[[], None],
+):
+    """A `RunBatches` function that calls `run_batch` on each batch in turn.
+    Use with `functools.partial` when a shard needs no setup of its own."""
+    for batch_idx in batch_indices:
+        run_batch(batch_idx)
+        on_batch_done()
+
+
+def _init_worker(n_threads: Optional[int]):
+    if n_threads is not None:
+        torch.set_num_threads(n_threads)
+
+
+def _run_shard(
+    run_batches: RunBatches,
+    batch_indices: Sequence[int],
+    progress_queue,
+):
+    run_batches(batch_indices, lambda: progress_queue.put(1))
+
+
+class ShardedExecutor:
+    """Runs the batches of an experiment across `n_workers` processes.
+
+    The work is given as a `run_batches(batch_indices, on_batch_done)`
+    function, which must process the given batches (calling `on_batch_done()`
+    after each one) and write their results to wherever the experiment keeps
+    them. The batches are split into contiguous shards, one per worker, and
+    `run_batches` is pickled and sent to each worker along with its shard, so
+    each worker gets its own copy of anything `run_batches` refers to (e.g.
+    the experiment and its model). Workers are started with `spawn`, so
+    `run_batches` must be importable (e.g. a bound method of an experiment
+    class, possibly wrapped in `functools.partial`).
+
+    Each worker sets `torch.set_num_threads(threads_per_worker)`, which
+    defaults to splitting the machine's cores evenly between the workers.
+    Progress is reported in a single progress bar across all workers. With
+    `n_workers=1`, the batches are run in the current process instead."""
+
+    def __init__(
+        self,
+        n_workers: int = 1,
+        threads_per_worker: Optional[int] = None,
+        mp_context: str = "spawn",
+    ):
+        assert n_workers >= 1, f"n_workers must be >= 1, was {n_workers}"
+        self.n_workers = n_workers
+        self.threads_per_worker = threads_per_worker
+        if self.threads_per_worker is None and n_workers > 1:
+            self.threads_per_worker = max(1, (os.cpu_count() or 1) // n_workers)
+        self.mp_context = mp_context
+
+    def run(
+        self,
+        run_batches: RunBatches,
+        batch_indices: Sequence[int],
+        disable_progress_bar: bool = False,
+    ):
+        with tqdm(total=len(batch_indices), disable=disable_progress_bar) as pbar:
+            if self.n_workers == 1:
+
+                def _on_batch_done():
+                    pbar.update(1)
+
+                _init_worker(self.threads_per_worker)
+                run_batches(batch_indices, _on_batch_done)
+                return
+
+            shards = shard_batches(batch_indices, self.n_workers)
+            ctx = multiprocessing.get_context(self.mp_context)
+            with ctx.Manager() as manager, ProcessPoolExecutor(
+                max_workers=len(shards),
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self.threads_per_worker,),
+            ) as executor:
+                progress_queue = manager.Queue()
+                futures = [
+                    executor.submit(_run_shard, run_batches, shard, progress_queue)
+                    for shard in shards
+                ]
+
+                # Update the progress bar as workers finish batches, until
+                # they've all finished.
+                while (
+                    not all(future.done() for future in futures)
+                    or not progress_queue.empty()
+                ):
+                    try:
+                        pbar.update(progress_queue.get(timeout=0.1))
+                    except Empty:
+                        pass
+
+                # Raise the first error from any of the workers.
+                for future in futures:
+                    future.result()
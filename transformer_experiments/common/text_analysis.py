@@ -1,7 +1,8 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/common/text-analysis.ipynb.
 
 # %% auto 0
-__all__ = ['build_next_token_map', 'top_nonzero_tokens', 'SubstringFrequencyAnalysis']
+__all__ = ['build_next_token_map', 'top_nonzero_tokens', 'SubstringFrequencyAnalysis', 'stack_next_token_map',
+           'BatchedSubstringFrequencyAnalysis']
 
 # %% ../../nbs/common/text-analysis.ipynb 4
 from collections import defaultdict
@@ -57,6 +58,30 @@ def top_nonzero_tokens(
     return [(itos[i], freqs[i].item()) for i in topk.indices.tolist()]
 
 # %% ../../nbs/common/text-analysis.ipynb 10
+def _print_frequency_summary(
+    top_tokens: Dict[str, Iterable[Tuple[str, float]]],
+    top_tokens_cumulative: Iterable[Tuple[str, float]],
+):
+    """Prints the top tokens for each substring, and for all of them
+    together, as computed by SubstringFrequencyAnalysis or
+    BatchedSubstringFrequencyAnalysis."""
+    print(f"Substrings: {', '.join([repr(substr) for substr in top_tokens.keys()])}")
+
+    print("Top Tokens for each substring:")
+    s_len = max([len(s) for s in top_tokens.keys()])
+    for s, tokens in top_tokens.items():
+        print(
+            f"{repr(s):>{2*s_len+2}}: {', '.join([f'{repr(token):>4} ({freq:>4})' for token, freq in tokens])}"
+        )
+
+    print("Cumulative Top Tokens:")
+    print(
+        ", ".join(
+            [f"{repr(token):>4} ({freq:.2f})" for token, freq in top_tokens_cumulative]
+        )
+    )
+
+
 class SubstringFrequencyAnalysis:
     """Class that performs frequency analysis on a body of text for a set of substrings."""
 
@@ -92,23 +117,108 @@ class SubstringFrequencyAnalysis:
         )
 
     def print_summary(self):
-        print(
-            f"Substrings: {', '.join([repr(substr) for substr in self.freq_map.keys()])}"
+        _print_frequency_summary(self.top_tokens, self.top_tokens_cumulative)
+
+# %% ../../nbs/common/text-analysis.ipynb 12
+def stack_next_token_map(
+    next_token_map: Dict[str, torch.Tensor]
+) -> Tuple[Dict[str, int], torch.Tensor]:
+    """Stacks the frequency tensors in a next token map (as returned by
+    `build_next_token_map`) into a single (n_prefixes, vocab_size) matrix.
+    Returns a map of prefix to row index along with the matrix."""
+    row_map = {s: i for i, s in enumerate(next_token_map.keys())}
+    return row_map, torch.stack(list(next_token_map.values()))
+
+# %% ../../nbs/common/text-analysis.ipynb 14
+class BatchedSubstringFrequencyAnalysis:
+    """Performs the same analysis as SubstringFrequencyAnalysis, but for many
+    groups of substrings at once. All results are kept as tensors; tokens are
+    only converted to strings when a group is printed or looked up."""
+
+    def __init__(
+        self,
+        groups: Sequence[Sequence[str]],
+        row_map: Dict[str, int],
+        freqs: torch.Tensor,
+        itos: Dict[int, str],
+    ):
+        """`row_map` and `freqs` are the outputs of `stack_next_token_map`."""
+        assert len(groups) > 0
+        assert all(len(group) > 0 for group in groups)
+
+        # Like SubstringFrequencyAnalysis, count each substring in a group
+        # only once, however many times it's repeated.
+        self.groups = [list(dict.fromkeys(group)) for group in groups]
+        groups = self.groups
+        self.itos = itos
+        n_groups = len(groups)
+        _, vocab_size = freqs.shape
+
+        # Gather the frequencies of every substring in every group into one
+        # (n_substrings, vocab_size) matrix. Substrings in group i occupy rows
+        # group_offsets[i]:group_offsets[i + 1].
+        group_lens = torch.tensor([len(group) for group in groups], dtype=torch.long)
+        self.group_offsets = torch.cat(
+            [torch.zeros(1, dtype=torch.long), torch.cumsum(group_lens, dim=0)]
         )
+        rows = torch.tensor([row_map[s] for group in groups for s in group])
+        self.freqs = freqs[rows]
 
-        print("Top Tokens for each substring:")
-        s_len = max([len(s) for s in self.freq_map.keys()])
-        for s, tokens in self.top_tokens.items():
-            print(
-                f"{repr(s):>{2*s_len+2}}: {', '.join([f'{repr(token):>4} ({freq:>4})' for token, freq in tokens])}"
-            )
+        # Sum the frequencies within each group (a segment sum).
+        group_ids = torch.repeat_interleave(torch.arange(n_groups), group_lens)
+        self.cumulative_freqs = torch.zeros(
+            (n_groups, vocab_size), dtype=freqs.dtype
+        ).index_add_(0, group_ids, self.freqs)
 
-        print("Cumulative Top Tokens:")
-        print(
-            ", ".join(
-                [
-                    f"{repr(token):>4} ({freq:.2f})"
-                    for token, freq in self.top_tokens_cumulative
-                ]
-            )
+        # Normalize the cumulative frequencies
+        self.norm_cumulative_freqs = (
+            self.cumulative_freqs.float()
+            / self.cumulative_freqs.sum(dim=-1, keepdim=True)
+        )
+
+        # Sort the tokens for each substring and each group by frequency. Only the
+        # first n_nonzero entries of each row are meaningful.
+        self.top_token_freqs, self.top_token_ids = torch.sort(
+            self.freqs, dim=-1, descending=True
+        )
+        self.n_nonzero = torch.count_nonzero(self.freqs, dim=-1)
+        (
+            self.top_token_freqs_cumulative,
+            self.top_token_ids_cumulative,
+        ) = torch.sort(self.norm_cumulative_freqs, dim=-1, descending=True)
+        self.n_nonzero_cumulative = torch.count_nonzero(self.cumulative_freqs, dim=-1)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def _decode(
+        self, ids: torch.Tensor, freqs: torch.Tensor, n: int
+    ) -> Iterable[Tuple[str, float]]:
+        return [
+            (self.itos[i], freq)
+            for i, freq in zip(ids[:n].tolist(), freqs[:n].tolist())
+        ]
+
+    def top_tokens(self, group_idx: int) -> Dict[str, Iterable[Tuple[str, float]]]:
+        """Returns the top tokens for each substring in the given group, in
+        the same format as SubstringFrequencyAnalysis.top_tokens."""
+        start, end = self.group_offsets[group_idx : group_idx + 2].tolist()
+        n_nonzero = self.n_nonzero[start:end].tolist()
+        return {
+            s: self._decode(self.top_token_ids[row], self.top_token_freqs[row], n)
+            for s, row, n in zip(self.groups[group_idx], range(start, end), n_nonzero)
+        }
+
+    def top_tokens_cumulative(self, group_idx: int) -> Iterable[Tuple[str, float]]:
+        """Returns the cumulative top tokens for the given group, in the same
+        format as SubstringFrequencyAnalysis.top_tokens_cumulative."""
+        return self._decode(
+            self.top_token_ids_cumulative[group_idx],
+            self.top_token_freqs_cumulative[group_idx],
+            int(self.n_nonzero_cumulative[group_idx].item()),
+        )
+
+    def print_summary(self, group_idx: int):
+        _print_frequency_summary(
+            self.top_tokens(group_idx), self.top_tokens_cumulative(group_idx)
         )
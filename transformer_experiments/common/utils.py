@@ -1,10 +1,33 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/common/utils.ipynb.
 
 # %% auto 0
-__all__ = ['T', 'aggregate_by_string_key', 'DataWrapper', 'topk_across_batches']
+__all__ = ['T', 'aggregate_by_string_key', 'DataWrapper', 'PrefetchingBatchLoader', 'atomic_save', 'atomic_write_text',
+           'strings_checksum', 'file_checksum', 'WriteBehindWriter', 'RunManifest', 'RunningTopK',
+           'topk_across_batches', 'BufferPool']
 
 # %% ../../nbs/common/utils.ipynb 4
-from typing import Callable, Dict, Generic, Iterable, Sequence, Tuple, TypeVar
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 # %% ../../nbs/common/utils.ipynb 5
 import torch
@@ -45,17 +68,451 @@ class DataWrapper(Generic[T]):
             print(self.format_item_fn(d))
 
 # %% ../../nbs/common/utils.ipynb 11
+def _is_memory_mapped(t: torch.Tensor) -> bool:
+    # Tensors whose storage torch didn't allocate itself, as for
+    # `torch.load(..., mmap=True)` and `torch.from_numpy` of an `np.memmap`,
+    # have storage that can't be resized. (So do other tensors made with
+    # `torch.from_numpy`, which are just copied when they needn't be.)
+    return not t.untyped_storage().resizable()
+
+
+class PrefetchingBatchLoader(Generic[T]):
+    """Wraps a `load_batch` function so that when batch i is requested, the
+    following `depth` batches are loaded on a thread pool while the caller
+    works on batch i. This lets I/O for the next batches overlap with compute
+    on the current one. With `depth=0`, batches are loaded synchronously when
+    requested.
+
+    If `max_bytes` is given, no more batches are prefetched once the batches
+    loaded but not yet requested would exceed it (estimated from the size of
+    the largest batch seen so far, counting the tensors in batches that are
+    lists or tuples of them).
+
+    If `page_in` is True, memory-mapped tensor batches (e.g. from
+    `torch.load(..., mmap=True)` or an `ActivationStore`) are copied on the
+    worker thread. This forces them to be read from disk there rather than
+    when the caller first touches them. Batches that are already in memory
+    (e.g. decompressed ones) are returned as they are."""
+
+    def __init__(
+        self,
+        load_batch: Callable[[int], T],
+        n_batches: int,
+        depth: int = 2,
+        max_bytes: Optional[int] = None,
+        page_in: bool = True,
+    ):
+        assert depth >= 0, f"depth must be >= 0, was {depth}"
+        self.load_batch = load_batch
+        self.n_batches = n_batches
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.page_in = page_in
+
+        self.executor = ThreadPoolExecutor(max_workers=depth) if depth > 0 else None
+        self.futures: Dict[int, Future] = {}
+        self.batch_nbytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Cancels any outstanding prefetches and shuts down the thread pool."""
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def _load(self, batch_idx: int) -> T:
+        batch = self.load_batch(batch_idx)
+        if (
+            self.page_in
+            and isinstance(batch, torch.Tensor)
+            and _is_memory_mapped(batch)
+        ):
+            batch = batch.clone()  # type: ignore
+        return batch
+
+    def _prefetch_after(self, batch_idx: int):
+        assert self.executor is not None
+        for i in range(batch_idx + 1, min(batch_idx + 1 + self.depth, self.n_batches)):
+            if i in self.futures:
+                continue
+            if (
+                self.max_bytes is not None
+                and (len(self.futures) + 1) * self.batch_nbytes > self.max_bytes
+            ):
+                break
+            self.futures[i] = self.executor.submit(self._load, i)
+
+    def __call__(self, batch_idx: int) -> T:
+        if self.executor is None:
+            return self.load_batch(batch_idx)
+
+        future = self.futures.pop(batch_idx, None)
+        if future is None:
+            future = self.executor.submit(self._load, batch_idx)
+
+        batch = future.result()
+        tensors = batch if isinstance(batch, (list, tuple)) else [batch]
+        self.batch_nbytes = max(
+            self.batch_nbytes,
+            sum(t.nbytes for t in tensors if isinstance(t, torch.Tensor)),
+        )
+
+        self._prefetch_after(batch_idx)
+        return batch
+
+    def __iter__(self) -> Iterator[T]:
+        for batch_idx in range(self.n_batches):
+            yield self(batch_idx)
+
+# %% ../../nbs/common/utils.ipynb 13
+def _temp_filename(filename: Path) -> Path:
+    # Put the temp file next to the final one, so the rename is on the same
+    # filesystem (and therefore atomic).
+    return filename.with_name(
+        f".{filename.name}.tmp-{os.getpid()}-{threading.get_ident()}"
+    )
+
+
+def atomic_save(
+    obj: Any, filename: Path, save_fn: Callable[[Any, BinaryIO], None] = torch.save
+):
+    """Like `torch.save(obj, filename)`, but writes to a temp file which is
+    then renamed to `filename`, so a reader (or a later resumed run) never
+    sees a partially written file. `save_fn` writes `obj` to an open file,
+    for saving in a format other than `torch.save`'s."""
+    temp_filename = _temp_filename(filename)
+    try:
+        with open(temp_filename, "wb") as f:
+            save_fn(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, filename)
+    finally:
+        if temp_filename.exists():
+            temp_filename.unlink()
+
+
+def atomic_write_text(filename: Path, text: str):
+    """Like `filename.write_text(text)`, but atomic (see `atomic_save`)."""
+    temp_filename = _temp_filename(filename)
+    try:
+        with open(temp_filename, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, filename)
+    finally:
+        if temp_filename.exists():
+            temp_filename.unlink()
+
+
+def strings_checksum(strings: Sequence[str]) -> str:
+    """Returns the sha256 of a sequence of strings, e.g. for checking that a
+    resumed job is running over the same strings as before."""
+    h = hashlib.sha256()
+    for s in strings:
+        h.update(s.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_checksum(filename: Path) -> str:
+    """Returns the sha256 of the file's contents."""
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# %% ../../nbs/common/utils.ipynb 15
+class WriteBehindWriter:
+    """Runs writes (e.g. `torch.save`) on background threads, so that writing
+    one batch's results to disk overlaps with computing the next batch.
+
+    At most `max_pending` writes can be queued or in progress at once. When
+    that many are outstanding, `submit` blocks until one finishes, so memory
+    held by results waiting to be written stays bounded if the disk falls
+    behind. With `max_pending=0`, writes happen synchronously in `submit`.
+    With a single worker (the default), writes happen in submission order.
+
+    An error raised by a write is re-raised by the next call to `submit` or
+    `flush`. Used as a context manager, the writer waits for all pending
+    writes on exit, including when exiting because of an exception."""
+
+    def __init__(self, max_pending: int = 2, n_workers: int = 1):
+        assert max_pending >= 0, f"max_pending must be >= 0, was {max_pending}"
+        assert n_workers >= 1, f"n_workers must be >= 1, was {n_workers}"
+        self.max_pending = max_pending
+
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.slots: Optional[threading.BoundedSemaphore] = None
+        if max_pending > 0:
+            self.executor = ThreadPoolExecutor(max_workers=n_workers)
+            self.slots = threading.BoundedSemaphore(max_pending)
+        self.futures: List[Future] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        except Exception:
+            # Don't mask an exception that's already propagating.
+            if exc_type is None:
+                raise
+
+    def _raise_errors(self):
+        """Raises the error from any completed write that failed, and forgets
+        about completed writes."""
+        done = [future for future in self.futures if future.done()]
+        self.futures = [future for future in self.futures if future not in done]
+        for future in done:
+            future.result()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs):
+        """Queues a call to `fn(*args, **kwargs)`, blocking first if there are
+        already `max_pending` writes outstanding. The arguments must not be
+        modified by the caller afterwards."""
+        self._raise_errors()
+        if self.executor is None:
+            fn(*args, **kwargs)
+            return
+
+        assert self.slots is not None
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())  # type: ignore
+        self.futures.append(future)
+
+    def save(self, obj: Any, filename: Path):
+        """Queues a `torch.save` of `obj` to `filename` (done atomically,
+        see `atomic_save`)."""
+        self.submit(atomic_save, obj, filename)
+
+    def flush(self):
+        """Waits for all pending writes to finish, then raises the error from
+        the first one that failed, if any."""
+        wait(self.futures)
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Flushes pending writes and shuts down the worker threads."""
+        try:
+            self.flush()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+
+# %% ../../nbs/common/utils.ipynb 17
+class RunManifest:
+    """Records which batches of a long-running job have been completed, so
+    that a job that is restarted (e.g. after being preempted) can skip them.
+
+    The manifest is a JSON file holding the job's `config` and, for each
+    completed batch, the size and modification time of the files it wrote
+    (as paths relative to the manifest's directory), which are cheap to
+    record and check. With `record_checksums`, their sha256 checksums are
+    recorded too, which means reading each file back when its batch is
+    marked complete. The manifest is rewritten atomically every time a
+    batch completes. A batch only counts as complete if all of its files
+    still exist with the recorded sizes and modification times and, with
+    `verify_checksums`, the recorded checksums (for files that have them).
+
+    If a manifest already exists with a different `config` (e.g. a different
+    batch size or model), the job's existing outputs can't be reused and
+    the manifest is reset.
+
+    Copies of a manifest in different processes (e.g. the workers of a
+    `ShardedExecutor`) can all mark batches complete: updates are made
+    under a lock file, merging in batches completed by the others."""
+
+    def __init__(
+        self,
+        filename: Path,
+        config: Optional[Dict[str, Any]] = None,
+        record_checksums: bool = False,
+    ):
+        self.filename = filename
+        self.config = {} if config is None else config
+        self.record_checksums = record_checksums
+        self.completed_batches: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        self._load()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _load(self):
+        """Merges in the batches recorded in the manifest file, if it exists
+        and has the same config."""
+        if not self.filename.exists():
+            return
+        manifest = json.loads(self.filename.read_text())
+        if manifest["config"] == self.config:
+            # Manifests used to record just each file's checksum
+            self.completed_batches.update(
+                {
+                    int(batch_idx): {
+                        name: record if isinstance(record, dict) else {"sha256": record}
+                        for name, record in files.items()
+                    }
+                    for batch_idx, files in manifest["completed_batches"].items()
+                }
+            )
+
+    def _file_record(self, filename: Path) -> Dict[str, Any]:
+        stat = filename.stat()
+        record: Dict[str, Any] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if self.record_checksums:
+            record["sha256"] = file_checksum(filename)
+        return record
+
+    def is_complete(self, batch_idx: int, verify_checksums: bool = False) -> bool:
+        """Returns whether the batch was completed and its files are intact."""
+        files = self.completed_batches.get(batch_idx)
+        if files is None:
+            return False
+
+        root = self.filename.parent
+        for name, record in files.items():
+            filename = root / name
+            if not filename.exists():
+                return False
+            if "size" in record:
+                stat = filename.stat()
+                if (stat.st_size, stat.st_mtime_ns) != (
+                    record["size"],
+                    record["mtime_ns"],
+                ):
+                    return False
+            if (
+                verify_checksums
+                and "sha256" in record
+                and file_checksum(filename) != record["sha256"]
+            ):
+                return False
+        return True
+
+    def mark_complete(self, batch_idx: int, filenames: Iterable[Path] = ()):
+        """Records that the batch has been completed, having written the given
+        files. Safe to call from multiple threads."""
+        root = self.filename.parent
+        files = {
+            str(filename.relative_to(root)): self._file_record(filename)
+            for filename in filenames
+        }
+        lock_filename = self.filename.with_name(f".{self.filename.name}.lock")
+        with self.lock, open(lock_filename, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._load()
+            self.completed_batches[batch_idx] = files
+            atomic_write_text(
+                self.filename,
+                json.dumps(
+                    {
+                        "config": self.config,
+                        "completed_batches": {
+                            str(batch_idx): files
+                            for batch_idx, files in sorted(
+                                self.completed_batches.items()
+                            )
+                        },
+                    },
+                    indent=2,
+                ),
+            )
+
+# %% ../../nbs/common/utils.ipynb 19
+class RunningTopK:
+    """Keeps the top k values seen so far along the first dimension of a
+    sequence of batches of results, and their indices across all the batches.
+    Each batch's top k is merged into a running buffer as it's added, so
+    memory use doesn't grow with the number of batches. Any further dimensions
+    (e.g. one per query) are treated independently."""
+
+    def __init__(self, k: int, largest: bool):
+        self.k = k
+        self.largest = largest
+        self.values: Optional[torch.Tensor] = None
+        self.indices: Optional[torch.Tensor] = None
+
+        # Number of items in all the batches added so far, used to translate
+        # indices within a batch into indices across all batches.
+        self.n_items_seen = 0
+
+    def add(self, results: torch.Tensor):
+        """Adds a batch of results, of shape (n_items, ...)."""
+        assert (
+            results.shape[0] >= self.k
+        ), f"Batch had {results.shape[0]} items, but k was {self.k}."
+
+        batch_values, batch_indices = torch.topk(
+            results, k=self.k, largest=self.largest, dim=0
+        )
+        batch_indices += self.n_items_seen
+        self.n_items_seen += results.shape[0]
+
+        if self.values is None or self.indices is None:
+            self.values, self.indices = batch_values, batch_indices
+            return
+
+        # Merge this batch's top k into the running top k. The indices
+        # returned by topk point into the concatenated buffer, so gather
+        # the global indices they correspond to.
+        merged = torch.topk(
+            torch.cat([self.values, batch_values]),
+            k=self.k,
+            largest=self.largest,
+            dim=0,
+        )
+        self.values = merged.values
+        self.indices = torch.gather(
+            torch.cat([self.indices, batch_indices]), dim=0, index=merged.indices
+        )
+
+    def result(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns (values, indices), both of shape (k, ...)."""
+        assert self.values is not None and self.indices is not None, "no batches added"
+        return self.values, self.indices
+
+# %% ../../nbs/common/utils.ipynb 21
 def topk_across_batches(
     n_batches: int,
     k: int,
     largest: bool,
     load_batch: Callable[[int], torch.Tensor],
     process_batch: Callable[[torch.Tensor], torch.Tensor],
+    prefetch_depth: int = 0,
+    prefetch_max_bytes: Optional[int] = None,
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     """Like torch.topk, but works across multiple batches of data. Always
     works over the batch dimension, which is assumed to be the first dimension
     of each batch.
 
+    The top k values seen so far are kept in a `RunningTopK` that each batch's
+    results are merged into as it is processed, so memory use does not grow
+    with the number of batches.
+
     Parameters:
     -----------
     n_batches:
@@ -70,73 +527,111 @@ def topk_across_batches(
         A function that takes a batch of data and returns a tensor of
         values, with the same first dimension size as the batch. The function
         will return the top k of these values along the batch dimension.
+        Any further dimensions (e.g. one per query) are treated independently.
+    prefetch_depth:
+        If > 0, the number of batches to load ahead of the one being processed,
+        on background threads (see PrefetchingBatchLoader).
+    prefetch_max_bytes:
+        Optional cap on the memory used by prefetched batches.
 
     Returns:
     --------
         A tuple of (values, indices) where indices is a list of indices into
-        the overall dataset i.e. across all batches.
+        the overall dataset i.e. across all batches. Both have shape
+        (k, *results.shape[1:]).
     """
-    all_topk_values = []
-    all_topk_indices = []
+    assert n_batches > 0, "n_batches was 0"
+    running_topk = RunningTopK(k, largest)
+    with PrefetchingBatchLoader(
+        load_batch, n_batches, depth=prefetch_depth, max_bytes=prefetch_max_bytes
+    ) as loader:
+        for batch_idx in range(n_batches):
+            batch = loader(batch_idx)
 
-    batch_sizes = []
-    # Go through each batch and find the top k closest items
-    # within that batch.
-    for batch_idx in range(n_batches):
-        batch = load_batch(batch_idx)
+            results = process_batch(batch)
 
-        results = process_batch(batch)
+            assert (
+                results.shape[0] == batch.shape[0]
+            ), f"Batch had {batch.shape[0]} items, but results had {results.shape[0]} items."
+            running_topk.add(results)
 
-        assert (
-            results.shape[0] == batch.shape[0]
-        ), f"Batch had {batch.shape[0]} items, but results had {results.shape[0]} items."
-        assert batch.shape[0] >= k, f"Batch had {batch.shape[0]} items, but k was {k}."
-
-        batch_sizes.append(batch.shape[0])
-
-        topk_values, topk_indices = torch.topk(results, k=k, largest=largest, dim=0)
-        all_topk_values.append(topk_values)
-        all_topk_indices.append(topk_indices)
-
-    # Combine the results from all batches.
-    all_topk_values_tensor = torch.cat(all_topk_values)
-    all_topk_indices_tensor = torch.cat(all_topk_indices)
-
-    # Find the topk items across all batches.
-    topk = torch.topk(all_topk_values_tensor, k=k, largest=largest, dim=0)
-    topk_overall_values: torch.Tensor = topk.values
-
-    # Now we have to do math to translate the indices into all_topk_distances
-    # into indices across all data items across all batches.
-
-    # First, calculate the cumulative sum of the batch sizes.
-    # Stick a zero at the front so that we can index into this
-    # with batch_idx and know how many items were in all the
-    # previous batches.
-    prev_batch_sums = torch.cat(
-        [
-            torch.tensor([0], device=all_topk_values_tensor.device),
-            torch.cumsum(
-                torch.tensor(batch_sizes, device=all_topk_values_tensor.device), dim=0
-            ),
-        ]
-    )
+    return running_topk.result()
+
+# %% ../../nbs/common/utils.ipynb 24
+class BufferPool:
+    """Hands out preallocated tensors for batch loops, so that each batch can
+    write its outputs in place (through `out=` arguments) instead of
+    allocating new tensors. `acquire()` returns a free buffer of the given
+    shape, dtype and device, allocating one only if there isn't one, and
+    `release()` returns it to the pool once its contents are no longer needed
+    (e.g. once a background write of them has finished). In steady state, a
+    loop over equal-sized batches allocates nothing, so its memory stays flat
+    without forcing garbage collection.
+
+    `allocated_bytes` and `peak_bytes` report the memory held by the pool's
+    buffers now and at its highest. `release()` may be called from another
+    thread (e.g. a WriteBehindWriter's). Pickling a pool (e.g. to send an
+    experiment to a worker process) gives an empty pool."""
+
+    def __init__(self, device: Optional[Union[str, torch.device]] = None):
+        self.device = device
+        self._free: Dict[Tuple, List[torch.Tensor]] = {}
+        self._devices: Dict[Union[str, torch.device], torch.device] = {}
+        self._lock = threading.Lock()
+        self.allocated_bytes = 0
+        self.peak_bytes = 0
+        self.n_allocations = 0
 
-    topk_overall_indices = []
-    for i in topk.indices:
-        # i is the index into all_topk_distances. First, let's figure
-        # out which batch it came from.
-        batch_idx = i // k
+    def __getstate__(self):
+        return {"device": self.device}
 
-        # Now we need to figure out which index into that batch it was.
-        # all_topk_indices has the indices from the topk operation on
-        # each batch.
-        index_within_batch = torch.gather(
-            all_topk_indices_tensor, dim=0, index=i.unsqueeze(0)
-        ).squeeze(0)
+    def __setstate__(self, state):
+        self.__init__(state["device"])
+
+    def _key(
+        self,
+        shape: Sequence[int],
+        dtype: torch.dtype,
+        device: Optional[Union[str, torch.device]],
+    ) -> Tuple:
+        device = device or self.device or "cpu"
+        # Resolve e.g. "cuda" to "cuda:0", so that the key a buffer is
+        # acquired under matches the one built from its .device on release.
+        if device not in self._devices:
+            self._devices[device] = torch.empty(0, device=device).device
+        return (tuple(shape), dtype, self._devices[device])
+
+    def acquire(
+        self,
+        shape: Sequence[int],
+        dtype: torch.dtype = torch.float32,
+        device: Optional[Union[str, torch.device]] = None,
+    ) -> torch.Tensor:
+        """Returns a buffer of the given shape, dtype and device (which
+        defaults to the pool's). Its contents are undefined."""
+        key = self._key(shape, dtype, device)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+        buffer = torch.empty(key[0], dtype=dtype, device=key[2])
+        with self._lock:
+            self.allocated_bytes += buffer.element_size() * buffer.numel()
+            self.peak_bytes = max(self.peak_bytes, self.allocated_bytes)
+            self.n_allocations += 1
+        return buffer
 
-        # The overall index is the sum of the number of items in all
-        # previous batches, plus the index within the current batch.
-        topk_overall_indices.append(prev_batch_sums[batch_idx] + index_within_batch)
+    def release(self, buffer: torch.Tensor):
+        """Returns a buffer from `acquire()` to the pool. It must not be used
+        by the caller afterwards."""
+        key = self._key(buffer.shape, buffer.dtype, buffer.device)
+        with self._lock:
+            self._free.setdefault(key, []).append(buffer)
 
-    return topk_overall_values, torch.stack(topk_overall_indices)
+    def clear(self):
+        """Frees the buffers that are in the pool (i.e. not acquired)."""
+        with self._lock:
+            for buffers in self._free.values():
+                for buffer in buffers:
+                    self.allocated_bytes -= buffer.element_size() * buffer.numel()
+            self._free.clear()
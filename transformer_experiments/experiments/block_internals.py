@@ -2,18 +2,22 @@
 
 # %% auto 0
 __all__ = ['BlockInternalsAccessors', 'BlockInternalsExperiment', 'DistanceFunction', 'batch_distances', 'batch_cosine_sim',
-           'GetFilenameForBatchAndBlock', 'BatchedBlockInternalsExperiment', 'run', 'BlockInternalsAnalysis']
+           'GetFilenameForBatchAndBlock', 'OutputSearch', 'BatchedBlockInternalsExperiment', 'StoredBlockInternals',
+           'run', 'BlockInternalsAnalysis']
 
 # %% ../../nbs/experiments/block-internals.ipynb 5
 from collections import defaultdict, OrderedDict
 from dataclasses import dataclass
+from functools import partial
 import json
 import math
 from matplotlib.axes import Axes
 import matplotlib.pyplot as plt
 from pathlib import Path
 import tempfile
+import warnings
 from typing import (
+    Any,
     Callable,
     Dict,
     Iterable,
@@ -22,6 +26,7 @@ from typing import (
     Optional,
     Protocol,
     Sequence,
+    Set,
     Tuple,
 )
 
@@ -32,10 +37,27 @@ import torch.nn.functional as F
 from tqdm.auto import tqdm
 
 # %% ../../nbs/experiments/block-internals.ipynb 7
+from ..common.activation_store import ActivationStore, model_hash
+from ..common.ann_index import IVFFlatIndex
+from transformer_experiments.common.compressed_tensors import (
+    available_codecs,
+    CompressedTensorFile,
+    load_compressed,
+    save_compressed,
+)
 from ..common.databatcher import DataBatcher
+from ..common.sharded_executor import ShardedExecutor
 from ..environments import get_environment
 from ..common.substring_generator import all_unique_substrings
-from ..common.utils import topk_across_batches
+from transformer_experiments.common.utils import (
+    atomic_save,
+    PrefetchingBatchLoader,
+    RunManifest,
+    RunningTopK,
+    strings_checksum,
+    topk_across_batches,
+    WriteBehindWriter,
+)
 from ..dataset_split import split_text_dataset
 from transformer_experiments.datasets.tinyshakespeare import (
     TinyShakespeareDataSet,
@@ -59,10 +81,16 @@ from transformer_experiments.trained_models.tinyshakespeare_transformer import (
 # %% ../../nbs/experiments/block-internals.ipynb 8
 class BlockInternalsAccessors:
     """Helper class that provides easy access to the block internals values
-    for a given prompt."""
+    for a given prompt. If `stop_after_block` is given, only the blocks up to
+    and including it are run (see `TransformerAccessors.run_model`), and only
+    their values are available."""
 
     def __init__(
-        self, prompt: str, eh: EncodingHelpers, accessors: TransformerAccessors
+        self,
+        prompt: str,
+        eh: EncodingHelpers,
+        accessors: TransformerAccessors,
+        stop_after_block: Optional[int] = None,
     ):
         self.prompt = prompt
         self.eh = eh
@@ -71,7 +99,9 @@ class BlockInternalsAccessors:
         tokens = self.eh.tokenize_string(prompt)
         self.embedding = accessors.embed_tokens(tokens)
 
-        _, self.io_accessors = accessors.run_model(self.embedding)
+        _, self.io_accessors = accessors.run_model(
+            self.embedding, stop_after_block=stop_after_block
+        )
 
     def input_embedding(self) -> torch.Tensor:
         """Returns the input to the specified block."""
@@ -101,13 +131,16 @@ class BlockInternalsAccessors:
 # %% ../../nbs/experiments/block-internals.ipynb 13
 class BlockInternalsExperiment:
     """An experiment to run a bunch of inputs through the model and save the
-    intermediate values produced within each block."""
+    intermediate values produced within each block. If `stop_after_block` is
+    given, only the blocks up to and including it are run, and only their
+    values are saved."""
 
     def __init__(
         self,
         eh: EncodingHelpers,
         accessors: TransformerAccessors,
         strings: Sequence[str],
+        stop_after_block: Optional[int] = None,
     ):
         self.eh = eh
         self.accessors = accessors
@@ -120,7 +153,9 @@ class BlockInternalsExperiment:
         self.idx_map = OrderedDict((s, idx) for idx, s in enumerate(self.strings))
 
         # Run the embeddings through the model.
-        _, self.io_accessors = self.accessors.run_model(self.embeddings)
+        _, self.io_accessors = self.accessors.run_model(
+            self.embeddings, stop_after_block=stop_after_block
+        )
 
     def string_idx(self, s: str) -> int:
         """Returns the index of the specified string."""
@@ -155,29 +190,89 @@ class DistanceFunction(Protocol):
     def __call__(self, batch: torch.Tensor, queries: torch.Tensor) -> torch.Tensor: ...
 
 # %% ../../nbs/experiments/block-internals.ipynb 16
-def batch_distances(batch: torch.Tensor, queries: torch.Tensor) -> torch.Tensor:
-    """Returns the distance between each item in the batch and the queries."""
+def batch_distances(
+    batch: torch.Tensor,
+    queries: torch.Tensor,
+    max_chunk_bytes: int = 256 * 2**20,
+    exact_rerank: bool = True,
+    rerank_rtol: float = 1e-2,
+) -> torch.Tensor:
+    """Returns the distance between each item in the batch and the queries.
+
+    Squared distances are computed as ‖a‖² + ‖b‖² - 2ab, so the bulk of the
+    work is a matrix multiply and no (B, n_queries, D) temporary is created.
+    The batch and queries are processed in chunks whose (chunk_B, chunk_n_queries)
+    block of results fits in `max_chunk_bytes`.
+
+    The expansion loses precision when two vectors are close relative to their
+    norms. If `exact_rerank` is True, distances for pairs where the squared
+    distance is less than `rerank_rtol` * (‖a‖² + ‖b‖²) are recomputed exactly
+    from the difference of the vectors. These are the nearest pairs, which are
+    the ones that matter most when looking for the closest items."""
     assert batch.dim() == 2, f"batch.dim() should be 2, was {batch.dim()}"
     assert queries.dim() == 2, f"query.dim() should be 2, was {queries.dim()}"
     assert (
         batch.shape[-1] == queries.shape[-1]
     ), f"last dimension of batch was {batch.shape[-1]}, which does not match last dimension of queries {queries.shape[-1]}"
 
-    B, _ = batch.shape
+    B, D = batch.shape
     n_queries, _ = queries.shape
 
-    distances = torch.norm(
-        # Reshape the batch to a singleton dimension, then expand that dimension
-        # by the number of queries. We can then subtract all the queries in one
-        # go.
-        batch.reshape(B, 1, -1).expand(-1, n_queries, -1) - queries,
-        dim=2,
-    )
+    max_chunk_elems = max(1, max_chunk_bytes // batch.element_size())
+    queries_chunk_size = min(n_queries, max_chunk_elems)
+    batch_chunk_size = max(1, max_chunk_elems // queries_chunk_size)
+    # Max number of pairs to rerank at once, so the differences fit in the budget.
+    rerank_chunk_size = max(1, max_chunk_elems // D)
+
+    batch_sq_norms = torch.linalg.vector_norm(batch, dim=-1).square()
+    queries_sq_norms = torch.linalg.vector_norm(queries, dim=-1).square()
+
+    distances = torch.empty((B, n_queries), dtype=batch.dtype, device=batch.device)
+    for b_start in range(0, B, batch_chunk_size):
+        b_end = min(b_start + batch_chunk_size, B)
+        batch_chunk = batch[b_start:b_end]
+        for q_start in range(0, n_queries, queries_chunk_size):
+            q_end = min(q_start + queries_chunk_size, n_queries)
+            queries_chunk = queries[q_start:q_end]
+
+            sq_norm_sums = (
+                batch_sq_norms[b_start:b_end, None]
+                + queries_sq_norms[None, q_start:q_end]
+            )
+            sq_distances = torch.addmm(
+                sq_norm_sums, batch_chunk, queries_chunk.T, alpha=-2
+            ).clamp_(min=0)
+
+            if exact_rerank:
+                b_idxs, q_idxs = torch.nonzero(
+                    sq_distances < rerank_rtol * sq_norm_sums, as_tuple=True
+                )
+                for r_start in range(0, b_idxs.shape[0], rerank_chunk_size):
+                    b_i = b_idxs[r_start : r_start + rerank_chunk_size]
+                    q_i = q_idxs[r_start : r_start + rerank_chunk_size]
+                    sq_distances[b_i, q_i] = (
+                        (batch_chunk[b_i] - queries_chunk[q_i]).square().sum(dim=-1)
+                    )
+
+            distances[b_start:b_end, q_start:q_end] = sq_distances.sqrt_()
+
     return distances
 
-# %% ../../nbs/experiments/block-internals.ipynb 17
-def batch_cosine_sim(batch: torch.Tensor, queries: torch.Tensor) -> torch.Tensor:
-    """Returns the cosine similarity between each item in the batch and the queries."""
+# %% ../../nbs/experiments/block-internals.ipynb 18
+def batch_cosine_sim(
+    batch: torch.Tensor,
+    queries: torch.Tensor,
+    max_chunk_bytes: int = 256 * 2**20,
+    batch_normalized: bool = False,
+    eps: float = 1e-8,
+) -> torch.Tensor:
+    """Returns the cosine similarity between each item in the batch and the queries.
+
+    The queries are normalized once and the similarities are computed as a
+    matrix multiply over chunks of the batch and queries whose results fit in
+    `max_chunk_bytes`, scaled by the inverse norms of the batch items. If
+    `batch_normalized` is True, the batch items are assumed to already have
+    unit norm (e.g. because they were saved that way) and aren't normalized."""
     assert batch.dim() == 2, f"batch.dim() should be 2, was {batch.dim()}"
     assert queries.dim() == 2, f"query.dim() should be 2, was {queries.dim()}"
     assert (
@@ -186,18 +281,48 @@ def batch_cosine_sim(batch: torch.Tensor, queries: torch.Tensor) -> torch.Tensor
 
     B, _ = batch.shape
     n_queries, _ = queries.shape
-    return F.cosine_similarity(
-        batch.reshape(B, 1, -1).expand(-1, n_queries, -1), queries, dim=-1
-    )
 
-# %% ../../nbs/experiments/block-internals.ipynb 18
+    max_chunk_elems = max(1, max_chunk_bytes // batch.element_size())
+    queries_chunk_size = min(n_queries, max_chunk_elems)
+    batch_chunk_size = max(1, max_chunk_elems // queries_chunk_size)
+
+    normalized_queries = F.normalize(queries, dim=-1, eps=eps)
+    batch_inv_norms: Optional[torch.Tensor] = None
+    if not batch_normalized:
+        batch_inv_norms = 1.0 / torch.linalg.vector_norm(batch, dim=-1).clamp(min=eps)
+
+    sims = torch.empty((B, n_queries), dtype=batch.dtype, device=batch.device)
+    for b_start in range(0, B, batch_chunk_size):
+        b_end = min(b_start + batch_chunk_size, B)
+        for q_start in range(0, n_queries, queries_chunk_size):
+            q_end = min(q_start + queries_chunk_size, n_queries)
+            sims_chunk = batch[b_start:b_end] @ normalized_queries[q_start:q_end].T
+            if batch_inv_norms is not None:
+                sims_chunk *= batch_inv_norms[b_start:b_end, None]
+            sims[b_start:b_end, q_start:q_end] = sims_chunk
+
+    return sims
+
+# %% ../../nbs/experiments/block-internals.ipynb 20
 class GetFilenameForBatchAndBlock(Protocol):
     """A protocol for a function that returns a filename for given batch
     and block indices."""
 
     def __call__(self, batch_idx: int, block_idx: int) -> Path: ...
 
-# %% ../../nbs/experiments/block-internals.ipynb 19
+# %% ../../nbs/experiments/block-internals.ipynb 21
+@dataclass
+class OutputSearch:
+    """A search for the strings whose `kind` ('proj_output' or 'ffwd_output')
+    outputs at block `block_idx` and position `t_i` are closest to each of
+    `queries` (shape n_queries, n_embed)."""
+
+    kind: str
+    block_idx: int
+    t_i: int
+    queries: torch.Tensor
+
+# %% ../../nbs/experiments/block-internals.ipynb 22
 class BatchedBlockInternalsExperiment:
     """Similar to BlockInternalsExperiment but rather than running
     all strings as one batch through the model, this one runs them
@@ -211,27 +336,281 @@ class BatchedBlockInternalsExperiment:
         strings: Sequence[str],
         output_dir: Path,
         batch_size: int = 10000,
+        prefetch_depth: int = 2,
+        prefetch_max_bytes: Optional[int] = None,
+        save_normalized: bool = False,
+        use_activation_store: bool = False,
+        position_major: bool = False,
+        max_pending_writes: int = 2,
+        compression: Optional[str] = None,
+        ann_n_lists: Optional[int] = None,
+        share_prefixes: bool = False,
     ):
+        """`prefetch_depth` and `prefetch_max_bytes` control how many batch
+        files the topk_closest methods load ahead of the one being scanned
+        (see PrefetchingBatchLoader).
+
+        If `save_normalized` is True, `run` also saves unit-norm copies of the
+        embeddings, proj outputs and ffwd outputs, and the topk_closest methods
+        scan those copies when the distance function is `batch_cosine_sim`,
+        so they don't have to normalize every batch.
+
+        If `use_activation_store` is True, `run` writes all the activations
+        into an `ActivationStore` in `output_dir` instead of into per-batch
+        files, and the activations are read from that store. A store that was
+        written for different strings or by a different model isn't read, and
+        `run` replaces it. With `position_major`, the store lays out the
+        per-block outputs position major, so that the proj and ffwd output
+        scans, which only look at one position, read just the data for that
+        position.
+
+        If `compression` is set to one of `available_codecs()`, the per-batch
+        files are saved compressed with that codec (see `save_compressed`)
+        rather than with `torch.save`. They take much less disk, but are
+        decompressed in full when they're read, rather than memory-mapped.
+        It can't be combined with `use_activation_store`.
+
+        `ann_n_lists` is the number of lists in the approximate nearest
+        neighbour indices that the topk_closest methods search when passed
+        `ann_n_probe` (see `ann_index`). It defaults to 4 * sqrt(the number
+        of strings searched).
+
+        If `share_prefixes` is True, `run` computes each batch's activations
+        with `TransformerAccessors.run_model_sharing_prefixes`, which computes
+        the positions of strings that share a prefix once rather than once per
+        string. The outputs are the same (up to floating point error), so this
+        only changes how much work is done: it helps when many strings in a
+        batch start the same way.
+
+        `run` writes each batch's outputs in the background while the next
+        batch runs; `max_pending_writes` is how many batches' outputs can be
+        waiting to be written before it waits for the disk to catch up
+        (see WriteBehindWriter). Completed batches are recorded in a
+        `RunManifest` in `output_dir`, and skipped if `run` is restarted with
+        the same settings."""
         self.eh = eh
         self.accessors = accessors
         self.strings = strings
         self.output_dir = output_dir
         self.batch_size = batch_size
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_max_bytes = prefetch_max_bytes
+        self.save_normalized = save_normalized
+        self.use_activation_store = use_activation_store
+        assert (
+            use_activation_store or not position_major
+        ), "position_major requires use_activation_store"
+        self.position_major = position_major
+        self.max_pending_writes = max_pending_writes
+        assert (
+            compression is None or not use_activation_store
+        ), "compression can't be used with use_activation_store"
+        if compression is not None:
+            assert (
+                compression in available_codecs()
+            ), f"compression must be one of {available_codecs()}, was {compression}"
+        self.compression = compression
+        self.ann_n_lists = ann_n_lists
+        self.share_prefixes = share_prefixes
+        self._ann_indices: Dict[str, IVFFlatIndex] = {}
+        self._stored_batches: Optional[Set[int]] = None
+        self._preloaded: Dict[Tuple[str, int, Optional[int]], torch.Tensor] = {}
 
         # Create a map of string to index to enable fast lookup.
         self.idx_map = OrderedDict((s, idx) for idx, s in enumerate(self.strings))
 
         self.n_batches = math.ceil(len(self.strings) / self.batch_size)
 
+        self.store: Optional[ActivationStore] = None
+        if self.use_activation_store and ActivationStore.exists(self.output_dir):
+            store = ActivationStore(self.output_dir)
+            if store.strings_checksum == strings_checksum(
+                self.strings
+            ) and store.model_hash == model_hash(self.accessors.m):
+                self.store = store
+
+    def __getstate__(self):
+        # ANN indices and preloaded activations are loaded from their files
+        # when needed (e.g. in a worker process) rather than pickled.
+        state = self.__dict__.copy()
+        state["_ann_indices"] = {}
+        state["_preloaded"] = {}
+        return state
+
+    @classmethod
+    def stored_settings(cls, output_dir: Path) -> Dict[str, Any]:
+        """Returns the settings (`batch_size`, `save_normalized`,
+        `use_activation_store`, `position_major` and `compression`) that the
+        activations in `output_dir` were written with, as keyword arguments
+        for the constructor, so that an experiment reading them doesn't have
+        to be told them again. They're read from the run manifest or, failing
+        that, from the activation store's manifest. Returns an empty dict if
+        neither exists."""
+        run_manifest_filename = output_dir / "run_manifest.json"
+        if run_manifest_filename.exists():
+            config = json.loads(run_manifest_filename.read_text())["config"]
+            return {
+                key: config[key]
+                for key in [
+                    "batch_size",
+                    "save_normalized",
+                    "use_activation_store",
+                    "position_major",
+                    "compression",
+                ]
+                if key in config
+            }
+        if ActivationStore.exists(output_dir):
+            store = ActivationStore(output_dir)
+            return {
+                "use_activation_store": True,
+                "position_major": len(store.manifest.get("position_major", [])) > 0,
+            }
+        return {}
+
     def sample_length(self) -> int:
         return len(self.strings[0])
 
-    def run(self, disable_progress_bars: bool = False):
-        for batch_idx in tqdm(range(self.n_batches), disable=disable_progress_bars):
-            start_idx = batch_idx * self.batch_size
-            end_idx = start_idx + self.batch_size
-            batch_strings = self.strings[start_idx:end_idx]
-            self._run_batch(batch_idx, batch_strings)
+    def run(
+        self,
+        disable_progress_bars: bool = False,
+        executor: Optional[ShardedExecutor] = None,
+    ):
+        """Runs all the strings through the model and saves the results.
+        Pass a `ShardedExecutor` with more than one worker to split the batches
+        between worker processes."""
+        manifest = self._run_manifest()
+        self._stored_batches = None
+        # Only reuse an existing store if we're resuming a run that wrote to it.
+        if self.use_activation_store and (
+            self.store is None or len(manifest.completed_batches) == 0
+        ):
+            self.store = self._create_store()
+
+        pending_batches = [
+            batch_idx
+            for batch_idx in range(self.n_batches)
+            if not manifest.is_complete(batch_idx)
+        ]
+        if pending_batches:
+            # Any ANN indices (or preloaded activations) are of the old
+            # activations.
+            for filename in self.output_dir.glob("ann_index-*.pt"):
+                filename.unlink()
+            self._ann_indices = {}
+            self._preloaded = {}
+        (executor or ShardedExecutor()).run(
+            partial(self._run_batches, manifest=manifest),
+            pending_batches,
+            disable_progress_bar=disable_progress_bars,
+        )
+
+    def _run_manifest(self) -> RunManifest:
+        return RunManifest(
+            self.output_dir / "run_manifest.json",
+            config={
+                "strings": strings_checksum(self.strings),
+                "batch_size": self.batch_size,
+                "model": model_hash(self.accessors.m),
+                "save_normalized": self.save_normalized,
+                "use_activation_store": self.use_activation_store,
+                "position_major": self.position_major,
+                "compression": self.compression,
+            },
+        )
+
+    def stored_batches(self) -> Set[int]:
+        """Returns the indices of the batches whose activations have been saved
+        in `output_dir` by a `run` with this experiment's settings. This is
+        read from the run manifest the first time it's called, and cached.
+
+        If the run manifest doesn't record any batches (e.g. because the
+        activations were written before run manifests were kept), the batches
+        whose files all exist (or all the batches, if there's an activation
+        store for these strings) are returned instead, with a warning, as
+        there's no record that they were completely written."""
+        if self._stored_batches is None:
+            manifest = self._run_manifest()
+            self._stored_batches = {
+                batch_idx
+                for batch_idx in range(self.n_batches)
+                if manifest.is_complete(batch_idx)
+            }
+            if not self._stored_batches:
+                self._stored_batches = self._batches_with_outputs()
+                if self._stored_batches:
+                    warnings.warn(
+                        f"{manifest.filename} doesn't record any completed batches, "
+                        f"using the {len(self._stored_batches)} batches whose "
+                        f"outputs exist in {self.output_dir}"
+                    )
+        return self._stored_batches
+
+    def preload(
+        self,
+        kinds: Sequence[str] = ("embeddings", "proj_output", "ffwd_output"),
+        pin_memory: bool = False,
+    ):
+        """Reads the stored activations of `kinds` (for every block, for the
+        per-block kinds, along with their normalized copies if they were
+        saved) into memory, so that later searches (e.g. by a long-running
+        server) scan them there rather than reading them from disk. With
+        `pin_memory`, they're held in page-locked memory, so they can be
+        copied to a GPU faster. They take as much memory as they do on disk
+        uncompressed, so only preload what fits."""
+        all_kinds, all_block_kinds = self._activation_kinds()
+        keys: List[Tuple[str, Optional[int]]] = []
+        for kind in kinds:
+            for preload_kind in [kind, f"normalized_{kind}"]:
+                if preload_kind in all_kinds:
+                    keys.append((preload_kind, None))
+                elif preload_kind in all_block_kinds:
+                    keys.extend(
+                        (preload_kind, block_idx) for block_idx in range(n_layer)
+                    )
+
+        for batch_idx in sorted(self.stored_batches()):
+            for kind, block_idx in keys:
+                # Cloning a memory-mapped tensor reads it into memory.
+                activations = self._load_activations(kind, batch_idx, block_idx).clone()
+                if pin_memory:
+                    activations = activations.pin_memory()
+                self._preloaded[(kind, batch_idx, block_idx)] = activations
+
+    def _batches_with_outputs(self) -> Set[int]:
+        """Returns the indices of the batches whose outputs exist in
+        `output_dir`, whether or not the run manifest records them."""
+        if self.use_activation_store:
+            return set(range(self.n_batches)) if self.store is not None else set()
+
+        kinds, block_kinds = self._activation_kinds()
+        return {
+            batch_idx
+            for batch_idx in range(self.n_batches)
+            if all(
+                self._activations_filename(kind, batch_idx).exists()
+                for kind in kinds
+            )
+            and all(
+                self._activations_filename(kind, batch_idx, block_idx).exists()
+                for kind in block_kinds
+                for block_idx in range(n_layer)
+            )
+        }
+
+    def _run_batches(
+        self,
+        batch_indices: Sequence[int],
+        on_batch_done: Callable[[], None],
+        manifest: RunManifest,
+    ):
+        with WriteBehindWriter(max_pending=self.max_pending_writes) as writer:
+            for batch_idx in batch_indices:
+                start_idx = batch_idx * self.batch_size
+                end_idx = start_idx + self.batch_size
+                batch_strings = self.strings[start_idx:end_idx]
+                self._run_batch(batch_idx, batch_strings, writer, manifest)
+                on_batch_done()
 
     def _embeddings_filename(self, batch_idx: int) -> Path:
         return self.output_dir / f"embeddings-{batch_idx:03d}.pt"
@@ -251,38 +630,230 @@ class BatchedBlockInternalsExperiment:
     def _block_output_filename(self, batch_idx: int, block_idx: int) -> Path:
         return self.output_dir / f"block_output-{batch_idx:03d}-{block_idx:02d}.pt"
 
-    def _run_batch(self, batch_idx: int, batch_strings: Sequence[str]):
+    def _activations_filename(
+        self, kind: str, batch_idx: int, block_idx: Optional[int] = None
+    ) -> Path:
+        """Returns the per-batch filename for the given kind of activations,
+        e.g. `_activations_filename('ffwd_output', 3, 2)` is the same as
+        `_ffwd_output_filename(3, 2)`. Compressed files have a `.ptz`
+        extension instead of `.pt`."""
+        suffix = "ptz" if self.compression is not None else "pt"
+        if block_idx is None:
+            return self.output_dir / f"{kind}-{batch_idx:03d}.{suffix}"
+        return self.output_dir / f"{kind}-{batch_idx:03d}-{block_idx:02d}.{suffix}"
+
+    def _activation_kinds(self) -> Tuple[List[str], List[str]]:
+        """Returns the kinds of activations that `run` saves once per batch,
+        and once per batch and block."""
+        kinds = ["embeddings"]
+        block_kinds = [
+            "block_input",
+            "heads_output",
+            "proj_output",
+            "ffwd_output",
+            "block_output",
+        ]
+        if self.save_normalized:
+            kinds.append("normalized_embeddings")
+            block_kinds.extend(["normalized_proj_output", "normalized_ffwd_output"])
+        return kinds, block_kinds
+
+    def _create_store(self) -> ActivationStore:
+        kinds, block_kinds = self._activation_kinds()
+        return ActivationStore.create(
+            self.output_dir,
+            self.strings,
+            item_shape=(self.sample_length(), n_embed),
+            n_blocks=n_layer,
+            kinds=kinds,
+            block_kinds=block_kinds,
+            position_major_kinds=block_kinds if self.position_major else [],
+            model_hash=model_hash(self.accessors.m),
+        )
+
+    def _save_activations(
+        self,
+        values: torch.Tensor,
+        kind: str,
+        batch_idx: int,
+        block_idx: Optional[int] = None,
+    ):
+        if self.store is not None:
+            self.store.write(
+                kind, values, start_idx=batch_idx * self.batch_size, block_idx=block_idx
+            )
+        elif self.compression is not None:
+            atomic_save(
+                values,
+                self._activations_filename(kind, batch_idx, block_idx),
+                save_fn=partial(save_compressed, codec=self.compression),
+            )
+        else:
+            atomic_save(values, self._activations_filename(kind, batch_idx, block_idx))
+
+    def _save_batch_activations(
+        self,
+        batch_idx: int,
+        activations: Sequence[Tuple[torch.Tensor, str, Optional[int]]],
+        manifest: RunManifest,
+    ):
+        for values, kind, block_idx in activations:
+            self._save_activations(values, kind, batch_idx, block_idx)
+
+        # Data written to the store is covered by the store's own files, so
+        # only per-batch files are recorded.
+        filenames = []
+        if self.store is None:
+            filenames = [
+                self._activations_filename(kind, batch_idx, block_idx)
+                for _, kind, block_idx in activations
+            ]
+        manifest.mark_complete(batch_idx, filenames)
+
+    def _load_activations(
+        self, kind: str, batch_idx: int, block_idx: Optional[int] = None
+    ) -> torch.Tensor:
+        """Returns the activations of the given kind for a batch. Unless
+        the files are compressed (or the activations were `preload`ed), the
+        returned tensor is memory-mapped, so indexing it only reads the data
+        needed."""
+        preloaded = self._preloaded.get((kind, batch_idx, block_idx))
+        if preloaded is not None:
+            return preloaded
+        if self.use_activation_store and self.store is None:
+            raise ValueError(
+                f"{self.output_dir} has no activation store for these strings "
+                "and this model; call run() to create one"
+            )
+        if self.store is not None:
+            start_idx = batch_idx * self.batch_size
+            return self.store.get(kind, block_idx)[
+                start_idx : start_idx + self.batch_size
+            ]
+        if self.compression is not None:
+            return load_compressed(
+                self._activations_filename(kind, batch_idx, block_idx)
+            )
+        return torch.load(
+            str(self._activations_filename(kind, batch_idx, block_idx)), mmap=True
+        )
+
+    def _load_activations_at_position(
+        self, kind: str, batch_idx: int, t_i: int, block_idx: Optional[int] = None
+    ) -> torch.Tensor:
+        """Returns the activations of the given kind at position `t_i` for a
+        batch, i.e. `_load_activations(kind, batch_idx, block_idx)[:, t_i]`.
+        If the activations are stored position major, this is a contiguous
+        slice of the file. Compressed files are decompressed a chunk at a
+        time, keeping just position `t_i` of each."""
+        if (kind, batch_idx, block_idx) in self._preloaded:
+            return self._preloaded[(kind, batch_idx, block_idx)][:, t_i]
+        if self.store is not None:
+            start_idx = batch_idx * self.batch_size
+            return self.store.get_position(kind, t_i, block_idx)[
+                start_idx : start_idx + self.batch_size
+            ]
+        if self.compression is not None:
+            f = CompressedTensorFile(
+                self._activations_filename(kind, batch_idx, block_idx)
+            )
+            return f.read_rows(0, len(f), index=(t_i,))
+        return self._load_activations(kind, batch_idx, block_idx)[:, t_i]
+
+    def _load_activations_for_indices(
+        self, kind: str, indices: torch.Tensor, block_idx: Optional[int] = None
+    ) -> torch.Tensor:
+        """Returns the activations of the given kind for the strings at
+        `indices` (into `strings`), reading each batch they're in once. From
+        compressed files, only the chunks holding those strings are read."""
+        batch_indices = indices // self.batch_size
+        result: Optional[torch.Tensor] = None
+        for batch_idx in batch_indices.unique().tolist():
+            (positions,) = torch.nonzero(batch_indices == batch_idx, as_tuple=True)
+            rows = indices[positions] - batch_idx * self.batch_size
+            if (
+                self.compression is not None
+                and (kind, batch_idx, block_idx) not in self._preloaded
+            ):
+                activations = CompressedTensorFile(
+                    self._activations_filename(kind, batch_idx, block_idx)
+                ).read_indices(rows)
+            else:
+                activations = self._load_activations(kind, batch_idx, block_idx)[rows]
+            if result is None:
+                result = activations.new_empty(
+                    (len(indices), *activations.shape[1:])
+                )
+            result[positions] = activations
+        assert result is not None, "indices was empty"
+        return result
+
+    def _run_batch(
+        self,
+        batch_idx: int,
+        batch_strings: Sequence[str],
+        writer: WriteBehindWriter,
+        manifest: RunManifest,
+    ):
         tokens = self.eh.tokenize_strings(batch_strings)
         embeddings = self.accessors.embed_tokens(tokens)
 
-        torch.save(embeddings, self._embeddings_filename(batch_idx))
+        activations: List[Tuple[torch.Tensor, str, Optional[int]]] = [
+            (embeddings, "embeddings", None)
+        ]
+        if self.save_normalized:
+            # Embeddings are compared across all positions at once, so they
+            # are normalized over the flattened (s_len * n_embed) vector.
+            B, _, _ = embeddings.shape
+            activations.append(
+                (
+                    F.normalize(embeddings.reshape(B, -1), dim=-1).reshape(
+                        embeddings.shape
+                    ),
+                    "normalized_embeddings",
+                    None,
+                )
+            )
 
         # Run the embeddings through the model.
-        _, io_accessors = self.accessors.run_model(embeddings)
+        if self.share_prefixes:
+            _, io_accessors = self.accessors.run_model_sharing_prefixes(tokens)
+        else:
+            _, io_accessors = self.accessors.run_model(embeddings)
 
-        # Write the results to disk.
         for block_idx, io_accessor in enumerate(io_accessors):
-            torch.save(
-                io_accessor.input("."),
-                self._block_input_filename(batch_idx, block_idx),
-            )
-            torch.save(
-                io_accessor.input("sa.proj"),
-                self._heads_output_filename(batch_idx, block_idx),
-            )
-            torch.save(
-                io_accessor.output("sa.proj"),
-                self._proj_output_filename(batch_idx, block_idx),
-            )
-            torch.save(
-                io_accessor.output("ffwd"),
-                self._ffwd_output_filename(batch_idx, block_idx),
-            )
-            torch.save(
-                io_accessor.output("."),
-                self._block_output_filename(batch_idx, block_idx),
+            activations.extend(
+                [
+                    (io_accessor.input("."), "block_input", block_idx),
+                    (io_accessor.input("sa.proj"), "heads_output", block_idx),
+                    (io_accessor.output("sa.proj"), "proj_output", block_idx),
+                    (io_accessor.output("ffwd"), "ffwd_output", block_idx),
+                    (io_accessor.output("."), "block_output", block_idx),
+                ]
             )
 
+            if self.save_normalized:
+                # Outputs are compared one position at a time, so they
+                # are normalized per position.
+                activations.extend(
+                    [
+                        (
+                            F.normalize(io_accessor.output("sa.proj"), dim=-1),
+                            "normalized_proj_output",
+                            block_idx,
+                        ),
+                        (
+                            F.normalize(io_accessor.output("ffwd"), dim=-1),
+                            "normalized_ffwd_output",
+                            block_idx,
+                        ),
+                    ]
+                )
+
+        # Write the results to disk in the background while the next
+        # batch runs.
+        writer.submit(self._save_batch_activations, batch_idx, activations, manifest)
+
     def string_idx(self, s: str) -> int:
         """Returns the index of the specified string."""
         return self.idx_map[s]
@@ -317,12 +888,27 @@ class BatchedBlockInternalsExperiment:
         k: int,
         largest: bool = False,
         distance_function: DistanceFunction = batch_distances,
+        ann_n_probe: Optional[int] = None,
     ) -> Tuple[Sequence[Sequence[str]], torch.Tensor]:
         """Returns the top k strings with the closest embeddings
-        to the specified query."""
+        to the specified query. If `ann_n_probe` is set, searches an
+        approximate nearest neighbour index (see `ann_index`), probing
+        `ann_n_probe` of its lists, rather than scanning all the embeddings."""
 
         n_queries, _, _ = queries.shape
 
+        kind, scan_distance_function = self._scan_kind("embeddings", distance_function)
+
+        if ann_n_probe is not None:
+            values, indices = self.ann_index("embeddings", distance_function).search(
+                queries.reshape(n_queries, -1),
+                k,
+                ann_n_probe,
+                scan_distance_function,
+                largest,
+            )
+            return self.strings_from_indices(indices), values
+
         def _process_batch(batch: torch.Tensor) -> torch.Tensor:
             B, _, _ = batch.shape
             # Batch and queries and both shape (B, s_len, n_embed).
@@ -330,7 +916,7 @@ class BatchedBlockInternalsExperiment:
             # reshape both the batch and queries to eliminate the
             # s_len dimension, effectively concatenating all the
             # embedding tensors across positions.
-            return distance_function(
+            return scan_distance_function(
                 batch.reshape(B, -1), queries.reshape(n_queries, -1)
             )
 
@@ -338,14 +924,35 @@ class BatchedBlockInternalsExperiment:
             n_batches=self.n_batches,
             k=k,
             largest=largest,
-            load_batch=lambda i: torch.load(
-                str(self._embeddings_filename(i)), mmap=True
-            ),
+            load_batch=lambda i: self._load_activations(kind, i),
             process_batch=_process_batch,
+            prefetch_depth=self.prefetch_depth,
+            prefetch_max_bytes=self.prefetch_max_bytes,
         )
 
         return self.strings_from_indices(indices), values
 
+    def _use_normalized(self, distance_function: DistanceFunction) -> bool:
+        """Returns whether a scan with the given distance function should
+        use the normalized copies of the data."""
+        if distance_function is not batch_cosine_sim:
+            return False
+        if self.store is not None:
+            return self.store.has("normalized_embeddings")
+        return self.save_normalized
+
+    def _scan_kind(
+        self, kind: str, distance_function: DistanceFunction
+    ) -> Tuple[str, DistanceFunction]:
+        """Returns the kind of activations to read, and the distance function
+        to apply to them, for a search of `kind` with `distance_function`.
+        These are the normalized copies of the data, if the search can use them."""
+        if self._use_normalized(distance_function):
+            return f"normalized_{kind}", partial(
+                batch_cosine_sim, batch_normalized=True
+            )
+        return kind, distance_function
+
     def _convert_t_i(self, t_i: int) -> int:
         """Converts a negative t_i to a positive one."""
         if t_i < 0:
@@ -369,52 +976,31 @@ class BatchedBlockInternalsExperiment:
                 od[substring] = i
         return od
 
-    def _strings_with_topk_closest_outputs(
-        self,
-        get_filename: GetFilenameForBatchAndBlock,
-        block_idx: int,
-        t_i: int,
-        queries: torch.Tensor,
-        k: int,
-        largest: bool = False,
-        distance_function: DistanceFunction = batch_distances,
-    ) -> Tuple[Sequence[Sequence[str]], torch.Tensor]:
-        """Returns the top k strings with the closest outputs
-        to the specified query, using the given `get_filename`
-        function to load batches of the output data."""
-
+    def _output_batch_rows(
+        self, t_i: int
+    ) -> Tuple[Sequence[str], Callable[[int], Optional[torch.Tensor]]]:
+        """Returns the strings whose outputs at position `t_i` are searched,
+        and a function that returns the rows of a batch that hold their
+        outputs (None if it's all of them). Indices into the concatenation of
+        those rows from each batch are indices into the strings."""
         t_i = self._convert_t_i(t_i)
 
-        all_strings = self.strings
-        unique_substring_indices: Optional[torch.Tensor] = None
-
-        # If the requested t_i is not the last character, we
-        # need to compute the unique substrings of length t_i + 1.
-        # We'll only evaluate outputs for these unique substrings.
-        if t_i < self.sample_length() - 1:
-            unique_substring_map = self._unique_substring_map(t_i)
-            all_strings = list(unique_substring_map.keys())
+        if t_i == self.sample_length() - 1:
+            # If we're looking at the last character, every string's
+            # output is searched.
+            return self.strings, lambda batch_idx: None
 
-            # The keys of the ordered dictionary are the indices into
-            # self.strings i.e. the global indices of the unique substrings.
-            unique_substring_indices = torch.tensor(list(unique_substring_map.values()))
+        # Otherwise, we need to compute the unique substrings of length
+        # t_i + 1. We'll only evaluate outputs for these unique substrings.
+        unique_substring_map = self._unique_substring_map(t_i)
 
-        def _load_batch(batch_idx: int) -> torch.Tensor:
-            if t_i == self.sample_length() - 1:
-                # If we're looking at the last character, we can just
-                # load the batch and index it directly.
-                return torch.load(
-                    str(get_filename(batch_idx=batch_idx, block_idx=block_idx)),
-                    mmap=True,
-                )[:, t_i, :]
-
-            # Otherwise, we need to find just the unique substrings that
-            # appear in the batch and return the subset of the batch
-            # containing them.
-            assert unique_substring_indices is not None
+        # The keys of the ordered dictionary are the indices into
+        # self.strings i.e. the global indices of the unique substrings.
+        unique_substring_indices = torch.tensor(list(unique_substring_map.values()))
 
+        def _batch_rows(batch_idx: int) -> Optional[torch.Tensor]:
             # Find the indices of the unique substrings that appear
-            # in the batch we're asked to load.
+            # in the batch.
             mask = (unique_substring_indices >= batch_idx * self.batch_size) & (
                 unique_substring_indices < (batch_idx + 1) * self.batch_size
             )
@@ -425,21 +1011,134 @@ class BatchedBlockInternalsExperiment:
             assert (
                 batch_indices.shape[0] > 0
             ), f"batch_indices were empty for batch_idx {batch_idx}"
+            return batch_indices
+
+        return list(unique_substring_map.keys()), _batch_rows
+
+    def _output_batch_loader(
+        self, kind: str, block_idx: int, t_i: int
+    ) -> Tuple[Sequence[str], Callable[[int], torch.Tensor]]:
+        """Returns the strings whose outputs at position `t_i` are searched,
+        and a function that loads those outputs for a batch. Indices into the
+        concatenation of the loaded batches are indices into the strings."""
+        t_i = self._convert_t_i(t_i)
+        all_strings, batch_rows = self._output_batch_rows(t_i)
+
+        def _load_batch(batch_idx: int) -> torch.Tensor:
+            batch = self._load_activations_at_position(kind, batch_idx, t_i, block_idx)
+            rows = batch_rows(batch_idx)
+            return batch if rows is None else batch[rows]
 
-            return torch.load(
-                str(get_filename(batch_idx=batch_idx, block_idx=block_idx)),
-                mmap=True,
-            )[batch_indices, t_i, :]
+        return all_strings, _load_batch
+
+    def ann_index(
+        self,
+        kind: str,
+        distance_function: DistanceFunction = batch_distances,
+        block_idx: Optional[int] = None,
+        t_i: Optional[int] = None,
+    ) -> IVFFlatIndex:
+        """Returns an approximate nearest neighbour index over the activations
+        of `kind`: either 'embeddings', or 'proj_output' / 'ffwd_output' at
+        block `block_idx` and position `t_i`, for searches with
+        `distance_function`. The index covers the same strings as the exact
+        search, and its ids are the indices that search would return.
+
+        The index is built from the stored activations the first time it's
+        needed and saved in `output_dir`, so later searches (including ones
+        in other processes) just load it."""
+        scan_kind, _ = self._scan_kind(kind, distance_function)
+        key = scan_kind
+        if block_idx is not None:
+            assert t_i is not None, "t_i is required with block_idx"
+            key += f"-{block_idx:02d}-{self._convert_t_i(t_i):03d}"
+        spherical = distance_function is batch_cosine_sim
+        if spherical:
+            key += "-cosine"
+
+        if key in self._ann_indices:
+            return self._ann_indices[key]
+
+        filename = self.output_dir / f"ann_index-{key}.pt"
+        if filename.exists():
+            index = IVFFlatIndex.load(filename)
+        else:
+            load_batch: Callable[[int], torch.Tensor]
+            if block_idx is None:
+                n_vectors = len(self.strings)
+
+                def _load_embeddings(batch_idx: int) -> torch.Tensor:
+                    return self._load_activations(scan_kind, batch_idx).reshape(
+                        -1, self.sample_length() * n_embed
+                    )
+
+                load_batch = _load_embeddings
+            else:
+                assert t_i is not None
+                all_strings, load_batch = self._output_batch_loader(
+                    scan_kind, block_idx, t_i
+                )
+                n_vectors = len(all_strings)
+            # The index is built a batch at a time, with its vectors in a
+            # memory-mapped file, so the activations never all have to fit in
+            # memory. Once it's saved, it's reloaded from the saved file.
+            vectors_filename = filename.with_suffix(".vectors.npy")
+            try:
+                index = IVFFlatIndex.build_from_batches(
+                    load_batch,
+                    self.n_batches,
+                    n_vectors,
+                    vectors_filename,
+                    n_lists=self.ann_n_lists,
+                    spherical=spherical,
+                )
+                atomic_save(index, filename, save_fn=IVFFlatIndex.save)
+            finally:
+                vectors_filename.unlink(missing_ok=True)
+            index = IVFFlatIndex.load(filename)
+
+        self._ann_indices[key] = index
+        return index
+
+    def _strings_with_topk_closest_outputs(
+        self,
+        kind: str,
+        block_idx: int,
+        t_i: int,
+        queries: torch.Tensor,
+        k: int,
+        largest: bool = False,
+        distance_function: DistanceFunction = batch_distances,
+        ann_n_probe: Optional[int] = None,
+    ) -> Tuple[Sequence[Sequence[str]], torch.Tensor]:
+        """Returns the top k strings with the closest outputs
+        to the specified query, scanning the activations of the
+        given `kind` (or searching their ANN index if `ann_n_probe`
+        is set)."""
+
+        scan_kind, scan_distance_function = self._scan_kind(kind, distance_function)
+        all_strings, load_batch = self._output_batch_loader(scan_kind, block_idx, t_i)
+
+        if ann_n_probe is not None:
+            values, indices = self.ann_index(
+                kind, distance_function, block_idx, t_i
+            ).search(queries, k, ann_n_probe, scan_distance_function, largest)
+            return (
+                self.strings_from_indices(indices, alt_all_strings=all_strings),
+                values,
+            )
 
         def _process_batch(batch: torch.Tensor) -> torch.Tensor:
-            return distance_function(batch, queries=queries)
+            return scan_distance_function(batch, queries=queries)
 
         values, indices = topk_across_batches(
             n_batches=self.n_batches,
             k=k,
             largest=largest,
-            load_batch=_load_batch,
+            load_batch=load_batch,
             process_batch=_process_batch,
+            prefetch_depth=self.prefetch_depth,
+            prefetch_max_bytes=self.prefetch_max_bytes,
         )
         return self.strings_from_indices(indices, alt_all_strings=all_strings), values
 
@@ -451,17 +1150,20 @@ class BatchedBlockInternalsExperiment:
         k: int,
         largest: bool = False,
         distance_function: DistanceFunction = batch_distances,
+        ann_n_probe: Optional[int] = None,
     ) -> Tuple[Sequence[Sequence[str]], torch.Tensor]:
         """Returns the top k strings with the closest proj outputs
-        to the specified query."""
+        to the specified query. See `strings_with_topk_closest_embeddings`
+        for `ann_n_probe`."""
         return self._strings_with_topk_closest_outputs(
-            get_filename=self._proj_output_filename,
+            kind="proj_output",
             block_idx=block_idx,
             t_i=t_i,
             queries=queries,
             k=k,
             largest=largest,
             distance_function=distance_function,
+            ann_n_probe=ann_n_probe,
         )
 
     def strings_with_topk_closest_ffwd_outputs(
@@ -472,21 +1174,225 @@ class BatchedBlockInternalsExperiment:
         k: int,
         largest: bool = False,
         distance_function: DistanceFunction = batch_distances,
+        ann_n_probe: Optional[int] = None,
     ) -> Tuple[Sequence[Sequence[str]], torch.Tensor]:
         """Returns the top k strings with the closest ffwd outputs
-        to the specified query."""
+        to the specified query. See `strings_with_topk_closest_embeddings`
+        for `ann_n_probe`."""
 
         return self._strings_with_topk_closest_outputs(
-            get_filename=self._ffwd_output_filename,
+            kind="ffwd_output",
             block_idx=block_idx,
             t_i=t_i,
             queries=queries,
             k=k,
             largest=largest,
             distance_function=distance_function,
+            ann_n_probe=ann_n_probe,
         )
 
-# %% ../../nbs/experiments/block-internals.ipynb 21
+    def strings_with_topk_closest_outputs_multi(
+        self,
+        searches: Sequence[OutputSearch],
+        k: int,
+        largest: bool = False,
+        distance_function: DistanceFunction = batch_distances,
+        query_chunk_size: int = 4096,
+    ) -> List[Tuple[Sequence[Sequence[str]], torch.Tensor]]:
+        """Returns the results of each of `searches`, i.e. what
+        `strings_with_topk_closest_proj_outputs` or
+        `strings_with_topk_closest_ffwd_outputs` would return for it, but
+        reads the stored activations only once. Each batch's activations
+        for every kind and block searched are loaded once and compared with
+        the queries of all the searches that need them, and each search's
+        results are merged into its own running top k.
+
+        This does much less I/O than calling those methods in a loop when
+        there are many searches (e.g. for many batches of queries, at every
+        block and several positions). Searches of the same kind, block and
+        position have their queries compared with the data together, in
+        chunks of up to `query_chunk_size` queries."""
+        # Group the searches that scan the same data.
+        groups: Dict[Tuple[str, int, int], List[int]] = defaultdict(list)
+        scan_distance_function = distance_function
+        for search_idx, search in enumerate(searches):
+            scan_kind, scan_distance_function = self._scan_kind(
+                search.kind, distance_function
+            )
+            key = (scan_kind, search.block_idx, self._convert_t_i(search.t_i))
+            groups[key].append(search_idx)
+        keys = list(groups.keys())
+
+        group_queries = [
+            torch.cat([searches[i].queries for i in groups[key]]) for key in keys
+        ]
+        output_batch_rows = {t_i: self._output_batch_rows(t_i) for _, _, t_i in keys}
+
+        def _load_batch(batch_idx: int) -> List[torch.Tensor]:
+            # From a store, read just the positions searched (each of which
+            # is contiguous if the store is position major). Otherwise, load
+            # each kind and block's batch file once, and take each position
+            # searched from it.
+            activations: Dict[Tuple[str, int], torch.Tensor] = {}
+            batch = []
+            for scan_kind, block_idx, t_i in keys:
+                if self.store is not None:
+                    outputs = self._load_activations_at_position(
+                        scan_kind, batch_idx, t_i, block_idx
+                    )
+                else:
+                    if (scan_kind, block_idx) not in activations:
+                        activations[(scan_kind, block_idx)] = self._load_activations(
+                            scan_kind, batch_idx, block_idx
+                        )
+                    outputs = activations[(scan_kind, block_idx)][:, t_i]
+                rows = output_batch_rows[t_i][1](batch_idx)
+                batch.append(outputs.contiguous() if rows is None else outputs[rows])
+            return batch
+
+        running_topks = [
+            [RunningTopK(k, largest) for _ in queries.split(query_chunk_size)]
+            for queries in group_queries
+        ]
+        with PrefetchingBatchLoader(
+            _load_batch,
+            self.n_batches,
+            depth=self.prefetch_depth,
+            max_bytes=self.prefetch_max_bytes,
+        ) as loader:
+            for batch_idx in range(self.n_batches):
+                for outputs, queries, topks in zip(
+                    loader(batch_idx), group_queries, running_topks
+                ):
+                    for query_chunk, topk in zip(
+                        queries.split(query_chunk_size), topks
+                    ):
+                        topk.add(scan_distance_function(outputs, queries=query_chunk))
+
+        # Split each group's results back out into its searches.
+        results: Dict[int, Tuple[Sequence[Sequence[str]], torch.Tensor]] = {}
+        for key, topks in zip(keys, running_topks):
+            values, indices = (
+                torch.cat(tensors, dim=1)
+                for tensors in zip(*[topk.result() for topk in topks])
+            )
+            all_strings, _ = output_batch_rows[key[2]]
+            start = 0
+            for search_idx in groups[key]:
+                end = start + searches[search_idx].queries.shape[0]
+                results[search_idx] = (
+                    self.strings_from_indices(
+                        indices[:, start:end], alt_all_strings=all_strings
+                    ),
+                    values[:, start:end],
+                )
+                start = end
+
+        return [results[search_idx] for search_idx in range(len(searches))]
+
+# %% ../../nbs/experiments/block-internals.ipynb 33
+class StoredBlockInternals:
+    """Provides the same values as `BlockInternalsExperiment` for `strings`,
+    but reads them from the output directory of `exp` where it can, rather
+    than running the model again. Strings that `exp` has saved activations
+    for (see `BatchedBlockInternalsExperiment.stored_batches`) are looked up
+    by their index in `exp.strings`; only the rest are run through the model.
+
+    Values are read when they're first asked for, and cached."""
+
+    def __init__(
+        self,
+        eh: EncodingHelpers,
+        accessors: TransformerAccessors,
+        strings: Sequence[str],
+        exp: BatchedBlockInternalsExperiment,
+    ):
+        self.strings = strings
+        self.exp = exp
+
+        # Create a map of string to index to enable fast lookup.
+        self.idx_map = OrderedDict((s, idx) for idx, s in enumerate(self.strings))
+
+        stored_batches = exp.stored_batches()
+        stored, missing = [], []
+        for idx, s in enumerate(self.strings):
+            exp_idx = exp.idx_map.get(s)
+            if exp_idx is not None and exp_idx // exp.batch_size in stored_batches:
+                stored.append((idx, exp_idx))
+            else:
+                missing.append(idx)
+
+        self.stored_positions = torch.tensor(
+            [idx for idx, _ in stored], dtype=torch.long
+        )
+        self.stored_exp_indices = torch.tensor(
+            [exp_idx for _, exp_idx in stored], dtype=torch.long
+        )
+        self.missing_positions = torch.tensor(missing, dtype=torch.long)
+        self.missing_exp: Optional[BlockInternalsExperiment] = None
+        if len(missing) > 0:
+            self.missing_exp = BlockInternalsExperiment(
+                eh, accessors, [self.strings[idx] for idx in missing]
+            )
+        self._cache: Dict[Tuple[str, Optional[int]], torch.Tensor] = {}
+
+    def _get(self, kind: str, block_idx: Optional[int] = None) -> torch.Tensor:
+        key = (kind, block_idx)
+        if key in self._cache:
+            return self._cache[key]
+
+        missing: Optional[torch.Tensor] = None
+        if self.missing_exp is not None:
+            if block_idx is None:
+                missing = self.missing_exp.embeddings
+            else:
+                missing = getattr(self.missing_exp, kind)(block_idx)
+        if len(self.stored_positions) == 0:
+            assert missing is not None
+            result = missing
+        else:
+            stored = self.exp._load_activations_for_indices(
+                kind, self.stored_exp_indices, block_idx
+            )
+            if missing is None:
+                result = stored
+            else:
+                result = stored.new_empty((len(self.strings), *stored.shape[1:]))
+                result[self.stored_positions] = stored
+                result[self.missing_positions] = missing.to(result)
+
+        self._cache[key] = result
+        return result
+
+    @property
+    def embeddings(self) -> torch.Tensor:
+        return self._get("embeddings")
+
+    def string_idx(self, s: str) -> int:
+        """Returns the index of the specified string."""
+        return self.idx_map[s]
+
+    def block_input(self, block_idx: int) -> torch.Tensor:
+        """Returns the input to the specified block."""
+        return self._get("block_input", block_idx)
+
+    def heads_output(self, block_idx: int) -> torch.Tensor:
+        """Returns the output of the attention heads in the specified block."""
+        return self._get("heads_output", block_idx)
+
+    def proj_output(self, block_idx: int) -> torch.Tensor:
+        """Returns the output of the self-attention proj layer in the specified block."""
+        return self._get("proj_output", block_idx)
+
+    def ffwd_output(self, block_idx: int) -> torch.Tensor:
+        """Returns the output of the feed-forward layer in the specified block."""
+        return self._get("ffwd_output", block_idx)
+
+    def block_output(self, block_idx: int) -> torch.Tensor:
+        """Returns the output of the specified block."""
+        return self._get("block_output", block_idx)
+
+# %% ../../nbs/experiments/block-internals.ipynb 35
 @click.command()
 @click.argument("model_weights_filename", type=click.Path(exists=True))
 @click.argument("dataset_cache_filename", type=click.Path(exists=True))
@@ -504,12 +1410,65 @@ class BatchedBlockInternalsExperiment:
     type=click.IntRange(min=1),
     default=10000,
 )
+@click.option(
+    "--save_normalized",
+    is_flag=True,
+    default=False,
+    help="Also save unit-norm copies of the outputs for cosine similarity scans.",
+)
+@click.option(
+    "--activation_store",
+    is_flag=True,
+    default=False,
+    help="Write the outputs to a single ActivationStore instead of per-batch files.",
+)
+@click.option(
+    "--position_major",
+    is_flag=True,
+    default=False,
+    help="Store the block outputs position major (requires --activation_store).",
+)
+@click.option(
+    "-w",
+    "--n_workers",
+    required=False,
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes to split the batches between.",
+)
+@click.option(
+    "--threads_per_worker",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="torch threads per worker (defaults to splitting the cores evenly).",
+)
+@click.option(
+    "--compression",
+    required=False,
+    type=click.Choice(available_codecs()),
+    default=None,
+    help="Save the per-batch output files compressed with this codec.",
+)
+@click.option(
+    "--share_prefixes",
+    is_flag=True,
+    default=False,
+    help="Compute the positions of strings that share a prefix only once.",
+)
 def run(
     model_weights_filename: str,
     dataset_cache_filename: str,
     output_folder: str,
     sample_len: int,
     max_batch_size: int,
+    save_normalized: bool,
+    activation_store: bool,
+    position_major: bool,
+    n_workers: int,
+    threads_per_worker: Optional[int],
+    compression: Optional[str],
+    share_prefixes: bool,
 ):
     click.echo(f"Running block internals experiment for with:")
     click.echo(f"  model weights: {model_weights_filename}")
@@ -517,6 +1476,12 @@ def run(
     click.echo(f"  output folder: {output_folder}")
     click.echo(f"  sample length: {sample_len}")
     click.echo(f"  max batch size: {max_batch_size}")
+    click.echo(f"  save normalized: {save_normalized}")
+    click.echo(f"  activation store: {activation_store}")
+    click.echo(f"  position major: {position_major}")
+    click.echo(f"  workers: {n_workers}")
+    click.echo(f"  compression: {compression}")
+    click.echo(f"  share prefixes: {share_prefixes}")
 
     # Instantiate the model, tokenizer, and dataset
     device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -527,6 +1492,7 @@ def run(
         saved_model_filename=model_weights_filename,
         dataset=ts,
         device=device,
+        share_memory=n_workers > 1,
     )
 
     strings = all_unique_substrings(ts.text, sample_len)
@@ -536,12 +1502,21 @@ def run(
 
     # Create the experiment
     exp = BatchedBlockInternalsExperiment(
-        encoding_helpers, accessors, strings, Path(output_folder), max_batch_size
+        encoding_helpers,
+        accessors,
+        strings,
+        Path(output_folder),
+        max_batch_size,
+        save_normalized=save_normalized,
+        use_activation_store=activation_store,
+        position_major=position_major,
+        compression=compression,
+        share_prefixes=share_prefixes,
     )
 
-    exp.run()
+    exp.run(executor=ShardedExecutor(n_workers, threads_per_worker))
 
-# %% ../../nbs/experiments/block-internals.ipynb 22
+# %% ../../nbs/experiments/block-internals.ipynb 36
 class BlockInternalsAnalysis:
     """This class performs analysis of how the next token probabilities change
     as an embedded input is passed through each of the blocks in the model"""
@@ -2,19 +2,37 @@
 
 # %% auto 0
 __all__ = ['PreFilterResult', 'CosineSimilaritiesExperiment', 'get_ffwd_queries', 'run', 'LoadBatchFunction',
-           'pre_filter_cosine_sim_results', 'LoadPrefilteredFunction', 'filter_on_prefiltered_results']
+           'pre_filter_cosine_sim_results', 'LoadSparseBatchFunction', 'load_sparse_cosine_sim_results',
+           'LoadPrefilteredFunction', 'filter_on_prefiltered_results', 'LoadPrefilteredQueryFunction',
+           'CosineSimInvertedIndex']
 
 # %% ../../nbs/experiments/cosine-sims.ipynb 5
-import gc
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import hashlib
+import json
 import math
 import os
 from operator import itemgetter
 from pathlib import Path
 import tempfile
-from typing import Callable, Dict, List, Protocol, Sequence
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
 
 # %% ../../nbs/experiments/cosine-sims.ipynb 6
 import click
+import numpy as np
 import torch
 import torch.nn as nn
 from torch.nn import functional as F
@@ -22,6 +40,16 @@ from tqdm.auto import tqdm
 
 # %% ../../nbs/experiments/cosine-sims.ipynb 7
 from ..environments import get_environment
+from ..common.activation_store import model_hash
+from ..common.sharded_executor import ShardedExecutor
+from transformer_experiments.common.utils import (
+    atomic_save,
+    BufferPool,
+    PrefetchingBatchLoader,
+    RunManifest,
+    strings_checksum,
+    WriteBehindWriter,
+)
 from ..common.substring_generator import all_unique_substrings
 from transformer_experiments.datasets.tinyshakespeare import (
     TinyShakespeareDataSet,
@@ -50,72 +78,219 @@ class CosineSimilaritiesExperiment:
         output_folder: Path,
         encoding_helpers: EncodingHelpers,
         accessors: TransformerAccessors,
+        max_pending_writes: int = 2,
     ):
+        """`run` writes each batch's similarities in the background while the
+        next batch runs, with up to `max_pending_writes` batches waiting to be
+        written (see WriteBehindWriter). Completed batches are recorded in a
+        `RunManifest` in `output_folder`, and skipped if `run` is restarted
+        with the same settings and queries.
+
+        If `run` is given a `threshold` and/or `top_k`, only the similarities
+        that pass them are saved, in a sparse layout (see
+        `cosine_sim_ffwd_out_sparse_filename`) rather than as dense
+        similarity tensors.
+
+        Each batch's outputs are written into buffers from `self.buffers` (a
+        `BufferPool`), which are reused by later batches once the batch has
+        been written. After a run in this process, `self.buffers.peak_bytes`
+        is the most memory those buffers held."""
         self.strings = strings
         self.batch_size = batch_size
         self.output_folder = output_folder
         self.encoding_helpers = encoding_helpers
         self.accessors = accessors
+        self.max_pending_writes = max_pending_writes
+        self.buffers = BufferPool(device=accessors.device)
 
         self.n_batches = math.ceil(len(self.strings) / self.batch_size)
 
     def cosine_sim_ffwd_out_filename(self, batch_idx: int) -> Path:
         return self.output_folder / f"cosine_sim_ffwd_out_{batch_idx:05d}.pt"
 
+    def cosine_sim_ffwd_out_sparse_filename(self, batch_idx: int) -> Path:
+        """The file for a batch's similarities when `run` is given a
+        `threshold` or `top_k`. It holds a dict in CSR layout, with one row
+        per (query, block) pair, at row `q_idx * n_layer + block_idx`:
+        `indices` and `values` hold the index (into `strings`) and similarity
+        of each kept string, sorted by row and then index, and row r's
+        entries are at `offsets[r]:offsets[r + 1]`. `top_k` records the
+        `top_k` the batch was filtered with (or None)."""
+        return self.output_folder / f"cosine_sim_ffwd_out_sparse_{batch_idx:05d}.pt"
+
     def run(
         self,
         queries: torch.Tensor,
         start_batch_idx: int = 0,
         disable_progress_bar: bool = False,
+        executor: Optional[ShardedExecutor] = None,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None,
     ):
+        """Computes the cosine similarities between the final-position ffwd
+        outputs of every string and the queries, and saves them. Pass a
+        `ShardedExecutor` with more than one worker to split the batches
+        between worker processes.
+
+        By default, every similarity is saved. If `threshold` is set, only
+        those above it are saved, and if `top_k` is set, only each batch's
+        `top_k` largest for each query and block are (so that
+        `load_sparse_cosine_sim_results` can find the overall top k)."""
         assert queries.dim() == 3
         assert queries.shape[0] == n_layer
         assert queries.shape[2] == n_embed
+        assert top_k is None or top_k > 0
         n_queries = queries.shape[1]
 
-        for batch_idx in tqdm(
-            range(start_batch_idx, self.n_batches), disable=disable_progress_bar
-        ):
-            start_idx = batch_idx * self.batch_size
-            end_idx = start_idx + self.batch_size
-            batch_strings = self.strings[start_idx:end_idx]
-
-            batch_size = len(
-                batch_strings
-            )  # Might be smaller than configured batch size
-            assert batch_size <= self.batch_size
-
-            ffwd_outs = self._get_ffwd_outs(
-                batch_strings
-            )  # (n_layer, batch_size, n_embed)
-
-            sims = F.cosine_similarity(
-                ffwd_outs.reshape(n_layer, batch_size, 1, n_embed).expand(
-                    -1, -1, n_queries, -1
-                ),
-                queries.reshape(n_layer, 1, n_queries, n_embed),
-                dim=-1,
-            )
+        # Normalize the queries once up front so each batch only needs its
+        # own outputs normalized, after which the cosine similarities are a
+        # single batched matrix multiply per layer.
+        normalized_queries = F.normalize(queries, dim=-1, eps=1e-8).transpose(1, 2)
+
+        manifest = RunManifest(
+            self.output_folder / "run_manifest.json",
+            config={
+                "strings": strings_checksum(self.strings),
+                "batch_size": self.batch_size,
+                "model": model_hash(self.accessors.m),
+                "queries": hashlib.sha256(
+                    queries.detach().cpu().contiguous().numpy().tobytes()
+                ).hexdigest(),
+                "threshold": threshold,
+                "top_k": top_k,
+            },
+        )
 
-            torch.save(sims, self.cosine_sim_ffwd_out_filename(batch_idx))
-            del ffwd_outs
-            del sims
-            torch.cuda.empty_cache()
-            gc.collect()
+        pending_batches = [
+            batch_idx
+            for batch_idx in range(start_batch_idx, self.n_batches)
+            if not manifest.is_complete(batch_idx)
+        ]
+        (executor or ShardedExecutor()).run(
+            partial(
+                self._run_batches,
+                normalized_queries=normalized_queries,
+                manifest=manifest,
+                threshold=threshold,
+                top_k=top_k,
+            ),
+            pending_batches,
+            disable_progress_bar=disable_progress_bar,
+        )
 
-    def _get_ffwd_outs(self, batch_strings: Sequence[str]) -> torch.Tensor:
+    def _run_batches(
+        self,
+        batch_indices: Sequence[int],
+        on_batch_done: Callable[[], None],
+        normalized_queries: torch.Tensor,
+        manifest: RunManifest,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None,
+    ):
+        sparse = threshold is not None or top_k is not None
+        with WriteBehindWriter(max_pending=self.max_pending_writes) as writer:
+            for batch_idx in batch_indices:
+                start_idx = batch_idx * self.batch_size
+                end_idx = start_idx + self.batch_size
+                batch_strings = self.strings[start_idx:end_idx]
+
+                batch_size = len(
+                    batch_strings
+                )  # Might be smaller than configured batch size
+                assert batch_size <= self.batch_size
+
+                ffwd_outs = self.buffers.acquire((n_layer, batch_size, n_embed))
+                self._get_ffwd_outs(batch_strings, out=ffwd_outs)
+                F.normalize(ffwd_outs, dim=-1, eps=1e-8, out=ffwd_outs)
+
+                sims = self.buffers.acquire(
+                    (n_layer, batch_size, normalized_queries.shape[-1])
+                )
+                torch.bmm(ffwd_outs, normalized_queries, out=sims)
+                self.buffers.release(ffwd_outs)
+
+                if sparse:
+                    writer.submit(
+                        self._save_sparse_batch,
+                        batch_idx,
+                        self._sparsify(sims, start_idx, threshold, top_k),
+                        manifest,
+                    )
+                    self.buffers.release(sims)
+                else:
+                    # sims goes back to the pool once it has been written.
+                    writer.submit(self._save_batch, batch_idx, sims, manifest)
+                on_batch_done()
+
+    def _save_batch(self, batch_idx: int, sims: torch.Tensor, manifest: RunManifest):
+        filename = self.cosine_sim_ffwd_out_filename(batch_idx)
+        atomic_save(sims, filename)
+        manifest.mark_complete(batch_idx, [filename])
+        self.buffers.release(sims)
+
+    def _sparsify(
+        self,
+        sims: torch.Tensor,
+        start_idx: int,
+        threshold: Optional[float],
+        top_k: Optional[int],
+    ) -> Dict[str, Any]:
+        """Converts a batch's (n_layer, batch_size, n_queries) similarities
+        to the layout described in `cosine_sim_ffwd_out_sparse_filename`."""
+        # (n_queries, n_layer, batch_size), so that rows are (query, block)
+        sims = sims.permute(2, 0, 1)
+        if top_k is None:
+            indices = torch.arange(sims.shape[-1], device=sims.device).expand(
+                sims.shape
+            )
+            values = sims
+        else:
+            values, indices = sims.topk(min(top_k, sims.shape[-1]), dim=-1)
+            indices, order = indices.sort(dim=-1)
+            values = values.gather(-1, order)
+
+        if threshold is None:
+            keep = torch.ones_like(values, dtype=torch.bool)
+        else:
+            keep = values > threshold
+
+        offsets = torch.zeros(
+            keep.shape[0] * keep.shape[1] + 1, dtype=torch.long, device=sims.device
+        )
+        torch.cumsum(keep.sum(dim=-1).flatten(), dim=0, out=offsets[1:])
+        # Saved on the CPU, so that the files can be loaded without a GPU
+        return {
+            "offsets": offsets.cpu(),
+            "indices": (indices[keep] + start_idx).cpu(),
+            "values": values[keep].contiguous().cpu(),
+            "top_k": top_k,
+        }
+
+    def _save_sparse_batch(
+        self, batch_idx: int, sparse_sims: Dict[str, Any], manifest: RunManifest
+    ):
+        filename = self.cosine_sim_ffwd_out_sparse_filename(batch_idx)
+        atomic_save(sparse_sims, filename)
+        manifest.mark_complete(batch_idx, [filename])
+
+    def _get_ffwd_outs(
+        self, batch_strings: Sequence[str], out: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """Returns the final-position ffwd outputs of each block for the
+        strings, shape (n_layer, len(batch_strings), n_embed), written to
+        `out` if it's given."""
         tokens = self.encoding_helpers.tokenize_strings(batch_strings)
         embeddings = self.accessors.embed_tokens(tokens)
 
-        _, io_accessors = self.accessors.run_model(embeddings)
+        _, io_accessors = self.accessors.run_model(embeddings, positions=[-1])
 
-        ffwd_outs = torch.stack(
+        return torch.stack(
             [
-                io_accessors[block_idx].output("ffwd")[:, -1, :].clone()
+                io_accessors[block_idx].output("ffwd")[:, -1, :]
                 for block_idx in range(n_layer)
-            ]
+            ],
+            out=out,
         )
-        return ffwd_outs
 
 # %% ../../nbs/experiments/cosine-sims.ipynb 9
 def get_ffwd_queries(
@@ -126,7 +301,7 @@ def get_ffwd_queries(
     tokens = encoding_helpers.tokenize_strings(strings)
     embeddings = accessors.embed_tokens(tokens)
 
-    _, io_accessors = accessors.run_model(embeddings)
+    _, io_accessors = accessors.run_model(embeddings, positions=[-1])
 
     return torch.stack(
         [
@@ -171,6 +346,35 @@ def get_ffwd_queries(
     type=click.INT,
     default=0,
 )
+@click.option(
+    "-w",
+    "--n_workers",
+    required=False,
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes to split the batches between.",
+)
+@click.option(
+    "--threads_per_worker",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="torch threads per worker (defaults to splitting the cores evenly).",
+)
+@click.option(
+    "--threshold",
+    required=False,
+    type=click.FLOAT,
+    default=None,
+    help="Only save the similarities above this threshold.",
+)
+@click.option(
+    "--top_k",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="Only save the top k similarities for each query and block.",
+)
 def run(
     model_weights_filename: str,
     dataset_cache_filename: str,
@@ -180,6 +384,10 @@ def run(
     num_queries: int,
     random_seed: int,
     start_batch_idx: int,
+    n_workers: int,
+    threads_per_worker: Optional[int],
+    threshold: Optional[float],
+    top_k: Optional[int],
 ):
     click.echo("CosineSimilaritiesExperiment CLI")
     click.echo()
@@ -193,6 +401,9 @@ def run(
     click.echo(f"  num queries: {num_queries}")
     click.echo(f"  random seed: {random_seed}")
     click.echo(f"  start batch idx: {start_batch_idx}")
+    click.echo(f"  workers: {n_workers}")
+    click.echo(f"  threshold: {threshold}")
+    click.echo(f"  top k: {top_k}")
 
     click.echo()
 
@@ -207,6 +418,7 @@ def run(
         saved_model_filename=model_weights_filename,
         dataset=ts,
         device=device,
+        share_memory=n_workers > 1,
     )
     _ = m.to(device)
 
@@ -228,7 +440,17 @@ def run(
     query_strings = [all_strings[i.item()] for i in indices]
 
     queries = get_ffwd_queries(query_strings, encoding_helpers, accessors)
-    experiment.run(queries=queries, start_batch_idx=start_batch_idx)
+    experiment.run(
+        queries=queries,
+        start_batch_idx=start_batch_idx,
+        executor=ShardedExecutor(n_workers, threads_per_worker),
+        threshold=threshold,
+        top_k=top_k,
+    )
+    if n_workers == 1:
+        click.echo(
+            f"peak buffer memory: {experiment.buffers.peak_bytes / 2**20:.1f} MiB"
+        )
 
 # %% ../../nbs/experiments/cosine-sims.ipynb 16
 class LoadBatchFunction(Protocol):
@@ -238,6 +460,51 @@ class LoadBatchFunction(Protocol):
 PreFilterResult = Sequence[Sequence[Dict[str, torch.Tensor]]]
 
 
+def _group_by_query_and_block(
+    row_counts: torch.Tensor,
+    indices: torch.Tensor,
+    values: torch.Tensor,
+    n_queries: int,
+) -> PreFilterResult:
+    """Splits `indices` and `values`, which must be sorted by row (q_idx *
+    n_layer + block_idx), into a result per query and block. `row_counts`
+    holds the number of entries in each row."""
+    counts = row_counts.tolist()
+    split_indices = indices.split(counts)
+    split_values = values.split(counts)
+    # Clone so that each result can be saved on its own, without the storage
+    # of the whole split tensor.
+    return [
+        [
+            {
+                "indices": split_indices[q_idx * n_layer + block_idx].clone(),
+                "values": split_values[q_idx * n_layer + block_idx].clone(),
+            }
+            for block_idx in range(n_layer)
+        ]
+        for q_idx in range(n_queries)
+    ]
+
+
+def _filter_batch(
+    batch: torch.Tensor, q_idx_start: int, q_idx_end: int, threshold: float
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Finds the similarities in one (n_layer, batch_size, n_queries) batch
+    that are above `threshold`. Returns the number found for each (query,
+    block) row, and their indices within the batch and values, sorted by row
+    and then index."""
+    n_layer_batch, _, n_queries = batch.shape
+    assert n_layer_batch == n_layer
+    assert 0 <= q_idx_start < q_idx_end <= n_queries
+
+    # (n_queries, n_layer, batch_size): nonzero() and masking both go in
+    # row-major order, so this puts the results in (query, block, index) order.
+    sims = batch[:, :, q_idx_start:q_idx_end].permute(2, 0, 1)
+    keep = sims > threshold
+    _, _, indices_in_batch = keep.nonzero(as_tuple=True)
+    return keep.sum(dim=-1).flatten(), indices_in_batch, sims[keep]
+
+
 def pre_filter_cosine_sim_results(
     load_batch: LoadBatchFunction,
     n_batches: int,
@@ -245,61 +512,141 @@ def pre_filter_cosine_sim_results(
     q_idx_end: int,
     threshold: float,
     disable_progress_bars: bool = False,
+    prefetch_depth: int = 2,
+    prefetch_max_bytes: Optional[int] = None,
+    n_workers: int = 1,
 ) -> PreFilterResult:
-    result: Sequence[Sequence[Dict[str, List]]] = [
-        [{"indices": [], "values": []} for _ in range(n_layer)]
-        for _ in range(q_idx_end - q_idx_start)
-    ]
-    total_count = 0
-    for batch_idx in tqdm(range(n_batches), disable=disable_progress_bars):
-        batch = load_batch(batch_idx)
-        n_layer_batch, batch_size, n_queries = batch.shape
-        assert n_layer_batch == n_layer
-        assert 0 <= q_idx_start < q_idx_end <= n_queries
-
-        filtered = batch[:, :, q_idx_start:q_idx_end] > threshold
-        block_idxs, indices_in_batch, q_idxs = torch.nonzero(filtered, as_tuple=True)
-        for block_idx in range(n_layer):
-            for q_idx in range(q_idx_end - q_idx_start):
-                result[q_idx][block_idx]["indices"].extend(
-                    (
-                        indices_in_batch[
-                            torch.logical_and(block_idxs == block_idx, q_idxs == q_idx)
-                        ]
-                        + total_count
-                    ).tolist()
-                )
-                result[q_idx][block_idx]["values"].extend(
-                    batch[
-                        block_idx,
-                        indices_in_batch[
-                            torch.logical_and(block_idxs == block_idx, q_idxs == q_idx)
-                        ],
-                        q_idx + q_idx_start,
-                    ].tolist()
-                )
-        total_count += batch_size
+    """Finds, for each query in [q_idx_start, q_idx_end) and each block, the
+    indices and values of the cosine similarities above `threshold`. The next
+    `prefetch_depth` batches are loaded in the background while the current one
+    is filtered (see PrefetchingBatchLoader), and up to `n_workers` batches are
+    filtered at once on a thread pool."""
+    assert n_workers >= 1, f"n_workers must be >= 1, was {n_workers}"
+    filter_batch = partial(
+        _filter_batch,
+        q_idx_start=q_idx_start,
+        q_idx_end=q_idx_end,
+        threshold=threshold,
+    )
 
-    # Convert all lists to tensors
-    tensor_result: PreFilterResult = [
-        [
-            {"indices": torch.tensor([]), "values": torch.tensor([])}
-            for _ in range(n_layer)
-        ]
-        for _ in range(q_idx_end - q_idx_start)
-    ]
-    for q_idx in range(q_idx_end - q_idx_start):
-        for block_idx in range(n_layer):
-            tensor_result[q_idx][block_idx]["indices"] = torch.tensor(
-                result[q_idx][block_idx]["indices"], dtype=torch.long
-            )
-            tensor_result[q_idx][block_idx]["values"] = torch.tensor(
-                result[q_idx][block_idx]["values"], dtype=torch.float32
-            )
+    batch_results: List[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]] = []
+    batch_starts: List[int] = []
+    total_count = 0
+    with PrefetchingBatchLoader(
+        load_batch, n_batches, depth=prefetch_depth, max_bytes=prefetch_max_bytes
+    ) as loader, ThreadPoolExecutor(max_workers=n_workers) as executor, tqdm(
+        total=n_batches, disable=disable_progress_bars
+    ) as progress:
+        pending: Deque[Future] = deque()
+
+        def collect_oldest():
+            batch_results.append(pending.popleft().result())
+            progress.update()
+
+        for batch_idx in range(n_batches):
+            batch = loader(batch_idx)
+            batch_starts.append(total_count)
+            total_count += batch.shape[1]
+            pending.append(executor.submit(filter_batch, batch))
+            del batch
+            # Don't hold on to more batches than there are workers
+            if len(pending) == n_workers:
+                collect_oldest()
+        while pending:
+            collect_oldest()
+
+    # Each batch's results are sorted by row, so they can be merged by
+    # counting: a batch's entries for a row go after that row's entries from
+    # the earlier batches.
+    n_rows = (q_idx_end - q_idx_start) * n_layer
+    counts = torch.zeros((n_batches, n_rows), dtype=torch.long)
+    for batch_idx, (batch_counts, _, _) in enumerate(batch_results):
+        counts[batch_idx] = batch_counts
+    row_counts = counts.sum(dim=0)
+    row_starts = torch.cumsum(row_counts, dim=0) - row_counts
+    dest_starts = row_starts + torch.cumsum(counts, dim=0) - counts
+
+    n_total = int(row_counts.sum().item())
+    indices = torch.empty(n_total, dtype=torch.long)
+    values = torch.empty(n_total, dtype=torch.float32)
+    for (
+        (batch_counts, batch_indices, batch_values),
+        batch_dest_starts,
+        start_idx,
+    ) in zip(batch_results, dest_starts, batch_starts):
+        # Each entry goes to its row's start for this batch, plus its position
+        # among the batch's entries for the row.
+        batch_row_starts = torch.cumsum(batch_counts, dim=0) - batch_counts
+        dest = torch.arange(len(batch_indices)) + torch.repeat_interleave(
+            batch_dest_starts - batch_row_starts, batch_counts
+        )
+        indices[dest] = batch_indices + start_idx
+        values[dest] = batch_values.to(torch.float32)
 
-    return tensor_result
+    return _group_by_query_and_block(
+        row_counts, indices, values, q_idx_end - q_idx_start
+    )
 
 # %% ../../nbs/experiments/cosine-sims.ipynb 18
+class LoadSparseBatchFunction(Protocol):
+    def __call__(self, batch_idx: int) -> Dict[str, Any]: ...
+
+
+def load_sparse_cosine_sim_results(
+    load_batch: LoadSparseBatchFunction,
+    n_batches: int,
+    q_idx_start: int,
+    q_idx_end: int,
+    disable_progress_bars: bool = False,
+) -> PreFilterResult:
+    """Collects the similarities that `CosineSimilaritiesExperiment.run` saved
+    with a `threshold` and/or `top_k` (see
+    `CosineSimilaritiesExperiment.cosine_sim_ffwd_out_sparse_filename`) for each
+    query in [q_idx_start, q_idx_end) and each block, in the same form as
+    `pre_filter_cosine_sim_results`. For runs with a `top_k`, the top k across
+    all the batches are kept."""
+    n_queries = q_idx_end - q_idx_start
+    row_start = q_idx_start * n_layer
+    row_end = q_idx_end * n_layer
+    top_k: Optional[int] = None
+
+    rows_list, indices_list, values_list = [], [], []
+    for batch_idx in tqdm(range(n_batches), disable=disable_progress_bars):
+        batch = load_batch(batch_idx)
+        offsets = batch["offsets"]
+        assert 0 <= q_idx_start < q_idx_end <= (len(offsets) - 1) // n_layer
+        top_k = batch["top_k"]
+
+        start, end = offsets[row_start].item(), offsets[row_end].item()
+        counts = offsets[row_start + 1 : row_end + 1] - offsets[row_start:row_end]
+        rows_list.append(
+            torch.repeat_interleave(torch.arange(row_end - row_start), counts)
+        )
+        indices_list.append(batch["indices"][start:end])
+        values_list.append(batch["values"][start:end])
+
+    # Batches are in string order, so a stable sort by row leaves each row's
+    # entries sorted by index.
+    rows, order = torch.cat(rows_list).sort(stable=True)
+    indices = torch.cat(indices_list)[order]
+    values = torch.cat(values_list)[order]
+
+    if top_k is not None:
+        # Keep each row's top k: rank the entries within their rows by value,
+        # then restore the (row, index) order.
+        by_value = values.argsort(descending=True, stable=True)
+        by_value = by_value[rows[by_value].sort(stable=True).indices]
+        row_counts = torch.bincount(rows, minlength=row_end - row_start)
+        row_offsets = torch.cumsum(row_counts, dim=0) - row_counts
+        rank = torch.arange(len(rows)) - row_offsets[rows[by_value]]
+        keep = by_value[rank < top_k].sort().values
+        rows, indices, values = rows[keep], indices[keep], values[keep]
+
+    return _group_by_query_and_block(
+        torch.bincount(rows, minlength=row_end - row_start), indices, values, n_queries
+    )
+
+# %% ../../nbs/experiments/cosine-sims.ipynb 20
 class LoadPrefilteredFunction(Protocol):
     def __call__(self, q_idx: int) -> torch.Tensor: ...
 
@@ -326,3 +673,190 @@ def filter_on_prefiltered_results(
         matching_indices.append(indices[indices_into_values])
 
     return matching_indices
+
+# %% ../../nbs/experiments/cosine-sims.ipynb 22
+class LoadPrefilteredQueryFunction(Protocol):
+    def __call__(self, q_idx: int) -> Sequence[Dict[str, torch.Tensor]]: ...
+
+
+class CosineSimInvertedIndex:
+    """A single memory-mapped file holding prefiltered cosine similarity
+    results (see pre_filter_cosine_sim_results) for many queries, in CSR
+    layout with one row per (query, block) pair, at row `q_idx * n_layer +
+    block_idx`: row r's string indices (sorted) and similarity values are at
+    `offsets[r]:offsets[r + 1]` of `indices` and `values`.
+
+    The file is a little-endian uint64 header length, a JSON header, and then
+    the int64 `offsets`, int64 `indices` and float32 `values` arrays. Use
+    `create()` to write one and the constructor to open it.
+
+    `filter()` evaluates a filter function over every query's values in one
+    call, and can intersect the results across blocks."""
+
+    _header_len_bytes = 8
+    # Room for the header; the arrays start after it, 64 byte aligned.
+    _header_room = 1024
+    _alignment = 64
+
+    def __init__(self, filename: Path):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            header_len = int.from_bytes(f.read(self._header_len_bytes), "little")
+            header = json.loads(f.read(header_len))
+        self.n_queries: int = header["n_queries"]
+        self.n_strings: int = header["n_strings"]
+        assert (
+            header["n_layer"] == n_layer
+        ), f"index has {header['n_layer']} blocks, model has {n_layer}"
+
+        def _load(name: str, dtype: np.dtype) -> torch.Tensor:
+            length = header["arrays"][name]["length"]
+            if length == 0:  # np.memmap can't map an empty array
+                return torch.from_numpy(np.empty(0, dtype=dtype))
+            # Copy-on-write mode gives a writeable view, which torch needs for
+            # a zero-copy tensor, without modifying the file.
+            return torch.from_numpy(
+                np.memmap(
+                    filename,
+                    mode="c",
+                    dtype=dtype,
+                    offset=header["arrays"][name]["offset"],
+                    shape=(length,),
+                )
+            )
+
+        self.offsets = _load("offsets", np.dtype("<i8"))
+        self.indices = _load("indices", np.dtype("<i8"))
+        self.values = _load("values", np.dtype("<f4"))
+
+    @classmethod
+    def create(
+        cls,
+        filename: Path,
+        load_prefiltered_query: LoadPrefilteredQueryFunction,
+        n_queries: int,
+        n_strings: int,
+    ) -> "CosineSimInvertedIndex":
+        """Writes an index for queries [0, n_queries) to `filename`.
+        `load_prefiltered_query` is called with each query index and should
+        return that query's results for every block, as one element of the
+        result of pre_filter_cosine_sim_results (or
+        load_sparse_cosine_sim_results). `n_strings` is the number of strings
+        the results' indices refer to."""
+        assert n_queries > 0
+        row_counts = torch.zeros(n_queries * n_layer, dtype=torch.long)
+        indices_list, values_list = [], []
+        for q_idx in range(n_queries):
+            prefiltered = load_prefiltered_query(q_idx)
+            assert len(prefiltered) == n_layer
+            for block_idx, block_result in enumerate(prefiltered):
+                indices, values = itemgetter("indices", "values")(block_result)
+                row_counts[q_idx * n_layer + block_idx] = len(indices)
+                indices_list.append(indices.to(torch.long))
+                values_list.append(values.to(torch.float32))
+
+        offsets = torch.zeros(len(row_counts) + 1, dtype=torch.long)
+        torch.cumsum(row_counts, dim=0, out=offsets[1:])
+        indices = torch.cat(indices_list)
+        values = torch.cat(values_list)
+        assert len(indices) == 0 or indices.max().item() < n_strings
+
+        arrays = {
+            "offsets": offsets.numpy().astype("<i8"),
+            "indices": indices.numpy().astype("<i8"),
+            "values": values.numpy().astype("<f4"),
+        }
+        atomic_save(
+            arrays,
+            filename,
+            save_fn=partial(cls._write, n_queries=n_queries, n_strings=n_strings),
+        )
+        return cls(filename)
+
+    @classmethod
+    def _write(
+        cls,
+        arrays: Dict[str, np.ndarray],
+        f: BinaryIO,
+        n_queries: int,
+        n_strings: int,
+    ):
+        array_offsets, pos = {}, cls._header_room
+        for name, a in arrays.items():
+            array_offsets[name] = {"offset": pos, "length": len(a)}
+            pos += cls._alignment * math.ceil(a.nbytes / cls._alignment)
+        header = json.dumps(
+            {
+                "n_queries": n_queries,
+                "n_layer": n_layer,
+                "n_strings": n_strings,
+                "arrays": array_offsets,
+            }
+        ).encode("utf-8")
+        assert cls._header_len_bytes + len(header) <= cls._header_room
+
+        f.write(len(header).to_bytes(cls._header_len_bytes, "little"))
+        f.write(header)
+        for name, a in arrays.items():
+            f.seek(array_offsets[name]["offset"])
+            f.write(a.tobytes())
+        f.truncate(pos)
+
+    def _rows(self, row_idxs: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the number of entries in each of `row_idxs`, and the
+        positions (in `indices` and `values`) of all their entries."""
+        starts = self.offsets[row_idxs]
+        counts = self.offsets[row_idxs + 1] - starts
+        row_starts_in_result = torch.cumsum(counts, dim=0) - counts
+        positions = torch.arange(int(counts.sum().item())) + torch.repeat_interleave(
+            starts - row_starts_in_result, counts
+        )
+        return counts, positions
+
+    def get(self, q_idx: int, block_idx: int) -> Dict[str, torch.Tensor]:
+        """Returns the results for one query and block, in the form
+        `filter_on_prefiltered_results`'s `load_prefiltered` returns."""
+        row = q_idx * n_layer + block_idx
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return {
+            "indices": self.indices[start:end],
+            "values": self.values[start:end],
+        }
+
+    def filter(
+        self,
+        filter_fn: Callable[[torch.Tensor], torch.Tensor],
+        block_idxs: Sequence[int],
+        q_idx_start: int = 0,
+        q_idx_end: Optional[int] = None,
+    ) -> List[torch.Tensor]:
+        """Like filter_on_prefiltered_results, but for every query in
+        [q_idx_start, q_idx_end) at once: returns, for each query, the sorted
+        indices of the strings whose values pass `filter_fn` in every one of
+        `block_idxs` (e.g. `filter(lambda x: x > 0.8, [3, 5])` finds strings
+        above 0.8 in both block 3 and block 5). `filter_fn` is called once per
+        block, with the values for all the queries."""
+        q_idx_end = self.n_queries if q_idx_end is None else q_idx_end
+        assert 0 <= q_idx_start < q_idx_end <= self.n_queries
+        assert len(block_idxs) > 0
+        n_queries = q_idx_end - q_idx_start
+        q_idxs = torch.arange(n_queries)
+
+        # Encode each passing (query, string) pair as one integer key, so
+        # the intersection across blocks is a count of repeated keys.
+        keys_list = []
+        for block_idx in block_idxs:
+            counts, positions = self._rows(
+                (q_idxs + q_idx_start) * n_layer + block_idx
+            )
+            passed = filter_fn(self.values[positions])
+            keys = (
+                torch.repeat_interleave(q_idxs, counts) * self.n_strings
+                + self.indices[positions]
+            )
+            keys_list.append(keys[passed])
+
+        keys, key_counts = torch.cat(keys_list).unique(sorted=True, return_counts=True)
+        keys = keys[key_counts == len(block_idxs)]
+        q_counts = torch.bincount(keys // self.n_strings, minlength=n_queries)
+        return list((keys % self.n_strings).split(q_counts.tolist()))
@@ -6,6 +6,7 @@ __all__ = ['FinalFFWDExperiment', 'run']
 # %% ../../nbs/experiments/final_ffwd.ipynb 5
 from collections import defaultdict, OrderedDict
 from dataclasses import dataclass
+from functools import partial
 import json
 import math
 from matplotlib.axes import Axes
@@ -31,10 +32,23 @@ import torch.nn.functional as F
 from tqdm.auto import tqdm
 
 # %% ../../nbs/experiments/final_ffwd.ipynb 7
+from ..common.activation_store import model_hash
+from transformer_experiments.common.compressed_tensors import (
+    available_codecs,
+    load_compressed,
+    save_compressed,
+)
 from ..common.databatcher import DataBatcher
+from ..common.sharded_executor import ShardedExecutor
 from ..environments import get_environment
 from ..common.substring_generator import all_unique_substrings
-from ..common.utils import topk_across_batches
+from transformer_experiments.common.utils import (
+    atomic_save,
+    RunManifest,
+    strings_checksum,
+    topk_across_batches,
+    WriteBehindWriter,
+)
 from ..dataset_split import split_text_dataset
 from transformer_experiments.datasets.tinyshakespeare import (
     TinyShakespeareDataSet,
@@ -64,12 +78,28 @@ class FinalFFWDExperiment:
         strings: Sequence[str],
         output_dir: Path,
         batch_size: int = 10000,
+        max_pending_writes: int = 2,
+        compression: Optional[str] = None,
     ):
+        """`run` writes each batch's output in the background while the next
+        batch runs, with up to `max_pending_writes` batches waiting to be
+        written (see WriteBehindWriter). Completed batches are recorded in a
+        `RunManifest` in `output_dir`, and skipped if `run` is restarted with
+        the same settings.
+
+        If `compression` is set to one of `available_codecs()`, the output
+        files are saved compressed with that codec (see `save_compressed`)."""
         self.eh = eh
         self.accessors = accessors
         self.strings = strings
         self.output_dir = output_dir
         self.batch_size = batch_size
+        self.max_pending_writes = max_pending_writes
+        if compression is not None:
+            assert (
+                compression in available_codecs()
+            ), f"compression must be one of {available_codecs()}, was {compression}"
+        self.compression = compression
 
         # Create a map of string to index to enable fast lookup.
         self.idx_map = OrderedDict((s, idx) for idx, s in enumerate(self.strings))
@@ -79,29 +109,91 @@ class FinalFFWDExperiment:
     def sample_length(self) -> int:
         return len(self.strings[0])
 
-    def run(self, disable_progress_bars: bool = False):
-        for batch_idx in tqdm(range(self.n_batches), disable=disable_progress_bars):
-            start_idx = batch_idx * self.batch_size
-            end_idx = start_idx + self.batch_size
-            batch_strings = self.strings[start_idx:end_idx]
-            self._run_batch(batch_idx, batch_strings)
+    def run(
+        self,
+        disable_progress_bars: bool = False,
+        executor: Optional[ShardedExecutor] = None,
+    ):
+        """Runs all the strings through the model and saves the results.
+        Pass a `ShardedExecutor` with more than one worker to split the batches
+        between worker processes."""
+        manifest = RunManifest(
+            self.output_dir / "run_manifest.json",
+            config={
+                "strings": strings_checksum(self.strings),
+                "batch_size": self.batch_size,
+                "model": model_hash(self.accessors.m),
+                "compression": self.compression,
+            },
+        )
+        pending_batches = [
+            batch_idx
+            for batch_idx in range(self.n_batches)
+            if not manifest.is_complete(batch_idx)
+        ]
+        (executor or ShardedExecutor()).run(
+            partial(self._run_batches, manifest=manifest),
+            pending_batches,
+            disable_progress_bar=disable_progress_bars,
+        )
+
+    def _run_batches(
+        self,
+        batch_indices: Sequence[int],
+        on_batch_done: Callable[[], None],
+        manifest: RunManifest,
+    ):
+        with WriteBehindWriter(max_pending=self.max_pending_writes) as writer:
+            for batch_idx in batch_indices:
+                start_idx = batch_idx * self.batch_size
+                end_idx = start_idx + self.batch_size
+                batch_strings = self.strings[start_idx:end_idx]
+                self._run_batch(batch_idx, batch_strings, writer, manifest)
+                on_batch_done()
 
     def _ffwd_output_filename(self, batch_idx: int, block_idx: int) -> Path:
-        return self.output_dir / f"ffwd_output-{batch_idx:04d}-{block_idx:02d}.pt"
+        suffix = "ptz" if self.compression is not None else "pt"
+        return self.output_dir / f"ffwd_output-{batch_idx:04d}-{block_idx:02d}.{suffix}"
+
+    def _load_ffwd_output(self, batch_idx: int, block_idx: int) -> torch.Tensor:
+        """Returns a batch's ffwd output, whether or not it was saved
+        compressed. Uncompressed outputs are memory-mapped."""
+        filename = self._ffwd_output_filename(batch_idx, block_idx)
+        if self.compression is not None:
+            return load_compressed(filename)
+        return torch.load(str(filename), mmap=True)
 
-    def _run_batch(self, batch_idx: int, batch_strings: Sequence[str]):
+    def _run_batch(
+        self,
+        batch_idx: int,
+        batch_strings: Sequence[str],
+        writer: WriteBehindWriter,
+        manifest: RunManifest,
+    ):
         tokens = self.eh.tokenize_strings(batch_strings)
         embeddings = self.accessors.embed_tokens(tokens)
 
-        # Run the embeddings through the model.
-        _, io_accessors = self.accessors.run_model(embeddings)
+        # Run the embeddings through the model. Only the final position's
+        # output is kept, so the last block only needs to run for it.
+        _, io_accessors = self.accessors.run_model(embeddings, positions=[-1])
 
         # Write the result of the final block's final t_i to disk.
         block_idx = n_layer - 1
-        torch.save(
-            io_accessors[block_idx].output("ffwd")[:, -1, :].clone(),
-            self._ffwd_output_filename(batch_idx, block_idx),
-        )
+        ffwd_output = io_accessors[block_idx].output("ffwd")[:, -1, :].clone()
+        filename = self._ffwd_output_filename(batch_idx, block_idx)
+
+        def _save():
+            if self.compression is not None:
+                atomic_save(
+                    ffwd_output,
+                    filename,
+                    save_fn=partial(save_compressed, codec=self.compression),
+                )
+            else:
+                atomic_save(ffwd_output, filename)
+            manifest.mark_complete(batch_idx, [filename])
+
+        writer.submit(_save)
 
 # %% ../../nbs/experiments/final_ffwd.ipynb 13
 @click.command()
@@ -121,12 +213,37 @@ class FinalFFWDExperiment:
     type=click.IntRange(min=1),
     default=10000,
 )
+@click.option(
+    "-w",
+    "--n_workers",
+    required=False,
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes to split the batches between.",
+)
+@click.option(
+    "--threads_per_worker",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="torch threads per worker (defaults to splitting the cores evenly).",
+)
+@click.option(
+    "--compression",
+    required=False,
+    type=click.Choice(available_codecs()),
+    default=None,
+    help="Save the output files compressed with this codec.",
+)
 def run(
     model_weights_filename: str,
     dataset_cache_filename: str,
     output_folder: str,
     sample_len: int,
     max_batch_size: int,
+    n_workers: int,
+    threads_per_worker: Optional[int],
+    compression: Optional[str],
 ):
     click.echo(f"Running block internals experiment for with:")
     click.echo(f"  model weights: {model_weights_filename}")
@@ -134,6 +251,8 @@ def run(
     click.echo(f"  output folder: {output_folder}")
     click.echo(f"  sample length: {sample_len}")
     click.echo(f"  max batch size: {max_batch_size}")
+    click.echo(f"  workers: {n_workers}")
+    click.echo(f"  compression: {compression}")
 
     # Instantiate the model, tokenizer, and dataset
     device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -144,6 +263,7 @@ def run(
         saved_model_filename=model_weights_filename,
         dataset=ts,
         device=device,
+        share_memory=n_workers > 1,
     )
 
     strings = all_unique_substrings(ts.text, sample_len)
@@ -153,7 +273,12 @@ def run(
 
     # Create the experiment
     exp = FinalFFWDExperiment(
-        encoding_helpers, accessors, strings, Path(output_folder), max_batch_size
+        encoding_helpers,
+        accessors,
+        strings,
+        Path(output_folder),
+        max_batch_size,
+        compression=compression,
     )
 
-    exp.run()
+    exp.run(executor=ShardedExecutor(n_workers, threads_per_worker))
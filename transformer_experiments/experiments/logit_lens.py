@@ -68,32 +68,15 @@ class LogitLens:
             logits = LogitsWrapper(
                 accessors.logits_from_embedding(emb), self.eh.tokenizer
             )
-            topk = logits.topk_tokens(1)
-
-            # topk is shaped like this:
-            # [  <- batch dimension
-            #   [  <- prompt length dimension
-            #     [  (token, prob) ], <- topk dimension (only 1 entry because we
-            #     [  (token, prob) ],    asked for the top 1 token)
-            #     ...
-            #   ]
-            # ]
-            #
-            # We want to flatten this to just a list of len(prompt) of tokens
-            # and probs:
-            #
-            # [ (token, prob), (token, prob), ...)]
-            # <---------- len(prompt) ----------->
-            #
-            # We know we have only one batch, so we just need to look at topk[0],
-            # and then pull out the first item of each element.
-            tokens_and_probs = [item[0] for item in topk[0]]
-
-            # Now separate the tokens and probs into separate lists
-            tokens, probs = zip(*tokens_and_probs)
-
-            top_tokens.append(list(tokens))
-            top_token_probs.append(list(probs))
+            # ids and probs are both shaped (1, len(prompt), 1): we have only
+            # one batch and asked for the top 1 token, so we just need the
+            # [0, :, 0] slice of each.
+            ids, probs = logits.topk_tensors(1)
+            tokens = [self.eh.tokenizer.itos[i] for i in ids[0, :, 0].tolist()]
+            top_probs = probs[0, :, 0].tolist()
+
+            top_tokens.append(tokens)
+            top_token_probs.append(top_probs)
 
         self.top_tokens = top_tokens
         self.top_token_probs = top_token_probs
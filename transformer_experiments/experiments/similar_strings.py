@@ -2,25 +2,50 @@
 
 # %% auto 0
 __all__ = ['SimilarStringsData', 'SimilarStringsResult', 'SimilarStringsExperiment', 'run', 'generate_string_to_batch_map',
-           'generate_similars', 'embeddings', 'proj_out', 'ffwd_out']
+           'generate_similars', 'embeddings', 'proj_out', 'ffwd_out', 'outputs', 'binary_results']
 
 # %% ../../nbs/experiments/similar-strings.ipynb 5
 from collections import defaultdict, OrderedDict
 from dataclasses import dataclass, field
+from functools import partial
 import json
 import math
 from pathlib import Path
 import tempfile
-from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 # %% ../../nbs/experiments/similar-strings.ipynb 6
 import click
+import numpy as np
 import torch
 from tqdm.auto import tqdm
 
 # %% ../../nbs/experiments/similar-strings.ipynb 7
+from ..common.ann_index import recall_at_k
+from transformer_experiments.common.sharded_executor import (
+    run_each_batch,
+    ShardedExecutor,
+)
 from ..common.substring_generator import all_unique_substrings
-from ..common.utils import topk_across_batches
+from transformer_experiments.common.utils import (
+    atomic_save,
+    atomic_write_text,
+    PrefetchingBatchLoader,
+    RunManifest,
+    strings_checksum,
+    topk_across_batches,
+)
 from transformer_experiments.datasets.tinyshakespeare import (
     TinyShakespeareDataSet,
 )
@@ -31,6 +56,8 @@ from transformer_experiments.experiments.block_internals import (
     batch_cosine_sim,
     batch_distances,
     DistanceFunction,
+    OutputSearch,
+    StoredBlockInternals,
 )
 from transformer_experiments.models.transformer import (
     block_size,
@@ -131,6 +158,10 @@ class SimilarStringsResult:
         return aggr_proj_out, aggr_ffwd_out
 
 # %% ../../nbs/experiments/similar-strings.ipynb 13
+def _save_npy(a: np.ndarray, f: BinaryIO):
+    np.save(f, a)
+
+
 class SimilarStringsExperiment:
     def __init__(
         self,
@@ -163,6 +194,182 @@ class SimilarStringsExperiment:
             / f"ffwd_out_sim_strings-{batch_idx:03d}-{block_idx:02d}-{t_i:03d}.json"
         )
 
+    def _results_queries_filename(self) -> Path:
+        return self.output_dir / "results-queries.npy"
+
+    def _results_neighbour_strings_filename(self) -> Path:
+        return self.output_dir / "results-neighbour_strings.npy"
+
+    def _embs_results_filename(self) -> Path:
+        return self.output_dir / "embs_results.npy"
+
+    def _proj_out_results_filename(self, block_idx: int, t_i: int) -> Path:
+        return self.output_dir / f"proj_out_results-{block_idx:02d}-{t_i:03d}.npy"
+
+    def _ffwd_out_results_filename(self, block_idx: int, t_i: int) -> Path:
+        return self.output_dir / f"ffwd_out_results-{block_idx:02d}-{t_i:03d}.npy"
+
+    def _run_manifest(
+        self,
+        name: str,
+        strings: Sequence[str],
+        exp: BatchedBlockInternalsExperiment,
+        batch_size: int,
+        n_similars: int,
+        largest: bool,
+        distance_function: DistanceFunction,
+        ann_n_probe: Optional[int],
+        write_json: bool,
+    ) -> RunManifest:
+        """Returns the manifest recording which batches of the named set of
+        files have been generated, so that an interrupted generate_*_files
+        call can be restarted without redoing them."""
+        return RunManifest(
+            self.output_dir / f"run_manifest-{name}.json",
+            config={
+                "strings": strings_checksum(strings),
+                "all_strings": strings_checksum(exp.strings),
+                "batch_size": batch_size,
+                "n_similars": n_similars,
+                "largest": largest,
+                "distance_function": getattr(
+                    distance_function, "__name__", type(distance_function).__name__
+                ),
+                "ann_n_probe": ann_n_probe,
+                "write_json": write_json,
+            },
+        )
+
+    def _write_sim_strings_file(
+        self,
+        filename: Path,
+        batch_strings: Sequence[str],
+        sim_strings: Sequence[Sequence[str]],
+        distances: torch.Tensor,
+    ):
+        atomic_write_text(
+            filename,
+            json.dumps(
+                {
+                    "strings": {s: i for i, s in enumerate(batch_strings)},
+                    "sim_strings": sim_strings,
+                    "distances": distances.tolist(),
+                },
+                indent=2,
+            ),
+        )
+
+    def _results_rows(self, strings: Sequence[str]) -> np.ndarray:
+        """Returns each string's row in the binary results files, which is its
+        position in sorted order."""
+        order = sorted(range(len(strings)), key=lambda idx: strings[idx])
+        rows = np.empty(len(strings), dtype=np.int64)
+        rows[order] = np.arange(len(strings))
+        return rows
+
+    def _neighbour_ids(
+        self, exp: BatchedBlockInternalsExperiment, t_i: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Returns the ids that similar strings are stored as in the binary
+        results files: their indices into `exp.strings`. At a t_i before the
+        last position the similar strings are prefixes, which are stored as
+        the index of the first string that starts with them."""
+        if t_i is None or exp._convert_t_i(t_i) == exp.sample_length() - 1:
+            return exp.idx_map
+        return exp._unique_substring_map(t_i)
+
+    def _prepare_binary_results(
+        self,
+        strings: Sequence[str],
+        exp: BatchedBlockInternalsExperiment,
+        filenames: Sequence[Path],
+        n_similars: int,
+    ) -> np.ndarray:
+        """Makes sure the binary results files for `strings` exist: the query
+        and neighbour strings files, and each of the results `filenames`,
+        which are created with every row marked as not generated yet (with
+        neighbours of -1) if they don't exist or are for a different
+        `n_similars`. If the files were for different strings, the old
+        results files are deleted. Returns each string's row in the files."""
+        assert len(set(strings)) == len(strings), "strings must be unique"
+
+        queries = np.array(sorted(strings))
+        neighbour_strings = np.array(exp.strings)
+        queries_filename = self._results_queries_filename()
+        neighbour_strings_filename = self._results_neighbour_strings_filename()
+        if not (
+            queries_filename.exists()
+            and neighbour_strings_filename.exists()
+            and np.array_equal(np.load(queries_filename), queries)
+            and np.array_equal(np.load(neighbour_strings_filename), neighbour_strings)
+        ):
+            queries_filename.unlink(missing_ok=True)
+            for filename in self.output_dir.glob("*_results*.npy"):
+                filename.unlink()
+            atomic_save(
+                neighbour_strings, neighbour_strings_filename, save_fn=_save_npy
+            )
+            atomic_save(queries, queries_filename, save_fn=_save_npy)
+
+        dtype = np.dtype(
+            [
+                ("neighbours", np.int32, (n_similars,)),
+                ("distances", np.float32, (n_similars,)),
+            ]
+        )
+        for filename in filenames:
+            if filename.exists():
+                existing = np.load(filename, mmap_mode="r")
+                if existing.dtype == dtype and existing.shape == (len(strings),):
+                    continue
+            results = np.zeros(len(strings), dtype=dtype)
+            results["neighbours"] = -1
+            atomic_save(results, filename, save_fn=_save_npy)
+
+        return self._results_rows(strings)
+
+    def _pending_batches(
+        self,
+        manifest: RunManifest,
+        n_batches: int,
+        batch_size: int,
+        filenames: Sequence[Path],
+        rows: np.ndarray,
+    ) -> List[int]:
+        """Returns the batches that `manifest` doesn't record as complete, or
+        that have rows that haven't been written in one of the binary results
+        `filenames` (e.g. because the file was recreated)."""
+        written = np.ones(len(rows), dtype=bool)
+        for filename in filenames:
+            neighbours = np.load(filename, mmap_mode="r")["neighbours"]
+            written &= (neighbours[rows] >= 0).all(axis=1)
+        return [
+            batch_idx
+            for batch_idx in range(n_batches)
+            if not manifest.is_complete(batch_idx)
+            or not written[batch_idx * batch_size : (batch_idx + 1) * batch_size].all()
+        ]
+
+    def _write_batch_results(
+        self,
+        filename: Path,
+        rows: np.ndarray,
+        neighbour_ids: Dict[str, int],
+        sim_strings: Sequence[Sequence[str]],
+        distances: torch.Tensor,
+    ):
+        """Writes the results for a batch of strings into their `rows` of a
+        binary results file. `distances` is (k, number of strings), as
+        returned by the searches. Batches write disjoint rows, so they can be
+        written by different processes at once."""
+        results = np.load(filename, mmap_mode="r+")
+        results["neighbours"][rows] = [
+            [neighbour_ids[s] for s in row_sim_strings]
+            for row_sim_strings in sim_strings
+        ]
+        results["distances"][rows] = distances.T.cpu().numpy()
+        results.flush()
+
     def generate_string_to_batch_map(
         self,
         strings: Sequence[str],
@@ -181,8 +388,9 @@ class SimilarStringsExperiment:
             for s in batch_strings:
                 string_to_batch_map[s] = batch_idx
 
-        self._string_to_batch_map_filename().write_text(
-            json.dumps(string_to_batch_map, indent=2)
+        atomic_write_text(
+            self._string_to_batch_map_filename(),
+            json.dumps(string_to_batch_map, indent=2),
         )
 
     def generate_embeddings_files(
@@ -195,36 +403,108 @@ class SimilarStringsExperiment:
         n_similars: int = 10,
         largest: bool = False,
         distance_function: DistanceFunction = batch_distances,
+        executor: Optional[ShardedExecutor] = None,
+        ann_n_probe: Optional[int] = None,
+        write_json: bool = False,
     ):
+        """Finds the `n_similars` strings in `exp` with the closest embeddings
+        to each of `strings`, and writes them into the binary results files
+        that `load_results_for_strings` reads (see `write_binary_results` for
+        their layout), a batch of strings at a time. With `write_json`, each
+        batch's results are also exported to a JSON file. The
+        generate_proj_out_files and generate_ffwd_out_files methods do the
+        same for the proj and ffwd outputs at position `t_i`."""
         n_batches = math.ceil(len(strings) / batch_size)
+        manifest = self._run_manifest(
+            "embs",
+            strings,
+            exp,
+            batch_size,
+            n_similars,
+            largest,
+            distance_function,
+            ann_n_probe,
+            write_json,
+        )
+        results_filenames = [self._embs_results_filename()]
+        rows = self._prepare_binary_results(strings, exp, results_filenames, n_similars)
 
-        for batch_idx in tqdm(range(n_batches), disable=disable_progress_bars):
-            start_idx = batch_idx * batch_size
-            end_idx = start_idx + batch_size
-            batch_strings = strings[start_idx:end_idx]
+        pending_batches = self._pending_batches(
+            manifest, n_batches, batch_size, results_filenames, rows
+        )
+        if pending_batches:
+            # Find which of exp's batches are stored here, rather than in every worker.
+            exp.stored_batches()
+        if pending_batches and ann_n_probe is not None:
+            # Build the index here, rather than in every worker.
+            exp.ann_index("embeddings", distance_function)
+        generate_batch = partial(
+            self._generate_embeddings_batch,
+            strings=strings,
+            accessors=accessors,
+            exp=exp,
+            batch_size=batch_size,
+            n_similars=n_similars,
+            largest=largest,
+            distance_function=distance_function,
+            ann_n_probe=ann_n_probe,
+            rows=rows,
+            write_json=write_json,
+            manifest=manifest,
+        )
+        (executor or ShardedExecutor()).run(
+            partial(run_each_batch, generate_batch),
+            pending_batches,
+            disable_progress_bar=disable_progress_bars,
+        )
 
-            batch_exp = BlockInternalsExperiment(
-                self.encoding_helpers, accessors, batch_strings
-            )
+    def _generate_embeddings_batch(
+        self,
+        batch_idx: int,
+        strings: Sequence[str],
+        accessors: TransformerAccessors,
+        exp: BatchedBlockInternalsExperiment,
+        batch_size: int,
+        n_similars: int,
+        largest: bool,
+        distance_function: DistanceFunction,
+        ann_n_probe: Optional[int],
+        rows: np.ndarray,
+        write_json: bool,
+        manifest: RunManifest,
+    ):
+        start_idx = batch_idx * batch_size
+        end_idx = start_idx + batch_size
+        batch_strings = strings[start_idx:end_idx]
 
-            # Compute the embedding similar strings
-            sim_strings, distances = exp.strings_with_topk_closest_embeddings(
-                queries=batch_exp.embeddings,
-                k=n_similars,
-                largest=largest,
-                distance_function=distance_function,
-            )
+        batch_exp = StoredBlockInternals(
+            self.encoding_helpers, accessors, batch_strings, exp
+        )
 
-            self._embs_sim_strings_filename(batch_idx).write_text(
-                json.dumps(
-                    {
-                        "strings": {s: i for i, s in enumerate(batch_strings)},
-                        "sim_strings": sim_strings,
-                        "distances": distances.tolist(),
-                    },
-                    indent=2,
-                )
+        # Compute the embedding similar strings
+        sim_strings, distances = exp.strings_with_topk_closest_embeddings(
+            queries=batch_exp.embeddings,
+            k=n_similars,
+            largest=largest,
+            distance_function=distance_function,
+            ann_n_probe=ann_n_probe,
+        )
+
+        self._write_batch_results(
+            self._embs_results_filename(),
+            rows[start_idx:end_idx],
+            self._neighbour_ids(exp),
+            sim_strings,
+            distances,
+        )
+        filenames = []
+        if write_json:
+            filename = self._embs_sim_strings_filename(batch_idx)
+            self._write_sim_strings_file(
+                filename, batch_strings, sim_strings, distances
             )
+            filenames.append(filename)
+        manifest.mark_complete(batch_idx, filenames)
 
     def generate_proj_out_files(
         self,
@@ -237,6 +517,9 @@ class SimilarStringsExperiment:
         n_similars: int = 10,
         largest: bool = False,
         distance_function: DistanceFunction = batch_distances,
+        executor: Optional[ShardedExecutor] = None,
+        ann_n_probe: Optional[int] = None,
+        write_json: bool = False,
     ):
         filename_t_i = t_i
         if filename_t_i < 0:
@@ -244,39 +527,111 @@ class SimilarStringsExperiment:
         assert filename_t_i >= 0, f"converted t_i must be >= 0, was {filename_t_i}"
 
         n_batches = math.ceil(len(strings) / batch_size)
+        manifest = self._run_manifest(
+            f"proj_out-{filename_t_i:03d}",
+            strings,
+            exp,
+            batch_size,
+            n_similars,
+            largest,
+            distance_function,
+            ann_n_probe,
+            write_json,
+        )
+        results_filenames = [
+            self._proj_out_results_filename(block_idx, filename_t_i)
+            for block_idx in range(n_layer)
+        ]
+        rows = self._prepare_binary_results(strings, exp, results_filenames, n_similars)
+
+        pending_batches = self._pending_batches(
+            manifest, n_batches, batch_size, results_filenames, rows
+        )
+        if pending_batches:
+            # Find which of exp's batches are stored here, rather than in every worker.
+            exp.stored_batches()
+        if pending_batches and ann_n_probe is not None:
+            # Build the indices here, rather than in every worker.
+            for block_idx in range(n_layer):
+                exp.ann_index("proj_output", distance_function, block_idx, t_i)
+        generate_batch = partial(
+            self._generate_proj_out_batch,
+            strings=strings,
+            t_i=t_i,
+            filename_t_i=filename_t_i,
+            accessors=accessors,
+            exp=exp,
+            batch_size=batch_size,
+            n_similars=n_similars,
+            largest=largest,
+            distance_function=distance_function,
+            ann_n_probe=ann_n_probe,
+            rows=rows,
+            neighbour_ids=self._neighbour_ids(exp, t_i),
+            write_json=write_json,
+            manifest=manifest,
+        )
+        (executor or ShardedExecutor()).run(
+            partial(run_each_batch, generate_batch),
+            pending_batches,
+            disable_progress_bar=disable_progress_bars,
+        )
 
-        for batch_idx in tqdm(range(n_batches), disable=disable_progress_bars):
-            start_idx = batch_idx * batch_size
-            end_idx = start_idx + batch_size
-            batch_strings = strings[start_idx:end_idx]
+    def _generate_proj_out_batch(
+        self,
+        batch_idx: int,
+        strings: Sequence[str],
+        t_i: int,
+        filename_t_i: int,
+        accessors: TransformerAccessors,
+        exp: BatchedBlockInternalsExperiment,
+        batch_size: int,
+        n_similars: int,
+        largest: bool,
+        distance_function: DistanceFunction,
+        ann_n_probe: Optional[int],
+        rows: np.ndarray,
+        neighbour_ids: Dict[str, int],
+        write_json: bool,
+        manifest: RunManifest,
+    ):
+        start_idx = batch_idx * batch_size
+        end_idx = start_idx + batch_size
+        batch_strings = strings[start_idx:end_idx]
 
-            batch_exp = BlockInternalsExperiment(
-                self.encoding_helpers, accessors, batch_strings
-            )
+        batch_exp = StoredBlockInternals(
+            self.encoding_helpers, accessors, batch_strings, exp
+        )
 
-            for block_idx in range(n_layer):
-                # Compute the proj_out similar strings
-                sim_strings, distances = exp.strings_with_topk_closest_proj_outputs(
-                    block_idx=block_idx,
-                    t_i=t_i,
-                    # Query is always the last token - for something else, use a shorter string
-                    queries=batch_exp.proj_output(block_idx)[:, -1, :],
-                    k=n_similars,
-                    largest=largest,
-                    distance_function=distance_function,
-                )
-                self._proj_out_sim_strings_filename(
+        filenames = []
+        for block_idx in range(n_layer):
+            # Compute the proj_out similar strings
+            sim_strings, distances = exp.strings_with_topk_closest_proj_outputs(
+                block_idx=block_idx,
+                t_i=t_i,
+                # Query is always the last token - for something else, use a shorter string
+                queries=batch_exp.proj_output(block_idx)[:, -1, :],
+                k=n_similars,
+                largest=largest,
+                distance_function=distance_function,
+                ann_n_probe=ann_n_probe,
+            )
+            self._write_batch_results(
+                self._proj_out_results_filename(block_idx, filename_t_i),
+                rows[start_idx:end_idx],
+                neighbour_ids,
+                sim_strings,
+                distances,
+            )
+            if write_json:
+                filename = self._proj_out_sim_strings_filename(
                     batch_idx, block_idx, filename_t_i
-                ).write_text(
-                    json.dumps(
-                        {
-                            "strings": {s: i for i, s in enumerate(batch_strings)},
-                            "sim_strings": sim_strings,
-                            "distances": distances.tolist(),
-                        },
-                        indent=2,
-                    )
                 )
+                self._write_sim_strings_file(
+                    filename, batch_strings, sim_strings, distances
+                )
+                filenames.append(filename)
+        manifest.mark_complete(batch_idx, filenames)
 
     def generate_ffwd_out_files(
         self,
@@ -289,6 +644,9 @@ class SimilarStringsExperiment:
         n_similars: int = 10,
         largest: bool = False,
         distance_function: DistanceFunction = batch_distances,
+        executor: Optional[ShardedExecutor] = None,
+        ann_n_probe: Optional[int] = None,
+        write_json: bool = False,
     ):
         n_batches = math.ceil(len(strings) / batch_size)
 
@@ -296,39 +654,400 @@ class SimilarStringsExperiment:
         if filename_t_i < 0:
             filename_t_i = exp.sample_length() + filename_t_i
         assert filename_t_i >= 0, f"converted t_i must be >= 0, was {filename_t_i}"
+        manifest = self._run_manifest(
+            f"ffwd_out-{filename_t_i:03d}",
+            strings,
+            exp,
+            batch_size,
+            n_similars,
+            largest,
+            distance_function,
+            ann_n_probe,
+            write_json,
+        )
+        results_filenames = [
+            self._ffwd_out_results_filename(block_idx, filename_t_i)
+            for block_idx in range(n_layer)
+        ]
+        rows = self._prepare_binary_results(strings, exp, results_filenames, n_similars)
+
+        pending_batches = self._pending_batches(
+            manifest, n_batches, batch_size, results_filenames, rows
+        )
+        if pending_batches:
+            # Find which of exp's batches are stored here, rather than in every worker.
+            exp.stored_batches()
+        if pending_batches and ann_n_probe is not None:
+            # Build the indices here, rather than in every worker.
+            for block_idx in range(n_layer):
+                exp.ann_index("ffwd_output", distance_function, block_idx, t_i)
+        generate_batch = partial(
+            self._generate_ffwd_out_batch,
+            strings=strings,
+            t_i=t_i,
+            filename_t_i=filename_t_i,
+            accessors=accessors,
+            exp=exp,
+            batch_size=batch_size,
+            n_similars=n_similars,
+            largest=largest,
+            distance_function=distance_function,
+            ann_n_probe=ann_n_probe,
+            rows=rows,
+            neighbour_ids=self._neighbour_ids(exp, t_i),
+            write_json=write_json,
+            manifest=manifest,
+        )
+        (executor or ShardedExecutor()).run(
+            partial(run_each_batch, generate_batch),
+            pending_batches,
+            disable_progress_bar=disable_progress_bars,
+        )
 
-        for batch_idx in tqdm(range(n_batches), disable=disable_progress_bars):
-            start_idx = batch_idx * batch_size
-            end_idx = start_idx + batch_size
-            batch_strings = strings[start_idx:end_idx]
+    def _generate_ffwd_out_batch(
+        self,
+        batch_idx: int,
+        strings: Sequence[str],
+        t_i: int,
+        filename_t_i: int,
+        accessors: TransformerAccessors,
+        exp: BatchedBlockInternalsExperiment,
+        batch_size: int,
+        n_similars: int,
+        largest: bool,
+        distance_function: DistanceFunction,
+        ann_n_probe: Optional[int],
+        rows: np.ndarray,
+        neighbour_ids: Dict[str, int],
+        write_json: bool,
+        manifest: RunManifest,
+    ):
+        start_idx = batch_idx * batch_size
+        end_idx = start_idx + batch_size
+        batch_strings = strings[start_idx:end_idx]
+
+        batch_exp = StoredBlockInternals(
+            self.encoding_helpers, accessors, batch_strings, exp
+        )
 
-            batch_exp = BlockInternalsExperiment(
-                self.encoding_helpers, accessors, batch_strings
+        filenames = []
+        for block_idx in range(n_layer):
+            sim_strings, distances = exp.strings_with_topk_closest_ffwd_outputs(
+                block_idx=block_idx,
+                t_i=t_i,
+                # Query is always the last token - for something else, use a shorter string
+                queries=batch_exp.ffwd_output(block_idx)[:, -1, :],
+                k=n_similars,
+                largest=largest,
+                distance_function=distance_function,
+                ann_n_probe=ann_n_probe,
             )
 
+            self._write_batch_results(
+                self._ffwd_out_results_filename(block_idx, filename_t_i),
+                rows[start_idx:end_idx],
+                neighbour_ids,
+                sim_strings,
+                distances,
+            )
+            if write_json:
+                filename = self._ffwd_out_sim_strings_filename(
+                    batch_idx, block_idx, filename_t_i
+                )
+                self._write_sim_strings_file(
+                    filename, batch_strings, sim_strings, distances
+                )
+                filenames.append(filename)
+        manifest.mark_complete(batch_idx, filenames)
+
+    def generate_output_files(
+        self,
+        strings: Sequence[str],
+        t_is: Sequence[int],
+        accessors: TransformerAccessors,
+        exp: BatchedBlockInternalsExperiment,
+        kinds: Sequence[str] = ("proj_output", "ffwd_output"),
+        batch_size: int = 100,
+        disable_progress_bars: bool = False,
+        n_similars: int = 10,
+        largest: bool = False,
+        distance_function: DistanceFunction = batch_distances,
+        write_json: bool = False,
+        batches_per_scan: Optional[int] = None,
+    ):
+        """Writes the results that `generate_proj_out_files` and
+        `generate_ffwd_out_files` would for each of `kinds` and `t_is`, but
+        with a single scan of `exp`'s stored outputs for all the batches of
+        strings, blocks and t_is together (see
+        `BatchedBlockInternalsExperiment.strings_with_topk_closest_outputs_multi`),
+        rather than one scan per batch, block and t_i. With `batches_per_scan`,
+        the batches of strings are searched for that many at a time instead,
+        which bounds how much work an interrupted run loses. Each batch is
+        recorded in the same run manifests as soon as its results are
+        written, so batches that are already complete are skipped either
+        way."""
+        manifest_names = {"proj_output": "proj_out", "ffwd_output": "ffwd_out"}
+        results_filename_fns = {
+            "proj_output": self._proj_out_results_filename,
+            "ffwd_output": self._ffwd_out_results_filename,
+        }
+        json_filename_fns = {
+            "proj_output": self._proj_out_sim_strings_filename,
+            "ffwd_output": self._ffwd_out_sim_strings_filename,
+        }
+        for kind in kinds:
+            assert kind in manifest_names, f"unknown kind {kind}"
+
+        n_batches = math.ceil(len(strings) / batch_size)
+        filename_t_is = sorted({exp._convert_t_i(t_i) for t_i in t_is})
+        rows = self._prepare_binary_results(
+            strings,
+            exp,
+            [
+                results_filename_fns[kind](block_idx, t_i)
+                for kind in kinds
+                for t_i in filename_t_is
+                for block_idx in range(n_layer)
+            ],
+            n_similars,
+        )
+        manifests: Dict[Tuple[str, int], RunManifest] = {}
+        pending_batches: Dict[Tuple[str, int], List[int]] = {}
+        for kind in kinds:
+            for t_i in filename_t_is:
+                manifests[(kind, t_i)] = self._run_manifest(
+                    f"{manifest_names[kind]}-{t_i:03d}",
+                    strings,
+                    exp,
+                    batch_size,
+                    n_similars,
+                    largest,
+                    distance_function,
+                    None,
+                    write_json,
+                )
+                pending_batches[(kind, t_i)] = self._pending_batches(
+                    manifests[(kind, t_i)],
+                    n_batches,
+                    batch_size,
+                    [
+                        results_filename_fns[kind](block_idx, t_i)
+                        for block_idx in range(n_layer)
+                    ],
+                    rows,
+                )
+        # Search for the pending batches' queries a scan at a time (all of
+        # them in one scan by default), recording each batch as complete as
+        # soon as its results are written, so an interrupted run only has to
+        # redo the batches that weren't written.
+        all_pending = sorted(set().union(*pending_batches.values()))
+        if len(all_pending) == 0:
+            return
+        if batches_per_scan is None:
+            batches_per_scan = len(all_pending)
+        neighbour_ids = {t_i: self._neighbour_ids(exp, t_i) for t_i in filename_t_is}
+        for scan_start in range(0, len(all_pending), batches_per_scan):
+            scan_batches = all_pending[scan_start : scan_start + batches_per_scan]
+            search_keys = [
+                (kind, t_i, batch_idx, block_idx)
+                for (kind, t_i), batch_indices in pending_batches.items()
+                for batch_idx in batch_indices
+                if batch_idx in scan_batches
+                for block_idx in range(n_layer)
+            ]
+
+            # Get the queries for every batch in this scan, from exp's stored
+            # activations where possible.
+            # Query is always the last token - for something else, use a shorter string
+            queries: Dict[Tuple[str, int, int], torch.Tensor] = {}
+            for batch_idx in tqdm(scan_batches, disable=disable_progress_bars):
+                start_idx = batch_idx * batch_size
+                batch_exp = StoredBlockInternals(
+                    self.encoding_helpers,
+                    accessors,
+                    strings[start_idx : start_idx + batch_size],
+                    exp,
+                )
+                outputs = {
+                    "proj_output": batch_exp.proj_output,
+                    "ffwd_output": batch_exp.ffwd_output,
+                }
+                for kind in kinds:
+                    for block_idx in range(n_layer):
+                        queries[(kind, batch_idx, block_idx)] = outputs[kind](
+                            block_idx
+                        )[:, -1, :]
+
+            results = exp.strings_with_topk_closest_outputs_multi(
+                [
+                    OutputSearch(
+                        kind, block_idx, t_i, queries[(kind, batch_idx, block_idx)]
+                    )
+                    for kind, t_i, batch_idx, block_idx in search_keys
+                ],
+                k=n_similars,
+                largest=largest,
+                distance_function=distance_function,
+            )
+
+            # The search keys run through the blocks last, so a batch's
+            # results for a kind and t_i are all written once its last
+            # block's are.
+            filenames: List[Path] = []
+            for (kind, t_i, batch_idx, block_idx), (sim_strings, distances) in zip(
+                search_keys, results
+            ):
+                start_idx = batch_idx * batch_size
+                self._write_batch_results(
+                    results_filename_fns[kind](block_idx, t_i),
+                    rows[start_idx : start_idx + batch_size],
+                    neighbour_ids[t_i],
+                    sim_strings,
+                    distances,
+                )
+                if write_json:
+                    filename = json_filename_fns[kind](batch_idx, block_idx, t_i)
+                    self._write_sim_strings_file(
+                        filename,
+                        strings[start_idx : start_idx + batch_size],
+                        sim_strings,
+                        distances,
+                    )
+                    filenames.append(filename)
+                if block_idx == n_layer - 1:
+                    manifests[(kind, t_i)].mark_complete(batch_idx, filenames)
+                    filenames = []
+
+    def write_binary_results(
+        self,
+        strings: Sequence[str],
+        exp: BatchedBlockInternalsExperiment,
+        t_is: Sequence[int],
+        batch_size: int = 100,
+    ):
+        """Collects the embeddings, proj_out and ffwd_out (at each of `t_is`)
+        results that the generate_*_files methods exported to per-batch JSON
+        files for `strings` into the binary files that they write directly,
+        e.g. for results that were generated before those were written. One
+        binary file is written per kind, block and t_i, which
+        `load_results_for_strings` then reads instead of the JSON files.
+
+        Each file holds a row per string, in sorted order, with the indices
+        into `exp.strings` of its similar strings (int32) and their distances
+        (float32). The files are memory-mapped when loaded, so loading the
+        results for some strings only reads their rows. At a t_i before the
+        last position the similar strings are prefixes, which are stored as
+        the index of the first string that starts with them."""
+        t_is = [exp._convert_t_i(t_i) for t_i in t_is]
+        n_batches = math.ceil(len(strings) / batch_size)
+
+        def _json_filenames(
+            get_batch_filename: Callable[..., Path], **kwargs
+        ) -> List[Path]:
+            return [
+                get_batch_filename(batch_idx=batch_idx, **kwargs)
+                for batch_idx in range(n_batches)
+            ]
+
+        # The results filenames, and the JSON files they're collected from.
+        json_filenames: Dict[Path, Tuple[List[Path], Dict[str, int]]] = {
+            self._embs_results_filename(): (
+                _json_filenames(self._embs_sim_strings_filename),
+                self._neighbour_ids(exp),
+            )
+        }
+        for t_i in t_is:
+            neighbour_ids = self._neighbour_ids(exp, t_i)
             for block_idx in range(n_layer):
-                sim_strings, distances = exp.strings_with_topk_closest_ffwd_outputs(
+                json_filenames[self._proj_out_results_filename(block_idx, t_i)] = (
+                    _json_filenames(
+                        self._proj_out_sim_strings_filename,
+                        block_idx=block_idx,
+                        t_i=t_i,
+                    ),
+                    neighbour_ids,
+                )
+                json_filenames[self._ffwd_out_results_filename(block_idx, t_i)] = (
+                    _json_filenames(
+                        self._ffwd_out_sim_strings_filename,
+                        block_idx=block_idx,
+                        t_i=t_i,
+                    ),
+                    neighbour_ids,
+                )
+
+        # The number of similar strings is the number in the JSON files
+        first_batch = self._load_json(self._embs_sim_strings_filename(0))
+        rows = self._prepare_binary_results(
+            strings, exp, list(json_filenames.keys()), len(first_batch["distances"])
+        )
+
+        for filename, (batch_filenames, neighbour_ids) in json_filenames.items():
+            for batch_idx, batch_filename in enumerate(batch_filenames):
+                batch = self._load_json(batch_filename)
+                start_idx = batch_idx * batch_size
+                self._write_batch_results(
+                    filename,
+                    rows[start_idx : start_idx + len(batch["strings"])],
+                    neighbour_ids,
+                    batch["sim_strings"],
+                    torch.tensor(batch["distances"], dtype=torch.float32),
+                )
+
+    def ann_recall(
+        self,
+        strings: Sequence[str],
+        kind: str,
+        accessors: TransformerAccessors,
+        exp: BatchedBlockInternalsExperiment,
+        ann_n_probe: int,
+        t_i: int = -1,
+        n_similars: int = 10,
+        largest: bool = False,
+        distance_function: DistanceFunction = batch_distances,
+    ) -> Dict[str, float]:
+        """Returns the recall@n_similars of the similar strings found with an
+        ANN index probing `ann_n_probe` lists, relative to the exact search, for
+        `strings` as queries (e.g. a sample of the strings passed to the
+        generate_*_files methods). `kind` is 'embeddings', 'proj_output' or
+        'ffwd_output'. Returns one recall for embeddings, or one per block."""
+        query_exp = StoredBlockInternals(self.encoding_helpers, accessors, strings, exp)
+
+        scans: Dict[
+            str, Callable[..., Tuple[Sequence[Sequence[str]], torch.Tensor]]
+        ] = {}
+        if kind == "embeddings":
+            scans["embeddings"] = partial(
+                exp.strings_with_topk_closest_embeddings, queries=query_exp.embeddings
+            )
+        elif kind == "proj_output":
+            for block_idx in range(n_layer):
+                scans[f"block {block_idx}"] = partial(
+                    exp.strings_with_topk_closest_proj_outputs,
                     block_idx=block_idx,
                     t_i=t_i,
-                    # Query is always the last token - for something else, use a shorter string
-                    queries=batch_exp.ffwd_output(block_idx)[:, -1, :],
-                    k=n_similars,
-                    largest=largest,
-                    distance_function=distance_function,
+                    queries=query_exp.proj_output(block_idx)[:, -1, :],
                 )
-
-                self._ffwd_out_sim_strings_filename(
-                    batch_idx, block_idx, filename_t_i
-                ).write_text(
-                    json.dumps(
-                        {
-                            "strings": {s: i for i, s in enumerate(batch_strings)},
-                            "sim_strings": sim_strings,
-                            "distances": distances.tolist(),
-                        },
-                        indent=2,
-                    )
+        elif kind == "ffwd_output":
+            for block_idx in range(n_layer):
+                scans[f"block {block_idx}"] = partial(
+                    exp.strings_with_topk_closest_ffwd_outputs,
+                    block_idx=block_idx,
+                    t_i=t_i,
+                    queries=query_exp.ffwd_output(block_idx)[:, -1, :],
                 )
+        else:
+            raise ValueError(f"unknown kind {kind}")
+
+        recalls = {}
+        for name, scan in scans.items():
+            search = partial(
+                scan, k=n_similars, largest=largest, distance_function=distance_function
+            )
+            exact_strings, _ = search()
+            ann_strings, _ = search(ann_n_probe=ann_n_probe)
+            recalls[name] = recall_at_k(exact_strings, ann_strings)
+        return recalls
 
     def _load_json(self, file: Path):
         return json.loads(file.read_text())
@@ -339,9 +1058,79 @@ class SimilarStringsExperiment:
 
         self.string_to_batch_map = self._load_json(self._string_to_batch_map_filename())
 
+    def _load_binary_results(
+        self, strings: Sequence[str], load_t_is: Sequence[int]
+    ) -> Dict[str, SimilarStringsResult]:
+        """Loads the results for `strings` from the files written by
+        `write_binary_results`."""
+        queries = np.load(self._results_queries_filename(), mmap_mode="r")
+        neighbour_strings = np.load(
+            self._results_neighbour_strings_filename(), mmap_mode="r"
+        )
+
+        sample_len = len(queries[0])
+        # Convert any negative t_is to positive.
+        load_t_is = [t_i if t_i >= 0 else sample_len + t_i for t_i in load_t_is]
+        assert all(
+            0 <= t_i < sample_len for t_i in load_t_is
+        ), f"all t_is must be in [0, {sample_len}), were {load_t_is}"
+
+        # Queries are sorted, so each string's row can be found by binary search.
+        rows = np.searchsorted(queries, np.array(strings))
+        for s, row in zip(strings, rows):
+            if row == len(queries) or queries[row] != s:
+                raise KeyError(s)
+
+        def _load_results(filename: Path, n_chars: int) -> List[SimilarStringsData]:
+            results = np.load(filename, mmap_mode="r")[rows]
+            if (results["neighbours"] < 0).any():
+                raise ValueError(f"{filename} is missing results for some of the strings")
+            # Similar strings at earlier positions are prefixes of the stored strings
+            sim_strings = neighbour_strings[results["neighbours"]].astype(
+                f"<U{n_chars}"
+            )
+            distances = torch.from_numpy(results["distances"].copy())
+            return [
+                SimilarStringsData(row_sim_strings, row_distances)
+                for row_sim_strings, row_distances in zip(
+                    sim_strings.tolist(), distances
+                )
+            ]
+
+        string_to_results: Dict[str, SimilarStringsResult] = {
+            s: SimilarStringsResult(s, emb_data)
+            for s, emb_data in zip(
+                strings, _load_results(self._embs_results_filename(), sample_len)
+            )
+        }
+        for block_idx in range(n_layer):
+            for t_i in load_t_is:
+                proj_out = _load_results(
+                    self._proj_out_results_filename(block_idx, t_i), t_i + 1
+                )
+                ffwd_out = _load_results(
+                    self._ffwd_out_results_filename(block_idx, t_i), t_i + 1
+                )
+                for s, proj_data, ffwd_data in zip(strings, proj_out, ffwd_out):
+                    string_to_results[s].proj_out[block_idx][t_i] = proj_data
+                    string_to_results[s].ffwd_out[block_idx][t_i] = ffwd_data
+
+        return string_to_results
+
     def load_results_for_strings(
-        self, strings: Sequence[str], load_t_is: Sequence[int] = [-1]
+        self,
+        strings: Sequence[str],
+        load_t_is: Sequence[int] = [-1],
+        prefetch_depth: int = 2,
     ):
+        """Returns a `SimilarStringsResult` for each of `strings`, with the
+        proj_out and ffwd_out results at each of `load_t_is`. These are read
+        from the binary files that the generate_*_files methods write (or that
+        `write_binary_results` collects from their JSON exports), and from the
+        per-batch JSON files if there aren't any."""
+        if self._results_queries_filename().exists():
+            return self._load_binary_results(strings, load_t_is)
+
         self.load_string_to_batch_map()
         assert self.string_to_batch_map is not None
 
@@ -358,54 +1147,80 @@ class SimilarStringsExperiment:
             batch_idx = self.string_to_batch_map[s]
             batch_to_strings[batch_idx].append(s)
 
-        string_to_results: Dict[str, SimilarStringsResult] = {}
-        for batch_idx, strings in batch_to_strings.items():
-            emb_batch = self._load_json(self._embs_sim_strings_filename(batch_idx))
-            emb_distances = torch.tensor(emb_batch["distances"], dtype=torch.float32)
-
-            for s in strings:
-                s_idx = emb_batch["strings"][s]
-                sim_strings = emb_batch["sim_strings"][s_idx]
-                distances = emb_distances[:, s_idx]
+        # Load all the results files for a batch in one go, so that the files
+        # for the next batches can be read and parsed in the background while
+        # the current one is processed.
+        batch_idxs = list(batch_to_strings.keys())
+
+        def _load_batch_files(i: int) -> Dict[Path, Any]:
+            batch_idx = batch_idxs[i]
+            filenames = [self._embs_sim_strings_filename(batch_idx)] + [
+                get_filename(batch_idx=batch_idx, block_idx=block_idx, t_i=t_i)
+                for get_filename in [
+                    self._proj_out_sim_strings_filename,
+                    self._ffwd_out_sim_strings_filename,
+                ]
+                for block_idx in range(n_layer)
+                for t_i in load_t_is
+            ]
+            return {filename: self._load_json(filename) for filename in filenames}
 
-                emb_data = SimilarStringsData(sim_strings, distances)
-                string_to_results[s] = SimilarStringsResult(s, emb_data)
+        string_to_results: Dict[str, SimilarStringsResult] = {}
+        with PrefetchingBatchLoader(
+            _load_batch_files, len(batch_idxs), depth=prefetch_depth
+        ) as loader:
+            for i, batch_idx in enumerate(batch_idxs):
+                strings = batch_to_strings[batch_idx]
+                batch_files = loader(i)
+
+                emb_batch = batch_files[self._embs_sim_strings_filename(batch_idx)]
+                emb_distances = torch.tensor(
+                    emb_batch["distances"], dtype=torch.float32
+                )
 
-            for block_idx in range(n_layer):
-                for t_i in load_t_is:
-                    proj_batch = self._load_json(
-                        self._proj_out_sim_strings_filename(
-                            batch_idx=batch_idx, block_idx=block_idx, t_i=t_i
+                for s in strings:
+                    s_idx = emb_batch["strings"][s]
+                    sim_strings = emb_batch["sim_strings"][s_idx]
+                    distances = emb_distances[:, s_idx]
+
+                    emb_data = SimilarStringsData(sim_strings, distances)
+                    string_to_results[s] = SimilarStringsResult(s, emb_data)
+
+                for block_idx in range(n_layer):
+                    for t_i in load_t_is:
+                        proj_batch = batch_files[
+                            self._proj_out_sim_strings_filename(
+                                batch_idx=batch_idx, block_idx=block_idx, t_i=t_i
+                            )
+                        ]
+                        proj_distances = torch.tensor(
+                            proj_batch["distances"], dtype=torch.float32
                         )
-                    )
-                    proj_distances = torch.tensor(
-                        proj_batch["distances"], dtype=torch.float32
-                    )
 
-                    for s in strings:
-                        s_idx = proj_batch["strings"][s]
-                        sim_strings = proj_batch["sim_strings"][s_idx]
-                        distances = proj_distances[:, s_idx]
-                        string_to_results[s].proj_out[block_idx][t_i] = (
-                            SimilarStringsData(sim_strings, distances)
+                        for s in strings:
+                            s_idx = proj_batch["strings"][s]
+                            sim_strings = proj_batch["sim_strings"][s_idx]
+                            distances = proj_distances[:, s_idx]
+                            string_to_results[s].proj_out[block_idx][t_i] = (
+                                SimilarStringsData(sim_strings, distances)
+                            )
+
+                        ffwd_batch = batch_files[
+                            self._ffwd_out_sim_strings_filename(
+                                batch_idx=batch_idx, block_idx=block_idx, t_i=t_i
+                            )
+                        ]
+                        ffwd_distances = torch.tensor(
+                            ffwd_batch["distances"], dtype=torch.float32
                         )
 
-                    ffwd_batch = self._load_json(
-                        self._ffwd_out_sim_strings_filename(
-                            batch_idx=batch_idx, block_idx=block_idx, t_i=t_i
-                        )
-                    )
-                    ffwd_distances = torch.tensor(
-                        ffwd_batch["distances"], dtype=torch.float32
-                    )
-
-                    for s in strings:
-                        s_idx = ffwd_batch["strings"][s]
-                        sim_strings = ffwd_batch["sim_strings"][s_idx]
-                        distances = ffwd_distances[:, s_idx]
-                        string_to_results[s].ffwd_out[block_idx][t_i] = (
-                            SimilarStringsData(sim_strings, distances)
-                        )
+                        for s in strings:
+                            s_idx = ffwd_batch["strings"][s]
+                            sim_strings = ffwd_batch["sim_strings"][s_idx]
+                            distances = ffwd_distances[:, s_idx]
+                            string_to_results[s].ffwd_out[block_idx][t_i] = (
+                                SimilarStringsData(sim_strings, distances)
+                            )
 
         return string_to_results
 
@@ -533,6 +1348,47 @@ def generate_string_to_batch_map(ctx: click.Context):
     type=click.Choice(["cosine", "euclidean"], case_sensitive=False),
     default="euclidean",
 )
+@click.option(
+    "-w",
+    "--n_workers",
+    required=False,
+    type=click.IntRange(min=1),
+    default=1,
+)
+@click.option(
+    "--threads_per_worker",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+)
+@click.option(
+    "--ann_n_probe",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="Search an approximate nearest neighbour index, probing this many lists, instead of scanning all the data.",
+)
+@click.option(
+    "--ann_n_lists",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of lists in the ANN indices (defaults to 4 * sqrt(number of strings)).",
+)
+@click.option(
+    "--ann_recall_queries",
+    required=False,
+    type=click.IntRange(min=0),
+    default=100,
+    help="Number of query strings to report the ANN search's recall on (0 to skip).",
+)
+@click.option(
+    "--json",
+    "write_json",
+    is_flag=True,
+    default=False,
+    help="Also export the similars to per-batch JSON files.",
+)
 @click.pass_context
 def generate_similars(
     ctx: click.Context,
@@ -541,6 +1397,12 @@ def generate_similars(
     block_internals_experiment_max_batch_size: int,
     n_similars: int,
     distance_function: str,
+    n_workers: int,
+    threads_per_worker: Optional[int],
+    ann_n_probe: Optional[int],
+    ann_n_lists: Optional[int],
+    ann_recall_queries: int,
+    write_json: bool,
 ):
     click.echo("Generation parameters:")
 
@@ -561,7 +1423,22 @@ def generate_similars(
     click.echo(f"  distance function: {distance_function}")
     click.echo()
 
+    click.echo(f"  n workers: {n_workers}")
+    click.echo(f"  threads per worker: {threads_per_worker}")
+    click.echo()
+
+    ctx.obj["executor"] = ShardedExecutor(n_workers, threads_per_worker)
+
+    click.echo(f"  ANN n probe: {ann_n_probe}")
+    click.echo(f"  ANN n lists: {ann_n_lists}")
+    click.echo(f"  ANN recall queries: {ann_recall_queries}")
+    click.echo()
+
+    ctx.obj["ann_n_probe"] = ann_n_probe
+    ctx.obj["ann_recall_queries"] = ann_recall_queries
+
     ctx.obj["n_similars"] = n_similars
+    ctx.obj["write_json"] = write_json
 
     assert distance_function in ["cosine", "euclidean"]
     if distance_function == "cosine":
@@ -578,20 +1455,54 @@ def generate_similars(
         saved_model_filename=model_weights_filename,
         dataset=ctx.obj["ts"],
         device=device,
+        share_memory=n_workers > 1,
     )
     encoding_helpers = EncodingHelpers(tokenizer, device)
     accessors = TransformerAccessors(m, device)
     ctx.obj["accessors"] = accessors
 
+    # Read the activations with the settings they were written with.
+    output_dir = Path(block_internals_experiment_output_folder)
+    settings = {
+        "batch_size": block_internals_experiment_max_batch_size,
+        **BatchedBlockInternalsExperiment.stored_settings(output_dir),
+    }
+    click.echo(f"block internals experiment settings: {settings}")
     ctx.obj["exp"] = BatchedBlockInternalsExperiment(
         encoding_helpers,
         accessors,
         ctx.obj["all_strings"],
-        output_dir=Path(block_internals_experiment_output_folder),
-        batch_size=block_internals_experiment_max_batch_size,
+        output_dir=output_dir,
+        ann_n_lists=ann_n_lists,
+        **settings,
     )
 
 
+def _echo_ann_recall(ctx: click.Context, kind: str, t_i: int = -1):
+    """Reports the recall of the ANN search against the exact search, if
+    the ANN search was used."""
+    ann_n_probe = ctx.obj["ann_n_probe"]
+    n_queries = ctx.obj["ann_recall_queries"]
+    if ann_n_probe is None or n_queries == 0:
+        return
+
+    ss_exp: SimilarStringsExperiment = ctx.obj["ss_exp"]
+    recalls = ss_exp.ann_recall(
+        ctx.obj["strings"][:n_queries],
+        kind,
+        ctx.obj["accessors"],
+        ctx.obj["exp"],
+        ann_n_probe,
+        t_i=t_i,
+        n_similars=ctx.obj["n_similars"],
+        largest=ctx.obj["largest"],
+        distance_function=ctx.obj["distance_function"],
+    )
+    click.echo(f"ANN recall@{ctx.obj['n_similars']} on {n_queries} queries:")
+    for name, recall in recalls.items():
+        click.echo(f"  {name}: {recall:.3f}")
+
+
 @generate_similars.command()
 @click.pass_context
 def embeddings(ctx: click.Context):
@@ -608,9 +1519,13 @@ def embeddings(ctx: click.Context):
         n_similars=ctx.obj["n_similars"],
         largest=ctx.obj["largest"],
         distance_function=ctx.obj["distance_function"],
+        executor=ctx.obj["executor"],
+        ann_n_probe=ctx.obj["ann_n_probe"],
+        write_json=ctx.obj["write_json"],
     )
 
     click.echo("Generated embeddings similar strings files.")
+    _echo_ann_recall(ctx, "embeddings")
 
 
 @generate_similars.command()
@@ -643,9 +1558,13 @@ def proj_out(ctx: click.Context, t_index: int):
         n_similars=ctx.obj["n_similars"],
         largest=ctx.obj["largest"],
         distance_function=ctx.obj["distance_function"],
+        executor=ctx.obj["executor"],
+        ann_n_probe=ctx.obj["ann_n_probe"],
+        write_json=ctx.obj["write_json"],
     )
 
     click.echo("Generated proj_out similar strings files.")
+    _echo_ann_recall(ctx, "proj_output", t_index)
 
 
 @generate_similars.command()
@@ -678,6 +1597,109 @@ def ffwd_out(ctx: click.Context, t_index: int):
         n_similars=ctx.obj["n_similars"],
         largest=ctx.obj["largest"],
         distance_function=ctx.obj["distance_function"],
+        executor=ctx.obj["executor"],
+        ann_n_probe=ctx.obj["ann_n_probe"],
+        write_json=ctx.obj["write_json"],
     )
 
     click.echo("Generated ffwd_out similar strings files.")
+    _echo_ann_recall(ctx, "ffwd_output", t_index)
+
+
+@generate_similars.command()
+@click.option(
+    "-t",
+    "--t_index",
+    "t_indices",
+    required=True,
+    multiple=True,
+    type=click.IntRange(min=0),
+)
+@click.option(
+    "-k",
+    "--kind",
+    "kinds",
+    required=False,
+    multiple=True,
+    type=click.Choice(["proj_output", "ffwd_output"]),
+    default=["proj_output", "ffwd_output"],
+)
+@click.option(
+    "--batches_per_scan",
+    required=False,
+    type=click.IntRange(min=1),
+    help="Search for this many batches of strings per scan, rather than all of them in one.",
+)
+@click.pass_context
+def outputs(
+    ctx: click.Context,
+    t_indices: Sequence[int],
+    kinds: Sequence[str],
+    batches_per_scan: Optional[int],
+):
+    """Generates the proj_out and/or ffwd_out similars for several t_indices
+    with a single scan of the block internals experiment's outputs (or one
+    scan per `batches_per_scan` batches of strings)."""
+    click.echo("Generating output similars...")
+    click.echo(f"  t_indices: {list(t_indices)}")
+    click.echo(f"  kinds: {list(kinds)}")
+    if batches_per_scan is not None:
+        click.echo(f"  batches_per_scan: {batches_per_scan}")
+
+    for t_index in t_indices:
+        if t_index >= ctx.obj["exp"].sample_length():
+            raise click.BadParameter(
+                f"t_index must be less than sample length ({ctx.obj['exp'].sample_length()})",
+                param_hint="t_index",
+            )
+    if ctx.obj["ann_n_probe"] is not None:
+        raise click.UsageError(
+            "outputs always scans all the data; use proj_out / ffwd_out with --ann_n_probe"
+        )
+
+    ss_exp: SimilarStringsExperiment = ctx.obj["ss_exp"]
+    accessors: TransformerAccessors = ctx.obj["accessors"]
+
+    ss_exp.generate_output_files(
+        ctx.obj["strings"],
+        t_indices,
+        accessors,
+        ctx.obj["exp"],
+        kinds=kinds,
+        batch_size=ctx.obj["batch_size"],
+        n_similars=ctx.obj["n_similars"],
+        largest=ctx.obj["largest"],
+        distance_function=ctx.obj["distance_function"],
+        write_json=ctx.obj["write_json"],
+        batches_per_scan=batches_per_scan,
+    )
+
+    click.echo("Generated output similar strings files.")
+
+
+@generate_similars.command()
+@click.option(
+    "-t",
+    "--t_index",
+    "t_indices",
+    required=True,
+    multiple=True,
+    type=click.IntRange(min=0),
+)
+@click.pass_context
+def binary_results(ctx: click.Context, t_indices: Sequence[int]):
+    """Collects the similars exported to JSON files (with --json) for the
+    given t_indices into the binary files that the other commands write,
+    e.g. for similars that were generated before they wrote them."""
+    click.echo("Writing binary results...")
+    click.echo(f"  t_indices: {list(t_indices)}")
+
+    ss_exp: SimilarStringsExperiment = ctx.obj["ss_exp"]
+    ss_exp.write_binary_results(
+        ctx.obj["strings"],
+        ctx.obj["exp"],
+        t_indices,
+        batch_size=ctx.obj["batch_size"],
+    )
+
+    click.echo(f"Wrote binary results to {ss_exp.output_dir}")
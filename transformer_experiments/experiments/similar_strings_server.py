@@ -0,0 +1,567 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/experiments/similar-strings-server.ipynb.
+
+# %% auto 0
+__all__ = ['SimilarStringsQuery', 'SimilarStringsAnswer', 'SimilarStringsService', 'create_server', 'query_server', 'serve']
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 5
+from collections import defaultdict, OrderedDict
+from dataclasses import asdict, dataclass, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 6
+import click
+import requests
+import torch
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 7
+from ..common.substring_generator import all_unique_substrings
+from ..datasets.tinyshakespeare import TinyShakespeareDataSet
+from ..environments import get_environment
+from transformer_experiments.experiments.block_internals import (
+    BatchedBlockInternalsExperiment,
+    batch_cosine_sim,
+    batch_distances,
+    OutputSearch,
+    StoredBlockInternals,
+)
+from ..models.transformer import block_size, n_layer
+from transformer_experiments.models.transformer_helpers import (
+    EncodingHelpers,
+    TransformerAccessors,
+)
+from transformer_experiments.trained_models.tinyshakespeare_transformer import (
+    create_model_and_tokenizer,
+)
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 12
+@dataclass(frozen=True)
+class SimilarStringsQuery:
+    """A query for the `k` strings most similar to `s`: by their embeddings
+    (`kind='embeddings'`), or by the `kind` ('proj_output' or 'ffwd_output')
+    outputs of block `block_idx` at position `t_i`, compared with `s`'s
+    output at its last position. `distance` is 'euclidean' or 'cosine'. If
+    `ann_n_probe` is set, an approximate nearest neighbour index probing that
+    many lists is searched, rather than all the data."""
+
+    s: str
+    kind: str
+    block_idx: Optional[int] = None
+    t_i: int = -1
+    k: int = 10
+    distance: str = "euclidean"
+    ann_n_probe: Optional[int] = None
+
+
+@dataclass
+class SimilarStringsAnswer:
+    sim_strings: List[str]
+    distances: List[float]
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 13
+class SimilarStringsService:
+    """Answers `SimilarStringsQuery`s against the strings of a
+    `BatchedBlockInternalsExperiment`, with the model, string table and
+    stored activations (and any ANN indices) loaded once.
+
+    Queries are handed to a background thread, which waits up to
+    `batch_wait` seconds for more to arrive and then answers up to
+    `max_batch_size` of them together. The answers to the last `cache_size`
+    distinct queries are cached.
+
+    To avoid slow first queries, call the experiment's `preload` and the
+    service's `build_ann_indices` before serving."""
+
+    def __init__(
+        self,
+        exp: BatchedBlockInternalsExperiment,
+        eh: EncodingHelpers,
+        accessors: TransformerAccessors,
+        cache_size: int = 1024,
+        max_batch_size: int = 64,
+        batch_wait: float = 0.005,
+    ):
+        self.exp = exp
+        self.eh = eh
+        self.accessors = accessors
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+
+        self.cache: OrderedDict[SimilarStringsQuery, SimilarStringsAnswer] = (
+            OrderedDict()
+        )
+        self.cache_lock = threading.Lock()
+        self.n_cache_hits = 0
+        self.n_batches = 0
+
+        self.pending: queue.Queue = queue.Queue()
+        self.thread = threading.Thread(target=self._answer_batches, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Stops the background thread."""
+        self.pending.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def check_query(self, query: SimilarStringsQuery):
+        """Raises a ValueError if `query` can't be answered."""
+        if query.kind not in ("embeddings", "proj_output", "ffwd_output"):
+            raise ValueError(f"unknown kind {query.kind}")
+        if len(query.s) != self.exp.sample_length():
+            raise ValueError(
+                f"s must be {self.exp.sample_length()} characters long, was {len(query.s)}"
+            )
+        unknown_chars = sorted(set(query.s) - self.eh.tokenizer.stoi.keys())
+        if unknown_chars:
+            raise ValueError(
+                f"s has characters that aren't in the vocabulary: {unknown_chars}"
+            )
+        if query.kind != "embeddings":
+            if query.block_idx is None or not 0 <= query.block_idx < n_layer:
+                raise ValueError(
+                    f"block_idx must be in [0, {n_layer}), was {query.block_idx}"
+                )
+            if not -self.exp.sample_length() <= query.t_i < self.exp.sample_length():
+                raise ValueError(
+                    f"t_i out of range for sample length {self.exp.sample_length()}"
+                )
+        if query.distance not in ("euclidean", "cosine"):
+            raise ValueError(f"unknown distance {query.distance}")
+        if query.k < 1:
+            raise ValueError(f"k must be >= 1, was {query.k}")
+
+    def _normalize(self, query: SimilarStringsQuery) -> SimilarStringsQuery:
+        """Returns `query` in a canonical form, so that queries with the same
+        answer (e.g. with `t_i=-1` and `t_i=sample_length - 1`) share a cache
+        entry and are searched together."""
+        if query.kind == "embeddings":
+            return replace(query, block_idx=None, t_i=-1)
+        return replace(query, t_i=query.t_i % self.exp.sample_length())
+
+    def build_ann_indices(self, distances: Sequence[str], t_i: int = -1):
+        """Builds (or loads) the ANN indices that queries with `ann_n_probe`
+        and any of `distances` search: over the embeddings, and over every
+        block's proj and ffwd outputs at position `t_i`. Indices for other
+        positions are built when they're first queried."""
+        for distance in distances:
+            distance_function = (
+                batch_cosine_sim if distance == "cosine" else batch_distances
+            )
+            self.exp.ann_index("embeddings", distance_function)
+            for kind in ["proj_output", "ffwd_output"]:
+                for block_idx in range(n_layer):
+                    self.exp.ann_index(kind, distance_function, block_idx, t_i)
+
+    def query(
+        self, queries: Sequence[SimilarStringsQuery]
+    ) -> List[SimilarStringsAnswer]:
+        """Returns the answers to `queries`, from the cache if they're in it."""
+        for q in queries:
+            self.check_query(q)
+        queries = [self._normalize(q) for q in queries]
+
+        answers: Dict[SimilarStringsQuery, SimilarStringsAnswer] = {}
+        with self.cache_lock:
+            for q in queries:
+                if q in self.cache:
+                    self.cache.move_to_end(q)
+                    answers[q] = self.cache[q]
+                    self.n_cache_hits += 1
+
+        # Queue the rest for the background thread, and wait for it.
+        waiting = []
+        for q in dict.fromkeys(queries):
+            if q not in answers:
+                done = threading.Event()
+                result: Dict[str, Any] = {}
+                self.pending.put((q, done, result))
+                waiting.append((q, done, result))
+        for q, done, result in waiting:
+            done.wait()
+            if "error" in result:
+                raise result["error"]
+            answers[q] = result["answer"]
+
+        return [answers[q] for q in queries]
+
+    def _answer_batches(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self.pending.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.pending.put(None)  # stop once this batch is done
+                    break
+                batch.append(item)
+
+            try:
+                answers = self._answer([q for q, _, _ in batch])
+                with self.cache_lock:
+                    for q, answer in answers.items():
+                        self.cache[q] = answer
+                        self.cache.move_to_end(q)
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+                for q, done, result in batch:
+                    result["answer"] = answers[q]
+                    done.set()
+            except Exception as e:
+                for _, done, result in batch:
+                    result["error"] = e
+                    done.set()
+
+    def _answer(
+        self, queries: Sequence[SimilarStringsQuery]
+    ) -> Dict[SimilarStringsQuery, SimilarStringsAnswer]:
+        """Answers a batch of queries, with one search per group of queries
+        that share k, distance and ann_n_probe."""
+        self.n_batches += 1
+        answers: Dict[SimilarStringsQuery, SimilarStringsAnswer] = {}
+
+        groups: Dict[Tuple[int, str, Optional[int]], List[SimilarStringsQuery]] = (
+            defaultdict(list)
+        )
+        for q in dict.fromkeys(queries):
+            groups[(q.k, q.distance, q.ann_n_probe)].append(q)
+
+        for (k, distance, ann_n_probe), group in groups.items():
+            distance_function = (
+                batch_cosine_sim if distance == "cosine" else batch_distances
+            )
+            largest = distance == "cosine"
+            strings = list(dict.fromkeys(q.s for q in group))
+            query_exp = StoredBlockInternals(self.eh, self.accessors, strings, self.exp)
+
+            def _save_answers(group_queries, results):
+                sim_strings, values = results
+                for i, q in enumerate(group_queries):
+                    answers[q] = SimilarStringsAnswer(
+                        list(sim_strings[i]), values[:, i].tolist()
+                    )
+
+            embs_queries = [q for q in group if q.kind == "embeddings"]
+            if embs_queries:
+                rows = [query_exp.string_idx(q.s) for q in embs_queries]
+                _save_answers(
+                    embs_queries,
+                    self.exp.strings_with_topk_closest_embeddings(
+                        queries=query_exp.embeddings[rows],
+                        k=k,
+                        largest=largest,
+                        distance_function=distance_function,
+                        ann_n_probe=ann_n_probe,
+                    ),
+                )
+
+            # Queries for the same outputs are searched together.
+            output_groups: Dict[Tuple[str, int, int], List[SimilarStringsQuery]] = (
+                defaultdict(list)
+            )
+            for q in group:
+                if q.kind != "embeddings":
+                    assert q.block_idx is not None
+                    output_groups[(q.kind, q.block_idx, q.t_i)].append(q)
+            searches = [
+                OutputSearch(
+                    kind,
+                    block_idx,
+                    t_i,
+                    getattr(query_exp, kind)(block_idx)[
+                        [query_exp.string_idx(q.s) for q in group_queries], -1, :
+                    ],
+                )
+                for (kind, block_idx, t_i), group_queries in output_groups.items()
+            ]
+            if ann_n_probe is None:
+                # Scan the stored outputs once for all the searches.
+                results = self.exp.strings_with_topk_closest_outputs_multi(
+                    searches, k=k, largest=largest, distance_function=distance_function
+                )
+            else:
+                results = [
+                    getattr(self.exp, f"strings_with_topk_closest_{search.kind}s")(
+                        t_i=search.t_i,
+                        block_idx=search.block_idx,
+                        queries=search.queries,
+                        k=k,
+                        largest=largest,
+                        distance_function=distance_function,
+                        ann_n_probe=ann_n_probe,
+                    )
+                    for search in searches
+                ]
+            for group_queries, result in zip(output_groups.values(), results):
+                _save_answers(group_queries, result)
+
+        return answers
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 15
+def _query_from_params(params: Dict[str, Any]) -> SimilarStringsQuery:
+    try:
+        return SimilarStringsQuery(
+            s=str(params["s"]),
+            kind=str(params["kind"]),
+            block_idx=(
+                None if params.get("block_idx") is None else int(params["block_idx"])
+            ),
+            t_i=int(params.get("t_i", -1)),
+            k=int(params.get("k", 10)),
+            distance=str(params.get("distance", "euclidean")),
+            ann_n_probe=(
+                None
+                if params.get("ann_n_probe") is None
+                else int(params["ann_n_probe"])
+            ),
+        )
+    except KeyError as e:
+        raise ValueError(f"missing parameter {e}")
+    except TypeError as e:
+        raise ValueError(str(e))
+
+
+class _SimilarStringsRequestHandler(BaseHTTPRequestHandler):
+    service: SimilarStringsService
+
+    def _reply(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer(self, get_queries: Callable[[], List[SimilarStringsQuery]]):
+        """Replies with the answers to the queries that `get_queries` parses
+        from the request: with a 400 if the request is malformed or the
+        queries can't be answered, and with a 500 if answering them fails."""
+        try:
+            queries = get_queries()
+            for q in queries:
+                self.service.check_query(q)
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        try:
+            answers = self.service.query(queries)
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._reply(200, {"results": [asdict(a) for a in answers]})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._reply(200, {"status": "ok"})
+            return
+        if url.path != "/similar":
+            self._reply(404, {"error": f"unknown path {url.path}"})
+            return
+        params: Dict[str, Any] = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if "block" in params:
+            params["block_idx"] = params.pop("block")
+        self._answer(lambda: [_query_from_params(params)])
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/similar":
+            self._reply(404, {"error": f"unknown path {self.path}"})
+            return
+
+        def get_queries() -> List[SimilarStringsQuery]:
+            body = json.loads(
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            )
+            return [_query_from_params(q) for q in body["queries"]]
+
+        self._answer(get_queries)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(
+    service: SimilarStringsService, host: str = "127.0.0.1", port: int = 8000
+) -> ThreadingHTTPServer:
+    """Creates (but doesn't start) an HTTP server that answers queries with
+    `service`. Pass `port=0` to pick a free port (see `server.server_port`)."""
+    handler = type("_Handler", (_SimilarStringsRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 16
+def query_server(
+    url: str, queries: Sequence[SimilarStringsQuery], timeout: float = 60
+) -> List[SimilarStringsAnswer]:
+    """Asks the server at `url` (e.g. 'http://127.0.0.1:8000') to answer `queries`."""
+    response = requests.post(
+        f"{url}/similar",
+        json={"queries": [asdict(q) for q in queries]},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return [SimilarStringsAnswer(**r) for r in response.json()["results"]]
+
+# %% ../../nbs/experiments/similar-strings-server.ipynb 17
+@click.command()
+@click.argument("model_weights_filename", type=click.Path(exists=True))
+@click.argument("dataset_cache_filename", type=click.Path(exists=True))
+@click.argument(
+    "block_internals_experiment_output_folder", type=click.Path(exists=True)
+)
+@click.option(
+    "-s",
+    "--sample_len",
+    required=True,
+    type=click.IntRange(min=1, max=block_size),
+)
+@click.option(
+    "-m",
+    "--block_internals_experiment_max_batch_size",
+    required=False,
+    type=click.IntRange(min=1),
+    default=10000,
+)
+@click.option("--host", required=False, type=click.STRING, default="127.0.0.1")
+@click.option("--port", required=False, type=click.IntRange(min=0), default=8000)
+@click.option(
+    "--cache_size",
+    required=False,
+    type=click.IntRange(min=0),
+    default=1024,
+    help="Number of answers to keep in the response cache.",
+)
+@click.option(
+    "--max_query_batch_size",
+    required=False,
+    type=click.IntRange(min=1),
+    default=64,
+    help="Maximum number of queries to answer together.",
+)
+@click.option(
+    "--batch_wait_ms",
+    required=False,
+    type=click.FloatRange(min=0),
+    default=5,
+    help="How long to wait for more queries before answering a batch.",
+)
+@click.option(
+    "--ann_n_lists",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of lists in the ANN indices (defaults to 4 * sqrt(number of strings)).",
+)
+@click.option(
+    "--preload",
+    is_flag=True,
+    default=False,
+    help="Read the stored embeddings and proj/ffwd outputs into memory at startup.",
+)
+@click.option(
+    "--ann_distance",
+    "ann_distances",
+    required=False,
+    multiple=True,
+    type=click.Choice(["cosine", "euclidean"]),
+    help="Build (or load) the ANN indices for this distance at startup (repeatable).",
+)
+def serve(
+    model_weights_filename: str,
+    dataset_cache_filename: str,
+    block_internals_experiment_output_folder: str,
+    sample_len: int,
+    block_internals_experiment_max_batch_size: int,
+    host: str,
+    port: int,
+    cache_size: int,
+    max_query_batch_size: int,
+    batch_wait_ms: float,
+    ann_n_lists: Optional[int],
+    preload: bool,
+    ann_distances: Sequence[str],
+):
+    """Serves similar-strings queries over HTTP, for the strings of the
+    given block internals experiment output folder."""
+    click.echo("Similar strings server")
+    click.echo()
+    click.echo(f"  model weights: {model_weights_filename}")
+    click.echo(f"  dataset cache: {dataset_cache_filename}")
+    click.echo(
+        f"  block internals experiment output folder: {block_internals_experiment_output_folder}"
+    )
+    click.echo(f"  sample length: {sample_len}")
+    click.echo()
+
+    ts = TinyShakespeareDataSet(cache_file=dataset_cache_filename)
+    all_strings = all_unique_substrings(ts.text, sample_len)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    click.echo(f"device is {device}")
+
+    m, tokenizer = create_model_and_tokenizer(
+        saved_model_filename=model_weights_filename,
+        dataset=ts,
+        device=device,
+    )
+    encoding_helpers = EncodingHelpers(tokenizer, device)
+    accessors = TransformerAccessors(m, device)
+
+    # Read the activations with the settings they were written with.
+    output_dir = Path(block_internals_experiment_output_folder)
+    settings = {
+        "batch_size": block_internals_experiment_max_batch_size,
+        **BatchedBlockInternalsExperiment.stored_settings(output_dir),
+    }
+    click.echo(f"block internals experiment settings: {settings}")
+    exp = BatchedBlockInternalsExperiment(
+        encoding_helpers,
+        accessors,
+        all_strings,
+        output_dir=output_dir,
+        ann_n_lists=ann_n_lists,
+        **settings,
+    )
+    exp.stored_batches()
+    if preload:
+        click.echo("Preloading activations")
+        exp.preload(pin_memory=device == "cuda")
+
+    with SimilarStringsService(
+        exp,
+        encoding_helpers,
+        accessors,
+        cache_size=cache_size,
+        max_batch_size=max_query_batch_size,
+        batch_wait=batch_wait_ms / 1000,
+    ) as service:
+        if ann_distances:
+            click.echo(f"Building ANN indices for {', '.join(ann_distances)}")
+            service.build_ann_indices(ann_distances)
+        server = create_server(service, host, port)
+        click.echo(f"Serving on http://{host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
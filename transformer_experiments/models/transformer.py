@@ -30,13 +30,19 @@ class Head(nn.Module):
 
         self.dropout = nn.Dropout(dropout)
 
-    def forward(self, x):
+    def forward(self, x, positions=None):
+        # If `positions` (indices into T) is given, only those positions'
+        # outputs are computed, though they still attend to every position
+        # before them.
         B, T, C = x.shape
         k = self.key(x)
-        q = self.query(x)
+        q = self.query(x if positions is None else x[:, positions])
+        tril = (
+            self.tril[:T, :T] if positions is None else self.tril[:T, :T][positions]
+        )
 
         wei = q @ k.transpose(-2, -1) * self.head_size**-0.5
-        wei = wei.masked_fill(self.tril[:T, :T] == 0, float("-inf"))
+        wei = wei.masked_fill(tril == 0, float("-inf"))
         wei = F.softmax(wei, dim=-1)
         wei = self.dropout(wei)
 
@@ -54,8 +60,8 @@ class MultiHeadAttention(nn.Module):
         self.proj = nn.Linear(n_embed, n_embed)
         self.dropout = nn.Dropout(dropout)
 
-    def forward(self, x):
-        out = torch.cat([h(x) for h in self.heads], dim=-1)
+    def forward(self, x, positions=None):
+        out = torch.cat([h(x, positions=positions) for h in self.heads], dim=-1)
         out = self.dropout(self.proj(out))
         return out
 
@@ -87,8 +93,13 @@ class Block(nn.Module):
         self.ln1 = nn.LayerNorm(n_embed)
         self.ln2 = nn.LayerNorm(n_embed)
 
-    def forward(self, x):
-        x = x + self.sa(self.ln1(x))  # The `x +` part is a skip connection
+    def forward(self, x, positions=None):
+        # If `positions` (indices into T) is given, only the outputs at those
+        # positions are computed (see `Head.forward`).
+        if positions is None:
+            x = x + self.sa(self.ln1(x))  # The `x +` part is a skip connection
+        else:
+            x = x[:, positions] + self.sa(self.ln1(x), positions=positions)
         x = x + self.ffwd(self.ln2(x))  # The `x +` part is a skip connection
 
         return x
@@ -119,7 +130,11 @@ class TransformerLanguageModel(nn.Module):
         elif isinstance(module, nn.Embedding):
             torch.nn.init.normal_(module.weight, mean=0.0, std=0.02)
 
-    def forward(self, idx, targets=None):
+    def forward(self, idx, targets=None, positions=None):
+        # If `positions` (indices into T) is given, logits are only computed
+        # for those positions: the earlier blocks still run on every position
+        # (the last block's keys and values need them), but the last block's
+        # queries, attention and ffwd, and the LM head, only run on these.
         B, T = idx.shape
 
         token_emb = self.token_embedding_table(idx)
@@ -127,7 +142,13 @@ class TransformerLanguageModel(nn.Module):
             torch.arange(T, device=self.device)
         )  # (T, n_embed)
         x = token_emb + pos_emb
-        x = self.blocks(x)
+        if positions is None:
+            x = self.blocks(x)
+        else:
+            x = self.blocks[:-1](x)
+            x = self.blocks[-1](x, positions=positions)
+            if targets is not None:
+                targets = targets[:, positions]
         x = self.ln_f(x)
         logits = self.lm_head(x)
 
@@ -146,8 +167,8 @@ class TransformerLanguageModel(nn.Module):
         for _ in range(max_new_tokens):
             # crop idx to last block_size tokens
             idx_cond = idx[:, -block_size:]
-            # get predictions
-            logits, loss = self(idx_cond)  # logits is (B, T, C)
+            # get predictions (only the last time step's are needed)
+            logits, loss = self(idx_cond, positions=[-1])  # logits is (B, 1, C)
 
             # focus only on the last time step
             logits = logits[:, -1, :]  # logits is now (B, 1, C)
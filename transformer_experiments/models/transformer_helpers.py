@@ -1,11 +1,12 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../../nbs/models/transformer-helpers.ipynb.
 
 # %% auto 0
-__all__ = ['EncodingHelpers', 'unsqueeze_emb', 'InputOutputAccessor', 'TransformerAccessors', 'LogitsWrapper']
+__all__ = ['EncodingHelpers', 'unsqueeze_emb', 'InputOutputAccessor', 'PrefixTree', 'TransformerAccessors', 'TopkTokens',
+           'LogitsWrapper']
 
 # %% ../../nbs/models/transformer-helpers.ipynb 5
 from dataclasses import dataclass
-from typing import Dict, Iterable, Optional, Sequence, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 # %% ../../nbs/models/transformer-helpers.ipynb 6
 import matplotlib.pyplot as plt
@@ -98,6 +99,63 @@ class InputOutputAccessor:
         return self.activations[name][1]
 
 # %% ../../nbs/models/transformer-helpers.ipynb 18
+@dataclass
+class PrefixTree:
+    """The prefixes of a batch of token sequences (shape B, T), with each
+    unique prefix stored once. Node `i` is the prefix that ends with token
+    `node_tokens[i]` at position `node_positions[i]`, and `parents[i]` is
+    the node for the prefix one token shorter (-1 at position 0). Nodes are
+    numbered level by level: the ones at position `t` are
+    `level_offsets[t]:level_offsets[t + 1]`. `string_nodes[b, t]` is the
+    node for the first `t + 1` tokens of sequence `b`."""
+
+    node_tokens: torch.Tensor
+    node_positions: torch.Tensor
+    parents: torch.Tensor
+    level_offsets: Sequence[int]
+    string_nodes: torch.Tensor
+
+    @classmethod
+    def build(cls, tokens: torch.Tensor) -> "PrefixTree":
+        B, T = tokens.shape
+        vocab_size = int(tokens.max()) + 1
+        string_nodes = torch.empty((B, T), dtype=torch.long, device=tokens.device)
+        level_offsets = [0]
+        node_tokens, parents = [], []
+
+        prev_nodes = torch.full((B,), -1, dtype=torch.long, device=tokens.device)
+        for t in range(T):
+            # A prefix of length t + 1 is identified by the node for its
+            # first t tokens plus its last token.
+            keys = (prev_nodes + 1) * vocab_size + tokens[:, t]
+            unique_keys, inverse = torch.unique(keys, return_inverse=True)
+            node_tokens.append(unique_keys % vocab_size)
+            parents.append(unique_keys // vocab_size - 1)
+
+            prev_nodes = level_offsets[-1] + inverse
+            string_nodes[:, t] = prev_nodes
+            level_offsets.append(level_offsets[-1] + len(unique_keys))
+
+        return cls(
+            node_tokens=torch.cat(node_tokens),
+            node_positions=torch.repeat_interleave(
+                torch.arange(T, device=tokens.device),
+                torch.tensor(level_offsets).diff().to(tokens.device),
+            ),
+            parents=torch.cat(parents),
+            level_offsets=level_offsets,
+            string_nodes=string_nodes,
+        )
+
+    @property
+    def n_nodes(self) -> int:
+        return self.level_offsets[-1]
+
+    def level(self, t: int) -> slice:
+        """Returns the slice of node indices at position `t`."""
+        return slice(self.level_offsets[t], self.level_offsets[t + 1])
+
+# %% ../../nbs/models/transformer-helpers.ipynb 20
 class TransformerAccessors:
     """Class that provides methods for running pieces of a `TransformerLanguageModel`
     in isolation and introspecting their intermediate results."""
@@ -124,7 +182,9 @@ class TransformerAccessors:
 
     def copy_block_from_model(self, block_idx: int):
         """Given the index of a block in the model [0, n_layer), creates
-        a new block with identical parameters.
+        a new block with identical parameters. The new block shares its
+        parameter tensors with the model's block rather than copying them,
+        so it is cheap to create but must not be modified in place.
 
         Returns
         -------
@@ -134,9 +194,11 @@ class TransformerAccessors:
             sub-modules, and children of the self-attention sub-module.
         """
         block = self.m.blocks[block_idx]
-        new_block = Block(n_embed, n_head)
-        new_block.to(self.device)
-        new_block.load_state_dict(block.state_dict())
+        # Create the block on the meta device so no memory is allocated for
+        # params that are about to be replaced by the model's.
+        with torch.device("meta"):
+            new_block = Block(n_embed, n_head)
+        new_block.load_state_dict(block.state_dict(), assign=True)
         new_block.eval()
 
         activations = {}
@@ -181,40 +243,259 @@ class TransformerAccessors:
         return logits.detach()
 
     def run_model(
-        self, embedded_input: torch.Tensor
-    ) -> Tuple[torch.Tensor, Sequence[InputOutputAccessor]]:
+        self,
+        embedded_input: torch.Tensor,
+        positions: Optional[Sequence[int]] = None,
+        stop_after_block: Optional[int] = None,
+    ) -> Tuple[Optional[torch.Tensor], Sequence[InputOutputAccessor]]:
         """Given an input (already embedded), runs the model on it and returns a
         the logits and a sequence of `InputOutputAccessor` objects that provide
-        access to the inputs and outputs of each block in the model."""
-        return self.run_model_from_block_n(embedded_input, 0)
+        access to the inputs and outputs of each block in the model. See
+        `run_model_from_block_n` for `positions` and `stop_after_block`."""
+        return self.run_model_from_block_n(
+            embedded_input, 0, positions=positions, stop_after_block=stop_after_block
+        )
 
     def run_model_from_block_n(
-        self, embedded_input: torch.Tensor, n: int
-    ) -> Tuple[torch.Tensor, Sequence[InputOutputAccessor]]:
+        self,
+        embedded_input: torch.Tensor,
+        n: int,
+        positions: Optional[Sequence[int]] = None,
+        stop_after_block: Optional[int] = None,
+    ) -> Tuple[Optional[torch.Tensor], Sequence[InputOutputAccessor]]:
         """Given an embedding, runs the model from block `n` onwards and returns
         the logits and a sequence of `InputOutputAccessor` objects that provide
         access to the inputs and outputs of each block. Note that the sequence
         of `InputOutputAccessor` objects will only contain `n_layer - n` elements
-        and index 0 corresponds to block `n` of the model."""
+        and index 0 corresponds to block `n` of the model.
+
+        If `positions` (indices into T, e.g. `[-1]`) is given, the last block's
+        attention and ffwd, and the logits, are only computed for those
+        positions, for callers that only need e.g. the final position's
+        outputs. Every position still provides keys and values, so the results
+        match the full run at those positions. The last block's accessor then
+        has (B, len(positions), ...) outputs (and `ln1` still covers all of T),
+        while the other blocks' are unchanged.
+
+        If `stop_after_block` is given, only blocks `n` to `stop_after_block`
+        (inclusive) are run, and the logits aren't computed (None is returned
+        in their place), for callers that only look at the earlier blocks.
+        The `positions` then apply to block `stop_after_block`."""
         self.check_valid_input_shape(embedded_input)
+        last_block = n_layer - 1 if stop_after_block is None else stop_after_block
+        if not n <= last_block < n_layer:
+            raise ValueError(
+                f"Expected stop_after_block to be in [{n}, {n_layer}), got {stop_after_block}"
+            )
 
         blocks, io_accessors = zip(
             *[  # See https://stackoverflow.com/a/13635074
-                self.copy_block_from_model(block_idx=i) for i in range(n, n_layer)
+                self.copy_block_from_model(block_idx=i)
+                for i in range(n, last_block + 1)
             ]
         )
 
-        blocks_module = nn.Sequential(*blocks)
+        x = nn.Sequential(*blocks[:-1])(embedded_input)
+        x = blocks[-1](x, positions=positions)
+        if stop_after_block is not None:
+            return None, io_accessors
 
-        x = blocks_module(embedded_input)
         logits = self.logits_from_embedding(x)
 
         return logits.detach(), io_accessors
 
-# %% ../../nbs/models/transformer-helpers.ipynb 25
+    def run_model_sharing_prefixes(
+        self, tokens: torch.Tensor, chunk_size: int = 512
+    ) -> Tuple[torch.Tensor, Sequence[InputOutputAccessor]]:
+        """Given a batch of tokens (shape B, T), returns the same logits and
+        block inputs and outputs as `run_model(embed_tokens(tokens))`, but
+        computes them once per unique prefix rather than once per sequence.
+
+        Because attention is causal, the activations at position t only depend
+        on the first t + 1 tokens, so sequences that share a prefix (e.g.
+        substrings that start with the same characters) share the activations
+        for it. This runs the positions of a `PrefixTree` of the tokens level
+        by level, with each prefix attending over the keys and values cached
+        for its ancestors, and then scatters the results out to per-sequence
+        rows. The accessors provide the inputs and outputs of the block
+        itself, `ln1`, `sa`, `sa.proj`, `ln2` and `ffwd`.
+
+        `chunk_size` is how many prefixes' attention is computed at once,
+        which bounds the memory used to gather their ancestors' keys and
+        values."""
+        B, T = tokens.shape
+        if T > block_size:
+            raise ValueError(
+                f"Expected at most {block_size} tokens per sequence, got {T}"
+            )
+
+        tree = PrefixTree.build(tokens)
+        blocks = [self.copy_block_from_model(block_idx=i)[0] for i in range(n_layer)]
+        head_size = n_embed // n_head
+
+        def node_tensor() -> torch.Tensor:
+            return torch.empty((tree.n_nodes, n_embed), device=self.device)
+
+        names = [
+            "block_input",
+            "ln1",
+            "heads",
+            "proj",
+            "mid",
+            "ln2",
+            "ffwd",
+            "block_output",
+        ]
+        node_acts = [{name: node_tensor() for name in names} for _ in blocks]
+        k_caches = [node_tensor() for _ in blocks]
+        v_caches = [node_tensor() for _ in blocks]
+        # Stack the heads' weights so that all the heads are computed at once.
+        qkv_weights = [
+            [
+                torch.cat([getattr(head, name).weight for head in block.sa.heads])
+                for name in ("query", "key", "value")
+            ]
+            for block in blocks
+        ]
+
+        with torch.no_grad():
+            for t in range(T):
+                level = tree.level(t)
+                node_ids = torch.arange(level.start, level.stop, device=self.device)
+
+                # The nodes each node at this level attends to: its ancestors
+                # and itself.
+                if t == 0:
+                    ancestors = node_ids[:, None]
+                else:
+                    parents = tree.parents[level] - tree.level_offsets[t - 1]
+                    ancestors = torch.cat(
+                        [ancestors[parents], node_ids[:, None]], dim=1
+                    )
+
+                x = (
+                    self.m.token_embedding_table(tree.node_tokens[level])
+                    + self.m.position_embedding_table.weight[t]
+                )
+                for block, acts, k_cache, v_cache, (wq, wk, wv) in zip(
+                    blocks, node_acts, k_caches, v_caches, qkv_weights
+                ):
+                    acts["block_input"][level] = x
+                    ln1 = block.ln1(x)
+                    q = F.linear(ln1, wq)
+                    k_cache[level] = F.linear(ln1, wk)
+                    v_cache[level] = F.linear(ln1, wv)
+
+                    heads = torch.empty_like(x)
+                    for start in range(0, len(node_ids), chunk_size):
+                        chunk = slice(start, start + chunk_size)
+                        chunk_ancestors = ancestors[chunk]
+                        U = len(chunk_ancestors)
+                        k = k_cache[chunk_ancestors].view(U, t + 1, n_head, head_size)
+                        v = v_cache[chunk_ancestors].view(U, t + 1, n_head, head_size)
+                        wei = (
+                            torch.einsum(
+                                "unh,utnh->unt",
+                                q[chunk].view(U, n_head, head_size),
+                                k,
+                            )
+                            * head_size**-0.5
+                        )
+                        wei = F.softmax(wei, dim=-1)
+                        heads[chunk] = torch.einsum("unt,utnh->unh", wei, v).reshape(
+                            U, n_embed
+                        )
+
+                    proj = block.sa.proj(heads)
+                    mid = x + proj
+                    ln2 = block.ln2(mid)
+                    ffwd = block.ffwd(ln2)
+                    x = mid + ffwd
+
+                    for name, value in [
+                        ("ln1", ln1),
+                        ("heads", heads),
+                        ("proj", proj),
+                        ("mid", mid),
+                        ("ln2", ln2),
+                        ("ffwd", ffwd),
+                        ("block_output", x),
+                    ]:
+                        acts[name][level] = value
+
+            node_logits = self.logits_from_embedding(node_acts[-1]["block_output"])
+
+        io_accessors = []
+        for acts in node_acts:
+            a = {name: acts[name][tree.string_nodes] for name in names}
+            io_accessors.append(
+                InputOutputAccessor(
+                    {
+                        ".": ((a["block_input"],), a["block_output"]),
+                        "ln1": ((a["block_input"],), a["ln1"]),
+                        "sa": ((a["ln1"],), a["proj"]),
+                        "sa.proj": ((a["heads"],), a["proj"]),
+                        "ln2": ((a["mid"],), a["ln2"]),
+                        "ffwd": ((a["ln2"],), a["ffwd"]),
+                    }
+                )
+            )
+
+        return node_logits[tree.string_nodes], io_accessors
+
+# %% ../../nbs/models/transformer-helpers.ipynb 30
+class TopkTokens(Sequence):
+    """A nested sequence (one level per leading dimension of `ids`) of
+    (token, prob) tuples, decoded from top-k token ids and probabilities as
+    they're accessed. The tensors are converted to Python lists in one go on
+    first access, which is much cheaper than an `.item()` call per element.
+    Compares equal to nested lists with the same contents."""
+
+    def __init__(
+        self,
+        ids: Union[torch.Tensor, List],
+        probs: Union[torch.Tensor, List],
+        itos: Dict[int, str],
+    ):
+        self._ids = ids
+        self._probs = probs
+        self.itos = itos
+
+    def _lists(self) -> Tuple[List, List]:
+        if isinstance(self._ids, torch.Tensor):
+            self._ids = self._ids.tolist()
+        if isinstance(self._probs, torch.Tensor):
+            self._probs = self._probs.tolist()
+        return self._ids, self._probs
+
+    def _decode(self, ids, probs):
+        if isinstance(ids, list):
+            return TopkTokens(ids, probs, self.itos)
+        return (self.itos[ids], probs)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, idx):
+        ids, probs = self._lists()
+        if isinstance(idx, slice):
+            return [self._decode(i, p) for i, p in zip(ids[idx], probs[idx])]
+        return self._decode(ids[idx], probs[idx])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Sequence) and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
 class LogitsWrapper:
     """A wrapper class around a tensor of logits that provides
-    convenience methods for interpreting and visualizing them."""
+    convenience methods for interpreting and visualizing them.
+
+    The probabilities and log probabilities are computed the first time
+    they're needed and then cached, so the logits must not be modified after
+    they're wrapped."""
 
     def __init__(self, logits: torch.Tensor, tokenizer: CharacterTokenizer):
         # For consistency, we always want logits to be of shape (B, T, vocab_size).
@@ -225,28 +506,32 @@ class LogitsWrapper:
 
         self.logits = logits
         self.tokenizer = tokenizer
+        self._probs: Optional[torch.Tensor] = None
+        self._log_probs: Optional[torch.Tensor] = None
 
     def probs(self) -> torch.Tensor:
-        return F.softmax(self.logits, dim=-1)
+        if self._probs is None:
+            self._probs = F.softmax(self.logits, dim=-1)
+        return self._probs
+
+    def log_probs(self) -> torch.Tensor:
+        if self._log_probs is None:
+            self._log_probs = F.log_softmax(self.logits, dim=-1)
+        return self._log_probs
+
+    def topk_tensors(self, k: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the ids and probabilities of the top k tokens at each
+        position, both of shape (B, T, k), in descending order of
+        probability."""
+        probs, ids = torch.topk(self.probs(), k=k, dim=-1)
+        return ids, probs
 
     def topk_tokens(self, k: int) -> Sequence[Sequence[Sequence[Tuple[str, float]]]]:
-        """Returns the top k tokens and their probabilities."""
-        probs = self.probs()
-        _, topk_indices = torch.topk(probs, k=k, dim=-1)
-
-        B, T, _ = self.logits.shape
-        top_tokens = [
-            [
-                [
-                    (self.tokenizer.itos[i], probs[b_i, t_i, i].item())
-                    for i in topk_indices[b_i, t_i].tolist()
-                ]
-                for t_i in range(T)
-            ]
-            for b_i in range(B)
-        ]
-
-        return top_tokens
+        """Returns the top k tokens and their probabilities, indexed as
+        [b_i][t_i][rank] -> (token, prob). The result is a `TopkTokens` view
+        over `topk_tensors(k)`."""
+        ids, probs = self.topk_tensors(k)
+        return TopkTokens(ids, probs, self.tokenizer.itos)
 
     def plot_probs(
         self,
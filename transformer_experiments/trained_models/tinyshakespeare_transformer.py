@@ -20,10 +20,18 @@ from transformer_experiments.tokenizers.char_tokenizer import (
 
 # %% ../../nbs/trained_models/tinyshakespeare-transformer.ipynb 9
 def create_model_and_tokenizer(
-    saved_model_filename: str, dataset: TinyShakespeareDataSet, device: str
+    saved_model_filename: str,
+    dataset: TinyShakespeareDataSet,
+    device: str,
+    share_memory: bool = False,
 ) -> Tuple[TransformerLanguageModel, CharacterTokenizer]:
     """Instantiates a pre-trained TinyShakespeare model: creates transformer model,
     loads the model params from a saved file, and creates a tokenizer from the dataset's text.
+
+    If `share_memory` is True, the model params are moved into shared memory.
+    Worker processes that the model is sent to (e.g. by a `ShardedExecutor`)
+    then attach to the same memory instead of receiving their own copy of
+    the weights or re-reading the saved file.
     """
 
     # Create a tokenizer from the dataset's text
@@ -39,6 +47,9 @@ def create_model_and_tokenizer(
     )
     m.eval()
 
+    if share_memory:
+        m.share_memory()
+
     return m, tokenizer
 
 # %% ../../nbs/trained_models/tinyshakespeare-transformer.ipynb 10